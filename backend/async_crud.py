@@ -0,0 +1,69 @@
+"""
+异步数据库操作模块
+通过 AsyncSession.run_sync 复用 crud 中的同步实现：
+查询逻辑只维护一份，数据库等待期间事件循环可以继续处理其他请求
+"""
+
+from functools import wraps
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+import crud
+
+def _awaitable(func: Callable) -> Callable[..., Awaitable]:
+    """把 crud(db, ...) 包装为 await async_crud(async_db, ...)"""
+    @wraps(func)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(func, *args, **kwargs)
+    return wrapper
+
+# 用户相关
+get_user = _awaitable(crud.get_user)
+get_user_by_email = _awaitable(crud.get_user_by_email)
+create_user = _awaitable(crud.create_user)
+update_user = _awaitable(crud.update_user)
+# run_sync 在事件循环线程上执行，crud 不计算bcrypt：
+# 路由先用 auth.verify_password_async / hash_password_async 在密码线程池中校验和哈希，再传入结果
+change_password = _awaitable(crud.change_password)
+
+# 钓点相关
+create_fishing_spot = _awaitable(crud.create_fishing_spot)
+get_fishing_spot = _awaitable(crud.get_fishing_spot)
+get_fishing_spots_by_ids = _awaitable(crud.get_fishing_spots_by_ids)
+get_nearby_fishing_spots = _awaitable(crud.get_nearby_fishing_spots)
+get_fishing_spots_in_viewport = _awaitable(crud.get_fishing_spots_in_viewport)
+get_user_fishing_spots = _awaitable(crud.get_user_fishing_spots)
+delete_fishing_spot = _awaitable(crud.delete_fishing_spot)
+
+# 鱼获相关
+create_fish_catch = _awaitable(crud.create_fish_catch)
+get_fish_catch = _awaitable(crud.get_fish_catch)
+get_fish_catches = _awaitable(crud.get_fish_catches)
+get_user_fish_catches = _awaitable(crud.get_user_fish_catches)
+reconcile_fish_catch_counters = _awaitable(crud.reconcile_fish_catch_counters)
+
+async def delete_fish_catch(db: AsyncSession, catch_id: int, user_id: int) -> bool:
+    """删除鱼获；不再被引用的图片文件在事务提交后于线程池中删除，不占用事件循环"""
+    deleted, orphan_url = await db.run_sync(crud.delete_fish_catch_record, catch_id, user_id)
+    if orphan_url is not None:
+        try:
+            if await db.run_sync(crud.lock_removed_upload, orphan_url):
+                await run_in_threadpool(crud.delete_upload_files, orphan_url)
+        finally:
+            await db.commit()
+    return deleted
+
+# 点赞相关
+like_fish_catch = _awaitable(crud.like_fish_catch)
+unlike_fish_catch = _awaitable(crud.unlike_fish_catch)
+get_liked_catch_ids = _awaitable(crud.get_liked_catch_ids)
+get_user_liked_catches = _awaitable(crud.get_user_liked_catches)
+
+# 评论相关
+create_comment = _awaitable(crud.create_comment)
+get_fish_catch_comments = _awaitable(crud.get_fish_catch_comments)
+
+# 分页游标生成不涉及数据库，直接复用
+next_cursor = crud.next_cursor
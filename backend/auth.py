@@ -1,13 +1,24 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import HTTPException, status
+from fastapi import HTTPException, Request, status
 from config import settings
 from logging_config import backend_logger
 
-# 密码哈希上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 密码哈希上下文，已有哈希自带工作因子，调整 BCRYPT_ROUNDS 不影响旧密码的验证
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# bcrypt 每次计算耗时上百毫秒，放到专用线程池执行，避免阻塞事件循环；
+# bcrypt 计算期间会释放GIL，线程池即可利用多核
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+# 正在执行和排队中的任务数，只在事件循环线程中修改
+_password_pending = 0
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
@@ -17,6 +28,40 @@ def get_password_hash(password: str) -> str:
     """生成密码哈希"""
     return pwd_context.hash(password)
 
+async def _run_password_task(func: Callable, *args):
+    """在密码线程池中执行，排队已满时返回503让客户端稍后重试"""
+    global _password_pending
+    if _password_pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE:
+        backend_logger.warning("密码哈希队列已满: %s", _password_pending)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后重试",
+            headers={"Retry-After": "1"},
+        )
+    _password_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, func, *args)
+    finally:
+        _password_pending -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """在线程池中验证密码"""
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+async def hash_password_async(password: str) -> str:
+    """在线程池中生成密码哈希"""
+    return await _run_password_task(get_password_hash, password)
+
+def get_password_pool_stats() -> dict:
+    return {
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "queue_size": settings.PASSWORD_HASH_QUEUE_SIZE,
+        "pending": _password_pending,
+    }
+
+def shutdown_password_executor():
+    _password_executor.shutdown(wait=False, cancel_futures=True)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """创建访问令牌"""
     to_encode = data.copy()
@@ -30,36 +75,43 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         to_encode["sub"] = to_encode["email"]
     
     to_encode.update({"exp": expire})
-    backend_logger.info(f"创建Token，payload: {to_encode}")
+    backend_logger.debug("创建Token，用户: %s", to_encode.get("sub"))
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> dict:
-    """验证并解析令牌"""
-    backend_logger.info(f"开始验证Token: {token[:20]}...")
+def decode_token(token: str) -> dict:
+    """校验令牌签名和有效期，返回完整的payload"""
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            backend_logger.error("Token中没有找到email字段")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials - no email in token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        backend_logger.info(f"Token验证成功，用户邮箱: {email}")
-        return {"email": email}
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
     except jwt.ExpiredSignatureError:
-        backend_logger.error("Token已过期")
+        backend_logger.debug("Token已过期")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has expired",
             headers={"WWW-Authenticate": "Bearer"},
         )
     except JWTError as e:
-        backend_logger.error(f"Token验证失败: {str(e)}")
+        backend_logger.warning("Token验证失败: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Invalid authentication credentials: {str(e)}",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+
+def decode_request_token(request: Request, token: str) -> dict:
+    """每个请求只解码一次令牌，结果（或错误）保存在 request.state 上供后续复用"""
+    decoded = getattr(request.state, "token_auth", None)
+    if decoded is None or decoded[0] != token:
+        try:
+            decoded = (token, decode_token(token), None)
+        except HTTPException as e:
+            decoded = (token, None, e)
+        request.state.token_auth = decoded
+    _, payload, error = decoded
+    if error is not None:
+        raise error
+    return payload
+
+def token_email(payload: dict) -> Optional[str]:
+    """从payload中取用户邮箱，兼容 email 和 sub 两种字段"""
+    return payload.get("email") or payload.get("sub")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+距离计算基准测试
+对比逐点调用 calculate_distance 与 NumPy 批量计算的耗时
+
+用法: python benchmarks/bench_distance.py [--sizes 1000 100000 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# 添加后端目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from utils import calculate_distance, haversine_distances, nearest_points
+
+def _timeit(func, repeat: int) -> float:
+    """返回多次运行中的最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(sizes, repeat: int = 3, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    origin_lat, origin_lon = 30.5, 114.3
+
+    print(f"{'点数':>10} {'逐点(ms)':>12} {'批量(ms)':>12} {'top-50(ms)':>12} {'加速比':>8}")
+    for size in sizes:
+        lats = origin_lat + rng.uniform(-2, 2, size)
+        lons = origin_lon + rng.uniform(-2, 2, size)
+        lat_list = lats.tolist()
+        lon_list = lons.tolist()
+
+        scalar = _timeit(
+            lambda: [calculate_distance(origin_lat, origin_lon, a, b) for a, b in zip(lat_list, lon_list)],
+            1 if size >= 1_000_000 else repeat
+        )
+        batch = _timeit(lambda: haversine_distances(origin_lat, origin_lon, lats, lons), repeat)
+        top_k = _timeit(lambda: nearest_points(origin_lat, origin_lon, lats, lons, k=50, radius=50.0), repeat)
+
+        # 校验结果一致
+        expected = np.array([calculate_distance(origin_lat, origin_lon, a, b) for a, b in zip(lat_list[:1000], lon_list[:1000])])
+        actual = np.round(haversine_distances(origin_lat, origin_lon, lats[:1000], lons[:1000]), 2)
+        assert np.allclose(expected, actual, atol=0.011), "批量计算结果与逐点计算不一致"
+
+        print(f"{size:>10} {scalar * 1000:>12.2f} {batch * 1000:>12.2f} {top_k * 1000:>12.2f} {scalar / batch:>7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="距离计算基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+鱼获列表查询数检查
+在内存SQLite中创建鱼获，当前用户点赞其中一部分，用 assert_max_queries 确认 get_fish_catches
+不随列表长度产生N+1查询：未命中缓存时列表1条 + 点赞状态1条，命中缓存时只有点赞状态1条，
+并核对每条鱼获的 is_liked
+
+用法: python benchmarks/bench_feed_queries.py [--catches 200] [--limit 50] [--liked 0.3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# 添加后端目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import crud
+from database import Base, assert_max_queries
+from models import FishCatch, Like, User
+
+def _seed(db, catches: int, liked: float, seed: int) -> set:
+    """创建两个用户和一批公开鱼获，返回用户1点赞过的鱼获ID"""
+    db.add_all([
+        User(id=1, email="reader@example.com", nickname="reader", hashed_password="x"),
+        User(id=2, email="author@example.com", nickname="author", hashed_password="x"),
+    ])
+    db.add_all([
+        FishCatch(fish_type="鲫鱼", weight=0.5, latitude=30.5, longitude=114.3, location_name="东湖", user_id=2)
+        for _ in range(catches)
+    ])
+    db.flush()
+    rng = random.Random(seed)
+    liked_ids = {catch_id for (catch_id,) in db.query(FishCatch.id) if rng.random() < liked}
+    db.add_all([Like(user_id=1, fish_catch_id=catch_id) for catch_id in liked_ids])
+    db.commit()
+    return liked_ids
+
+def _check(db, bind, max_queries: int, limit: int, liked_ids: set) -> float:
+    """执行一次列表查询，检查查询数和点赞状态，返回耗时（秒）"""
+    start = time.perf_counter()
+    with assert_max_queries(max_queries, bind) as counter:
+        catches = crud.get_fish_catches(db, limit=limit, current_user_id=1)
+    elapsed = time.perf_counter() - start
+    wrong = [catch["id"] for catch in catches if catch["is_liked"] != (catch["id"] in liked_ids)]
+    assert not wrong, f"点赞状态错误: {wrong}"
+    assert any(catch["is_liked"] for catch in catches) and not all(catch["is_liked"] for catch in catches), \
+        "列表中应同时有点赞和未点赞的鱼获，调整 --liked"
+    print(f"{len(catches):>6} {counter.count:>6} {max_queries:>6} {elapsed * 1000:>9.2f}")
+    return elapsed
+
+def run(catches: int, limit: int, liked: float, seed: int = 42):
+    bind = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind)
+    db = sessionmaker(bind=bind)()
+    try:
+        liked_ids = _seed(db, catches, liked, seed)
+        print(f"{catches} 条鱼获，点赞 {len(liked_ids)} 条")
+        print(f"{'条数':>6} {'SQL数':>6} {'上限':>6} {'耗时(ms)':>9}")
+        crud.feed_cache.clear()
+        _check(db, bind, 2, limit, liked_ids)  # 未命中缓存
+        _check(db, bind, 1, limit, liked_ids)  # 命中缓存
+    finally:
+        db.close()
+        crud.feed_cache.clear()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="鱼获列表查询数检查")
+    parser.add_argument("--catches", type=int, default=200, help="鱼获数")
+    parser.add_argument("--limit", type=int, default=50, help="每页条数")
+    parser.add_argument("--liked", type=float, default=0.3, help="当前用户点赞的比例")
+    args = parser.parse_args()
+    run(args.catches, args.limit, args.liked)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+图片处理基准测试
+用固定随机种子生成JPEG/PNG/GIF合成图片，对比完整解码后缩放与快速解码路径（compress_image），
+输出每张图片的耗时（ms）和处理进程的峰值内存（RSS）
+
+每个用例在独立的子进程中运行，峰值内存互不影响。
+
+用法: python benchmarks/bench_images.py [--sizes 1280x960 4000x3000] [--formats JPEG PNG GIF] [--repeat 5] [--max-width 1200]
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# 添加后端目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import PIL
+from PIL import Image, ImageOps, features
+
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif"}
+
+def make_image(path: str, width: int, height: int, image_format: str, seed: int = 0):
+    """生成渐变加噪声的合成图片，压缩率接近真实照片；JPEG带EXIF方向（旋转90度）"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    pixels = np.empty((height, width, 3), dtype=np.float32)
+    pixels[..., 0] = x[None, :]
+    pixels[..., 1] = y[:, None]
+    pixels[..., 2] = (x[None, :] + y[:, None]) / 2
+    pixels += rng.normal(0, 12, size=(height, width, 1)).astype(np.float32)
+    img = Image.fromarray(pixels.clip(0, 255).astype(np.uint8))
+    if image_format == "JPEG":
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        img.save(path, "JPEG", quality=92, exif=exif)
+    elif image_format == "GIF":
+        img.convert("P", palette=Image.Palette.ADAPTIVE).save(path, "GIF")
+    else:
+        img.save(path, image_format)
+
+def _peak_rss_mb() -> float:
+    """当前进程的峰值内存（MB）"""
+    # Linux上 ru_maxrss 会继承父进程的值，优先读取本进程的 VmHWM
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss 在Linux上单位为KB，macOS上为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _full_decode(source: str, output: str, max_width: int):
+    """对照组：按原始分辨率完整解码，按EXIF方向转正后用LANCZOS缩放，输出与快速路径相同"""
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        if img.width > max_width:
+            size = (max_width, max(1, img.height * max_width // img.width))
+            img = img.resize(size, Image.Resampling.LANCZOS)
+        img.save(output, "JPEG", quality=85, optimize=True)
+
+def _fast_decode(source: str, output: str, max_width: int):
+    from utils import compress_image
+    if not compress_image(source, quality=85, max_width=max_width, output_path=output):
+        raise RuntimeError(f"处理失败: {source}")
+
+METHODS = {"完整解码": _full_decode, "快速解码": _fast_decode}
+
+def run_case(method: str, source: str, max_width: int, repeat: int):
+    """在子进程中执行，返回 (每张耗时ms, 峰值RSS MB, 空闲RSS MB)"""
+    func = METHODS[method]
+    idle_rss = _peak_rss_mb()
+    output = f"{source}.{method}.out.jpg"
+    # 第一次调用预热（导入模块、加载编解码器）
+    func(source, output, max_width)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(source, output, max_width)
+    elapsed = (time.perf_counter() - start) / repeat
+    os.remove(output)
+    return elapsed * 1000, _peak_rss_mb(), idle_rss
+
+def run(sizes, formats, repeat: int, max_width: int):
+    print(f"Pillow {PIL.__version__}，libjpeg {features.version('jpg')}，输出最大宽度 {max_width}px，每项重复 {repeat} 次")
+    print(f"{'格式':>6} {'尺寸':>11} {'方式':>8} {'ms/张':>9} {'峰值RSS(MB)':>12} {'增量(MB)':>10}")
+    context = get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        for image_format in formats:
+            for width, height in sizes:
+                source = os.path.join(directory, f"{width}x{height}.{EXTENSIONS[image_format]}")
+                make_image(source, width, height, image_format)
+                for method in METHODS:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        ms, peak, idle = executor.submit(run_case, method, source, max_width, repeat).result()
+                    print(f"{image_format:>6} {f'{width}x{height}':>11} {method:>8} {ms:>9.1f} {peak:>12.1f} {peak - idle:>10.1f}")
+
+def _parse_size(value: str):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="图片处理基准测试")
+    parser.add_argument("--sizes", type=_parse_size, nargs="+", default=[(1280, 960), (2400, 1800), (4000, 3000)])
+    parser.add_argument("--formats", nargs="+", choices=list(EXTENSIONS), default=list(EXTENSIONS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-width", type=int, default=1200)
+    args = parser.parse_args()
+    run(args.sizes, args.formats, args.repeat, args.max_width)
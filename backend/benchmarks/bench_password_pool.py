@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+密码哈希线程池基准测试
+模拟登录突发：并发发起N次bcrypt验证，对比直接在事件循环中计算与不同线程数的线程池，
+输出每秒登录数、登录延迟p95，以及事件循环的最大卡顿时间
+
+用法: python benchmarks/bench_password_pool.py [--workers 1 2 4 8] [--logins 64] [--rounds 12]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加后端目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passlib.context import CryptContext
+
+async def _heartbeat(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """每隔interval唤醒一次，返回事件循环的最大卡顿时间（秒）"""
+    worst = 0.0
+    expected = time.perf_counter() + interval
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        worst = max(worst, now - expected)
+        expected = now + interval
+    return worst
+
+async def _login_burst(verify, logins: int):
+    latencies = []
+    # 所有登录同时到达，延迟从突发开始时计算，包含排队时间
+    start = 0.0
+
+    async def login():
+        await verify()
+        latencies.append(time.perf_counter() - start)
+
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(stop))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    stall = await heartbeat
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return logins / elapsed, p95, stall
+
+def run(workers_list, logins: int, rounds: int):
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    hashed = context.hash("correct horse battery staple")
+
+    def verify():
+        assert context.verify("correct horse battery staple", hashed)
+
+    start = time.perf_counter()
+    verify()
+    print(f"bcrypt rounds={rounds}，单次验证 {(time.perf_counter() - start) * 1000:.1f} ms，CPU核数 {os.cpu_count()}")
+    print(f"{'模式':>10} {'登录/秒':>10} {'p95(ms)':>10} {'循环卡顿(ms)':>14}")
+
+    async def inline():
+        verify()
+
+    throughput, p95, stall = asyncio.run(_login_burst(inline, logins))
+    print(f"{'事件循环':>10} {throughput:>10.1f} {p95 * 1000:>10.1f} {stall * 1000:>14.1f}")
+
+    for workers in workers_list:
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+        async def pooled():
+            await asyncio.get_running_loop().run_in_executor(executor, verify)
+
+        throughput, p95, stall = asyncio.run(_login_burst(pooled, logins))
+        executor.shutdown()
+        print(f"{f'{workers}线程':>10} {throughput:>10.1f} {p95 * 1000:>10.1f} {stall * 1000:>14.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="密码哈希线程池基准测试")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+    run(args.workers, args.logins, args.rounds)
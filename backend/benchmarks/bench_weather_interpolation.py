@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+天气插值基准测试
+在一片区域内预热部分网格单元，再查询区域内所有单元，对比开启和关闭插值时的上游请求数，
+并按真实数据计算插值结果的误差。上游为进程内的假数据源，气温、气压等随坐标平滑变化，
+可叠加各单元独立的随机噪声，观察气温差阈值拒绝插值的效果
+
+用法: python benchmarks/bench_weather_interpolation.py [--size 20] [--warm 0.5] [--noise 0.5]
+"""
+
+import argparse
+import asyncio
+import copy
+import math
+import os
+import random
+import sys
+import time
+
+# 添加后端目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 只比较内存缓存和插值，不读写持久化缓存
+os.environ.setdefault("WEATHER_STORE_ENABLED", "false")
+
+import numpy as np
+
+from benchmarks.fake_wttr import make_payload
+from config import settings
+from weather_proxy import SOURCE_INTERPOLATED, WeatherProxy, WeatherUpstream, cell_center, snap_to_grid
+
+# 区域西南角
+ORIGIN = (30.0, 114.0)
+
+class SmoothUpstream(WeatherUpstream):
+    """按坐标生成平滑变化的预报，noise 为各坐标独立的气温噪声幅度（°C）"""
+
+    def __init__(self, noise: float):
+        self.noise = noise
+        self.requests = 0
+        self._template = make_payload(*ORIGIN)
+
+    def truth(self, latitude: float, longitude: float) -> dict:
+        payload = copy.deepcopy(self._template)
+        rng = random.Random(f"{latitude:.4f},{longitude:.4f}")
+        for day, weather in enumerate(payload["weather"]):
+            for index, hourly in enumerate(weather["hourly"]):
+                phase = (day * 8 + index) / 8 * 2 * math.pi
+                temperature = 18 + 4 * math.sin(latitude / 0.7) + 3 * math.cos(longitude / 0.9) + 5 * math.sin(phase)
+                hourly["tempC"] = str(round(temperature + rng.uniform(-self.noise, self.noise)))
+                hourly["pressure"] = str(round(1010 + 6 * math.sin(latitude / 1.3 + longitude / 1.1)))
+                hourly["humidity"] = str(round(60 + 20 * math.cos(latitude / 0.8 - phase)))
+                hourly["windspeedKmph"] = str(round(12 + 8 * math.sin(longitude / 0.6 + phase)))
+        return payload
+
+    async def fetch(self, latitude: float, longitude: float, lang: str) -> dict:
+        self.requests += 1
+        return self.truth(latitude, longitude)
+
+def _values(payload: dict, field: str) -> np.ndarray:
+    return np.array([float(hourly[field]) for day in payload["weather"] for hourly in day["hourly"]])
+
+async def run_once(size: int, warm: float, noise: float, interpolate: bool, seed: int = 0):
+    settings.WEATHER_INTERPOLATION_ENABLED = interpolate
+    upstream = SmoothUpstream(noise)
+    proxy = WeatherProxy(upstream)
+    origin = snap_to_grid(*ORIGIN)
+    cells = [(origin[0] + row, origin[1] + col) for row in range(size) for col in range(size)]
+
+    # 预热：模拟热门单元已由预取任务缓存
+    rng = random.Random(seed)
+    for cell in cells:
+        if rng.random() < warm:
+            await proxy.refresh(cell, "zh")
+    warmed = upstream.requests
+
+    errors = {"tempC": [], "pressure": []}
+    interpolated = 0
+    start = time.perf_counter()
+    for cell in cells:
+        payload, source = await proxy.get_cell(cell, "zh")
+        if source == SOURCE_INTERPOLATED:
+            interpolated += 1
+            truth = upstream.truth(*cell_center(cell))
+            for field in errors:
+                errors[field].append(np.abs(_values(payload, field) - _values(truth, field)).mean())
+    elapsed = time.perf_counter() - start
+
+    name = "插值" if interpolate else "不插值"
+    mae = " ".join(
+        f"{field}={np.mean(values):.2f}" if values else f"{field}=-" for field, values in errors.items()
+    )
+    print(f"{name:>6} {warmed:>6} {upstream.requests - warmed:>8} {interpolated:>6} {elapsed * 1000:>9.1f}  {mae}")
+
+async def run(size: int, warm: float, noise: float):
+    print(f"{size}x{size} 个单元，预热 {warm:.0%}，气温噪声 ±{noise}°C，"
+          f"阈值: 相邻单元>={settings.WEATHER_INTERPOLATION_MIN_NEIGHBOURS} 个、"
+          f"距离<={settings.WEATHER_INTERPOLATION_MAX_KM}km、气温差<={settings.WEATHER_INTERPOLATION_MAX_SPREAD}°C")
+    print(f"{'模式':>6} {'预热':>6} {'上游请求':>8} {'插值':>6} {'耗时(ms)':>9}  平均绝对误差")
+    for interpolate in (False, True):
+        await run_once(size, warm, noise, interpolate)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="天气插值基准测试")
+    parser.add_argument("--size", type=int, default=20, help="区域边长（单元数）")
+    parser.add_argument("--warm", type=float, default=0.5, help="预热单元的比例")
+    parser.add_argument("--noise", type=float, default=0.5, help="各单元独立的气温噪声幅度（°C）")
+    args = parser.parse_args()
+    asyncio.run(run(args.size, args.warm, args.noise))
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+天气代理基准测试
+在本地启动假wttr.in服务，模拟大量用户集中在少数几个水库附近同时查询天气，
+对比客户端各自直连上游与经过服务端天气代理（网格缓存 + 合并请求），输出上游请求数、耗时和延迟p95
+
+用法: python benchmarks/bench_weather_proxy.py [--users 2000] [--sites 20] [--latency 0.1] [--concurrency 200]
+"""
+
+import argparse
+import asyncio
+import itertools
+import math
+import os
+import random
+import sys
+import time
+
+# 添加后端目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from benchmarks.fake_wttr import FakeWttrServer
+from weather_proxy import WeatherProxy, WttrUpstream
+
+# 模拟直连时每个 httpx 客户端的连接数
+CLIENT_POOL_SIZE = 20
+
+def make_users(users: int, sites: int, seed: int = 0):
+    """用户分布在若干水库附近（约3km范围内），九成使用中文"""
+    rng = random.Random(seed)
+    centers = [(rng.uniform(22, 40), rng.uniform(100, 122)) for _ in range(sites)]
+    result = []
+    for _ in range(users):
+        latitude, longitude = rng.choice(centers)
+        lang = "zh" if rng.random() < 0.9 else "en"
+        result.append((latitude + rng.gauss(0, 0.015), longitude + rng.gauss(0, 0.015), lang))
+    return result
+
+async def _run_round(fetch, users, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(latitude, longitude, lang):
+        async with semaphore:
+            start = time.perf_counter()
+            await fetch(latitude, longitude, lang)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(*user) for user in users))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return elapsed, latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+def _report(name: str, server: FakeWttrServer, before: int, users: int, elapsed: float, p95: float):
+    print(f"{name:>10} {server.requests - before:>10} {users / elapsed:>10.0f} {elapsed:>8.2f} {p95 * 1000:>9.1f}")
+
+async def run(users: int, sites: int, latency: float, concurrency: int):
+    server = FakeWttrServer(latency=latency)
+    await server.start()
+    population = make_users(users, sites)
+    print(f"{users} 个用户，{sites} 个水库，上游延迟 {latency * 1000:.0f} ms，并发 {concurrency}")
+    print(f"{'模式':>10} {'上游请求':>10} {'请求/秒':>10} {'耗时(s)':>8} {'p95(ms)':>9}")
+
+    # 客户端直连：每个设备缓存各自的结果，首次查询都会请求上游。
+    # 单个 httpx 连接池的连接数很多时本身开销很大，模拟的设备分到多个小连接池上
+    clients = [
+        httpx.AsyncClient(base_url=server.url, limits=httpx.Limits(max_connections=CLIENT_POOL_SIZE))
+        for _ in range(math.ceil(concurrency / CLIENT_POOL_SIZE))
+    ]
+    requests = itertools.count()
+
+    async def direct(latitude, longitude, lang):
+        client = clients[next(requests) % len(clients)]
+        response = await client.get("/", params={"format": "j1", "lang": lang, "q": f"{latitude},{longitude}"})
+        response.json()
+
+    before = server.requests
+    elapsed, p95 = await _run_round(direct, population, concurrency)
+    _report("直连", server, before, users, elapsed, p95)
+    for client in clients:
+        await client.aclose()
+
+    proxy = WeatherProxy(WttrUpstream(server.url, timeout=30, max_connections=20))
+    before = server.requests
+    elapsed, p95 = await _run_round(proxy.get_weather, population, concurrency)
+    _report("代理(冷)", server, before, users, elapsed, p95)
+
+    before = server.requests
+    elapsed, p95 = await _run_round(proxy.get_weather, population, concurrency)
+    _report("代理(热)", server, before, users, elapsed, p95)
+    stats = proxy.stats()
+    print(f"合并的未命中: {stats['coalesced']}，缓存单元: {len(proxy.cache)}")
+
+    await proxy.close()
+    await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="天气代理基准测试")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--sites", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.sites, args.latency, args.concurrency))
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+本地假wttr.in服务
+按 q=纬度,经度 生成确定的 format=j1 格式数据，可设置响应延迟，统计收到的请求数。
+供天气代理的基准测试和手工测试使用：
+
+    python benchmarks/fake_wttr.py --port 8081 --latency 0.2
+    WEATHER_UPSTREAM_URL=http://127.0.0.1:8081 python main.py
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import zlib
+from datetime import date, timedelta
+from functools import lru_cache
+from urllib.parse import parse_qs, urlsplit
+
+WEATHER_DESCRIPTIONS = [
+    (113, "Sunny", "晴"),
+    (116, "Partly cloudy", "局部多云"),
+    (119, "Cloudy", "多云"),
+    (122, "Overcast", "阴"),
+    (143, "Mist", "薄雾"),
+    (176, "Patchy rain possible", "局部有雨"),
+    (296, "Light rain", "小雨"),
+    (302, "Moderate rain", "中雨"),
+    (389, "Moderate or heavy rain with thunder", "雷阵雨"),
+]
+
+def _condition(rng: random.Random, lang: str) -> dict:
+    code, english, chinese = rng.choice(WEATHER_DESCRIPTIONS)
+    condition = {"weatherCode": str(code), "weatherDesc": [{"value": english}]}
+    if lang == "zh":
+        condition["lang_zh"] = [{"value": chinese}]
+    return condition
+
+def make_payload(latitude: float, longitude: float, lang: str = "zh", days: int = 3) -> dict:
+    """生成与wttr.in format=j1 结构一致的天气数据，同一坐标结果相同"""
+    rng = random.Random(zlib.crc32(f"{latitude:.4f},{longitude:.4f}".encode("ascii")))
+    base_temp = 28 - abs(latitude) * 0.4
+    current = {
+        "temp_C": str(round(base_temp + rng.uniform(-3, 3))),
+        "FeelsLikeC": str(round(base_temp + rng.uniform(-4, 4))),
+        "humidity": str(rng.randint(30, 95)),
+        "pressure": str(rng.randint(995, 1030)),
+        "windspeedKmph": str(rng.randint(0, 40)),
+        "cloudcover": str(rng.randint(0, 100)),
+        "visibility": str(rng.randint(2, 10)),
+        "uvIndex": str(rng.randint(1, 9)),
+        "precipMM": f"{rng.uniform(0, 3):.1f}",
+        "observation_time": "06:00 AM",
+        "localObsDateTime": f"{date.today().isoformat()} 02:00 PM",
+        **_condition(rng, lang),
+    }
+    weather = []
+    for offset in range(days):
+        hourly = []
+        for hour in range(0, 24, 3):
+            hourly.append({
+                "time": str(hour * 100),
+                "tempC": str(round(base_temp + rng.uniform(-6, 6))),
+                "FeelsLikeC": str(round(base_temp + rng.uniform(-7, 7))),
+                "DewPointC": str(round(base_temp - rng.uniform(2, 10))),
+                "humidity": str(rng.randint(30, 95)),
+                "pressure": str(rng.randint(995, 1030)),
+                "windspeedKmph": str(rng.randint(0, 40)),
+                "cloudcover": str(rng.randint(0, 100)),
+                "visibility": str(rng.randint(2, 10)),
+                "chanceofrain": str(rng.randint(0, 100)),
+                "uvIndex": str(rng.randint(1, 9)),
+                **_condition(rng, lang),
+            })
+        weather.append({
+            "date": (date.today() + timedelta(days=offset)).isoformat(),
+            "maxtempC": str(round(base_temp + 6)),
+            "mintempC": str(round(base_temp - 6)),
+            "sunHour": f"{rng.uniform(2, 12):.1f}",
+            "astronomy": [{
+                "sunrise": "05:48 AM", "sunset": "06:52 PM",
+                "moonrise": "09:12 PM", "moonset": "08:40 AM",
+                "moon_phase": "Waning Gibbous",
+            }],
+            "hourly": hourly,
+        })
+    return {
+        "current_condition": [current],
+        "nearest_area": [{
+            "areaName": [{"value": "Fake Reservoir"}],
+            "country": [{"value": "China"}],
+            "region": [{"value": "Test"}],
+            "latitude": f"{latitude:.3f}",
+            "longitude": f"{longitude:.3f}",
+        }],
+        "weather": weather,
+    }
+
+@lru_cache(maxsize=65536)
+def _encoded_payload(latitude: float, longitude: float, lang: str) -> bytes:
+    return json.dumps(make_payload(latitude, longitude, lang), ensure_ascii=False).encode("utf-8")
+
+class FakeWttrServer:
+    """最小的HTTP/1.1服务，支持keep-alive；每个请求等待latency秒后返回"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.requests = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                # 请求头只需要读完，不做解析
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                self.requests += 1
+                _, target, _ = request_line.decode("latin-1").split(" ", 2)
+                query = parse_qs(urlsplit(target).query)
+                status_line, body = "200 OK", b""
+                try:
+                    latitude, longitude = (float(v) for v in query["q"][0].split(","))
+                    lang = query.get("lang", ["zh"])[0]
+                    # 按0.01度生成并缓存数据，生成耗时不计入上游延迟
+                    body = _encoded_payload(round(latitude, 2), round(longitude, 2), lang)
+                except (KeyError, ValueError):
+                    status_line = "400 Bad Request"
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(
+                    f"HTTP/1.1 {status_line}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode("latin-1") + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+async def _serve(host: str, port: int, latency: float):
+    server = FakeWttrServer(host, port, latency)
+    await server.start()
+    print(f"假wttr.in服务: {server.url}（延迟 {latency}s）")
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地假wttr.in服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args.host, args.port, args.latency))
+    except KeyboardInterrupt:
+        pass
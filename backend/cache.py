@@ -0,0 +1,138 @@
+"""
+缓存模块
+进程内的LRU + TTL缓存，支持按标签失效和命中率统计
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+_MISSING = object()
+
+class TTLCache:
+    """容量有限的LRU缓存，每个条目带过期时间和标签
+
+    写操作调用 invalidate_tag 即可精确失效受影响的条目。
+    各worker进程分别持有自己的缓存，跨进程的一致性由TTL兜底。
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, float, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.RLock()
+
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，过期或不存在时返回default"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, tags: Iterable[str] = ()):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def ttl_remaining(self, key: Hashable) -> Optional[float]:
+        """返回条目剩余的有效时间（秒），不存在时返回None，不影响统计和LRU顺序"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        return entry[1] - time.monotonic()
+
+    def peek(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """返回未过期条目的 (值, 剩余有效时间)，不存在或已过期时返回None，不影响统计和LRU顺序"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        remaining = entry[1] - time.monotonic()
+        if remaining <= 0:
+            return None
+        return entry[0], remaining
+
+    def invalidate(self, key: Hashable):
+        """失效单个条目"""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_tag(self, tag: str):
+        """失效带有该标签的所有条目"""
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def _remove(self, key: Hashable):
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> dict:
+        """返回缓存统计信息"""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+# 所有缓存实例，用于统计导出
+caches: Dict[str, TTLCache] = {}
+
+def create_cache(name: str, maxsize: int = 1024, ttl: float = 60.0) -> TTLCache:
+    """创建并登记一个缓存实例"""
+    cache = TTLCache(name, maxsize=maxsize, ttl=ttl)
+    caches[name] = cache
+    return cache
+
+def get_cache_stats() -> Dict[str, dict]:
+    """返回所有缓存的统计信息"""
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -17,14 +17,90 @@ class Settings:
     def DATABASE_URL(self) -> str:
         return f"mysql+mysqlconnector://{self.DATABASE_USER}:{self.DATABASE_PASSWORD}@{self.DATABASE_HOST}:{self.DATABASE_PORT}/{self.DATABASE_NAME}"
     
+    # SQL日志配置
+    SQL_ECHO: bool = os.getenv("SQL_ECHO", "false").lower() == "true"  # 开发调试时输出全部SQL
+    SLOW_QUERY_SECONDS: float = float(os.getenv("SLOW_QUERY_SECONDS", "1.0"))
+
+    # 监控接口配置：/api/metrics、/api/db/stats、/api/cache/stats 需携带该令牌（Bearer），为空时关闭这些接口
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    
+    # 异步数据库URL（供 AsyncSession 使用）
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        return f"mysql+aiomysql://{self.DATABASE_USER}:{self.DATABASE_PASSWORD}@{self.DATABASE_HOST}:{self.DATABASE_PORT}/{self.DATABASE_NAME}"
+    
+    # 数据库连接池配置
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "80"))
+    
     # JWT配置
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
     
+    # 密码哈希配置
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))  # 工作因子，每加1耗时翻倍
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+    PASSWORD_HASH_QUEUE_SIZE: int = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "64"))  # 排队数超过后直接返回503
+    
     # 文件上传配置
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "./uploads")
     MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", "5242880"))  # 5MB
+    UPLOADS_CACHE_MAX_AGE: int = int(os.getenv("UPLOADS_CACHE_MAX_AGE", "31536000"))  # 上传文件不会修改，默认缓存一年
+    UPLOADS_ACCEL_REDIRECT: str = os.getenv("UPLOADS_ACCEL_REDIRECT", "")  # 配置Nginx内部location后由Nginx发送文件，如 /_uploads
+    UPLOAD_LEASE_HOURS: float = float(os.getenv("UPLOAD_LEASE_HOURS", "24"))  # 上传后等待发布鱼获的时间，过期未引用的文件会被清理
+    UPLOAD_GC_INTERVAL: float = float(os.getenv("UPLOAD_GC_INTERVAL", "3600"))  # 秒
+    
+    # 图片处理流水线配置
+    IMAGE_PIPELINE_WORKERS: int = int(os.getenv("IMAGE_PIPELINE_WORKERS", "2"))  # 进程数
+    IMAGE_WEBP_ENABLED: bool = os.getenv("IMAGE_WEBP_ENABLED", "false").lower() == "true"
+    IMAGE_JOB_TTL: float = float(os.getenv("IMAGE_JOB_TTL", "3600"))  # 任务状态保留时间（秒）
+    IMAGE_CACHE_DIR: str = os.getenv("IMAGE_CACHE_DIR", os.path.join(os.getenv("UPLOAD_DIR", "./uploads"), ".cache"))  # 按需缩放的图片缓存
+    IMAGE_CACHE_MAX_BYTES: int = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    
+    # 钓点内存索引配置
+    SPOT_INDEX_ENABLED: bool = os.getenv("SPOT_INDEX_ENABLED", "true").lower() == "true"
+    SPOT_INDEX_REFRESH_SECONDS: int = int(os.getenv("SPOT_INDEX_REFRESH_SECONDS", "300"))  # 定期全量重建，同步其他worker的写入
+    
+    # 读缓存配置
+    FEED_CACHE_SIZE: int = int(os.getenv("FEED_CACHE_SIZE", "256"))
+    FEED_CACHE_TTL: float = float(os.getenv("FEED_CACHE_TTL", "30"))  # 秒
+    NEARBY_CACHE_SIZE: int = int(os.getenv("NEARBY_CACHE_SIZE", "1024"))
+    NEARBY_CACHE_TTL: float = float(os.getenv("NEARBY_CACHE_TTL", "60"))  # 秒
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "4096"))
+    PRINCIPAL_CACHE_TTL: float = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))  # 秒，同时不超过令牌本身的有效期
+    
+    # 天气代理配置
+    WEATHER_UPSTREAM_URL: str = os.getenv("WEATHER_UPSTREAM_URL", "https://wttr.in")  # 测试时可指向本地假服务
+    WEATHER_UPSTREAM_TIMEOUT: float = float(os.getenv("WEATHER_UPSTREAM_TIMEOUT", "30"))  # 秒
+    WEATHER_UPSTREAM_MAX_CONNECTIONS: int = int(os.getenv("WEATHER_UPSTREAM_MAX_CONNECTIONS", "20"))
+    WEATHER_GRID_DEGREES: float = float(os.getenv("WEATHER_GRID_DEGREES", "0.1"))  # 网格边长（度），0.1度约11km
+    WEATHER_CACHE_SIZE: int = int(os.getenv("WEATHER_CACHE_SIZE", "20000"))
+    WEATHER_CACHE_TTL: float = float(os.getenv("WEATHER_CACHE_TTL", "600"))  # 秒，与客户端缓存时间一致
+    
+    # 天气插值配置：未缓存的单元由周围已缓存的单元反距离加权估计
+    WEATHER_INTERPOLATION_ENABLED: bool = os.getenv("WEATHER_INTERPOLATION_ENABLED", "true").lower() == "true"
+    WEATHER_INTERPOLATION_MIN_NEIGHBOURS: int = int(os.getenv("WEATHER_INTERPOLATION_MIN_NEIGHBOURS", "3"))
+    WEATHER_INTERPOLATION_MAX_KM: float = float(os.getenv("WEATHER_INTERPOLATION_MAX_KM", "16"))  # 相邻单元中心的最大距离
+    WEATHER_INTERPOLATION_MIN_TTL: float = float(os.getenv("WEATHER_INTERPOLATION_MIN_TTL", "120"))  # 秒，相邻单元数据的最少剩余有效期
+    WEATHER_INTERPOLATION_MAX_SPREAD: float = float(os.getenv("WEATHER_INTERPOLATION_MAX_SPREAD", "3"))  # °C，相邻单元同一时刻气温差超过时不插值
+    
+    # 天气预取配置：按近期请求量和钓点/鱼获密度排序，在缓存过期前刷新热门单元
+    WEATHER_PREFETCH_ENABLED: bool = os.getenv("WEATHER_PREFETCH_ENABLED", "true").lower() == "true"
+    WEATHER_PREFETCH_CELLS: int = int(os.getenv("WEATHER_PREFETCH_CELLS", "200"))  # 每轮最多保持预热的单元数
+    WEATHER_PREFETCH_CONCURRENCY: int = int(os.getenv("WEATHER_PREFETCH_CONCURRENCY", "4"))  # 同时进行的上游请求数
+    WEATHER_PREFETCH_INTERVAL: float = float(os.getenv("WEATHER_PREFETCH_INTERVAL", "60"))  # 秒
+    WEATHER_PREFETCH_MARGIN: float = float(os.getenv("WEATHER_PREFETCH_MARGIN", "180"))  # 剩余有效期低于此值时刷新，需大于间隔加抖动
+    WEATHER_PREFETCH_JITTER: float = float(os.getenv("WEATHER_PREFETCH_JITTER", "30"))  # 秒，各单元刷新时间随机错开
+    WEATHER_DEMAND_HALF_LIFE: float = float(os.getenv("WEATHER_DEMAND_HALF_LIFE", "43200"))  # 请求量的半衰期（秒）
+    WEATHER_DENSITY_REFRESH_SECONDS: float = float(os.getenv("WEATHER_DENSITY_REFRESH_SECONDS", "1800"))
+    WEATHER_DENSITY_DAYS: int = int(os.getenv("WEATHER_DENSITY_DAYS", "30"))  # 统计最近多少天的鱼获
+    
+    # 天气持久化缓存配置：本机所有worker共用，重启后仍然有效
+    WEATHER_STORE_ENABLED: bool = os.getenv("WEATHER_STORE_ENABLED", "true").lower() == "true"
+    WEATHER_STORE_PATH: str = os.getenv("WEATHER_STORE_PATH", "./data/weather_cache.db")  # SQLite文件，WAL模式
+    WEATHER_STORE_MAX_BYTES: int = int(os.getenv("WEATHER_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+    WEATHER_STORE_COMPACT_INTERVAL: float = float(os.getenv("WEATHER_STORE_COMPACT_INTERVAL", "300"))  # 秒
     
     # 服务器配置
     HOST: str = os.getenv("HOST", "0.0.0.0")
@@ -1,20 +1,71 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func, desc, asc
-from typing import List, Optional
-from models import User, FishingSpot, FishCatch, Like, Comment
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import and_, or_, func, desc, asc
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import math
+import os
+import numpy as np
+from fastapi import HTTPException, UploadFile
+from models import User, FishingSpot, FishCatch, Like, Comment, UploadedFile
 from schemas import UserCreate, UserUpdate, FishingSpotCreate, FishCatchCreate, CommentCreate
-from auth import get_password_hash, verify_password
-from utils import calculate_distance
+from utils import encode_cursor, decode_cursor, nearest_points, haversine_distances, KM_PER_DEGREE_LAT, encode_geohash, bounding_box, split_longitude_range, geohash_cover
+from utils import receive_upload, store_upload, content_address, content_address_digest, upload_url_to_path, delete_file, UPLOAD_EXTENSIONS
+from spatial_index import spot_index
+from image_pipeline import variant_urls, variant_files, variants_ready
+from cache import create_cache
+from config import settings
+from instrumentation import track_crud
+
+# 公开鱼获列表缓存：按页缓存，条目带上页内每条鱼获的标签，点赞/评论只失效包含该鱼获的页
+feed_cache = create_cache("fish_catch_feed", maxsize=settings.FEED_CACHE_SIZE, ttl=settings.FEED_CACHE_TTL)
+# 附近钓点缓存：查询原点对齐到约100米的网格，使邻近用户的查询命中同一条目
+nearby_cache = create_cache("nearby_fishing_spots", maxsize=settings.NEARBY_CACHE_SIZE, ttl=settings.NEARBY_CACHE_TTL)
+# 已认证用户缓存：按整个令牌的SHA-256缓存解析出的User对象，用户资料或密码变更时按用户标签失效
+principal_cache = create_cache("principals", maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL)
+
+FEED_TAG = "feed"
+SPOTS_TAG = "spots"
+NEARBY_CACHE_PRECISION = 3
+# 原点对齐到缓存网格后与真实坐标的最大距离（km）：半个网格的对角线
+NEARBY_SNAP_MARGIN_KM = 0.5 * 10 ** -NEARBY_CACHE_PRECISION * KM_PER_DEGREE_LAT * math.sqrt(2)
+
+def _catch_tag(catch_id: int) -> str:
+    return f"catch:{catch_id}"
+
+def user_tag(user_id: int) -> str:
+    return f"user:{user_id}"
+
+# 分页相关
+def _apply_keyset(query, created_column, id_column, cursor: Optional[str]):
+    """按 (created_at, id) 倒序做游标分页，只扫描游标之后的行"""
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            created_column < created_at,
+            and_(created_column == created_at, id_column < item_id)
+        ))
+    return query.order_by(desc(created_column), desc(id_column))
+
+def next_cursor(items: List[dict], limit: int, time_field: str = "created_at") -> Optional[str]:
+    """根据本页最后一条记录生成下一页游标，不足一页时返回None"""
+    if len(items) < limit or not items:
+        return None
+    last = items[-1]
+    return encode_cursor(last[time_field], last["id"])
 
 # 用户相关CRUD操作
+@track_crud
 def get_user(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
 
+@track_crud
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = get_password_hash(user.password)
+@track_crud
+def create_user(db: Session, user: UserCreate, hashed_password: str):
+    """创建用户；hashed_password 由调用方通过 auth.hash_password_async 在密码线程池中计算"""
     db_user = User(
         email=user.email,
         nickname=user.nickname,
@@ -26,99 +77,249 @@ def create_user(db: Session, user: UserCreate):
     db.refresh(db_user)
     return db_user
 
+@track_crud
 def update_user(db: Session, user_id: int, user_update: UserUpdate):
     db_user = db.query(User).filter(User.id == user_id).first()
     if db_user:
         update_data = user_update.dict(exclude_unset=True)
+        nickname_changed = "nickname" in update_data and update_data["nickname"] != db_user.nickname
         for key, value in update_data.items():
             setattr(db_user, key, value)
         db.commit()
         db.refresh(db_user)
+        principal_cache.invalidate_tag(user_tag(user_id))
+        # 鱼获列表和附近钓点的缓存条目带有作者昵称
+        if nickname_changed:
+            feed_cache.invalidate_tag(FEED_TAG)
+            nearby_cache.invalidate_tag(SPOTS_TAG)
     return db_user
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = get_user_by_email(db, email)
-    if not user or not verify_password(password, user.hashed_password):
-        return False
-    return user
-
-def change_password(db: Session, user_id: int, old_password: str, new_password: str):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user or not verify_password(old_password, user.hashed_password):
-        return False
-    
-    user.hashed_password = get_password_hash(new_password)
+@track_crud
+def change_password(db: Session, user_id: int, hashed_password: str) -> bool:
+    """写入新的密码哈希；旧密码校验和新密码哈希由调用方通过 auth 中的异步函数在密码线程池中完成"""
+    updated = db.query(User).filter(User.id == user_id).update(
+        {User.hashed_password: hashed_password}, synchronize_session=False
+    )
     db.commit()
-    return True
+    principal_cache.invalidate_tag(user_tag(user_id))
+    return bool(updated)
 
 # 钓点相关CRUD操作
+def _fishing_spot_to_dict(spot: FishingSpot, nickname: str, distance: Optional[float] = None) -> dict:
+    spot_dict = {
+        "id": spot.id,
+        "name": spot.name,
+        "description": spot.description,
+        "latitude": spot.latitude,
+        "longitude": spot.longitude,
+        "user_id": spot.user_id,
+        "user_name": nickname,
+        "is_public": spot.is_public,
+        "created_at": spot.created_at,
+        "updated_at": spot.updated_at,
+    }
+    if distance is not None:
+        spot_dict["distance"] = distance
+    return spot_dict
+
+@track_crud
 def create_fishing_spot(db: Session, spot: FishingSpotCreate, user_id: int):
-    db_spot = FishingSpot(**spot.dict(), user_id=user_id)
+    db_spot = FishingSpot(
+        **spot.dict(),
+        geohash=encode_geohash(spot.latitude, spot.longitude),
+        user_id=user_id
+    )
     db.add(db_spot)
     db.commit()
     db.refresh(db_spot)
+    if db_spot.is_public:
+        spot_index.add(db_spot.id, db_spot.latitude, db_spot.longitude)
+        nearby_cache.invalidate_tag(SPOTS_TAG)
     return db_spot
 
+@track_crud
 def get_fishing_spot(db: Session, spot_id: int):
     return db.query(FishingSpot).filter(FishingSpot.id == spot_id).first()
 
+def _get_fishing_spots_by_ids(db: Session, spot_ids: List[int]) -> dict:
+    """按主键批量读取钓点及作者昵称"""
+    if not spot_ids:
+        return {}
+    rows = db.query(FishingSpot, User.nickname).join(
+        User, FishingSpot.user_id == User.id
+    ).filter(
+        FishingSpot.id.in_(spot_ids),
+        FishingSpot.is_public == True
+    ).all()
+    return {spot.id: (spot, nickname) for spot, nickname in rows}
+
+@track_crud
+def get_fishing_spots_by_ids(db: Session, spot_ids: List[int]) -> List[dict]:
+    """按给定顺序返回公开钓点，不存在或未公开的跳过"""
+    spots = _get_fishing_spots_by_ids(db, spot_ids)
+    return [_fishing_spot_to_dict(*spots[spot_id]) for spot_id in dict.fromkeys(spot_ids) if spot_id in spots]
+
+@track_crud
+def get_activity_coordinates(db: Session, since: datetime) -> Tuple[np.ndarray, np.ndarray]:
+    """公开钓点和 since 之后鱼获的坐标，返回 (纬度数组, 经度数组)，用于统计各地的活跃程度"""
+    spots = db.query(FishingSpot.latitude, FishingSpot.longitude).filter(FishingSpot.is_public == True).all()
+    catches = db.query(FishCatch.latitude, FishCatch.longitude).filter(FishCatch.created_at >= since).all()
+    coords = np.array(spots + catches, dtype=np.float64).reshape(-1, 2)
+    return coords[:, 0], coords[:, 1]
+
+@track_crud
 def get_nearby_fishing_spots(db: Session, latitude: float, longitude: float, radius: float = 10.0, limit: int = 50):
-    """获取附近的钓点"""
+    """获取附近的钓点
+
+    候选钓点按对齐到缓存网格的原点检索并缓存，半径放宽对齐误差、数量取两倍，
+    邻近用户共用同一条目；距离、半径过滤和排序都按调用方的真实坐标计算。
+    内存索引就绪时由索引完成检索，只按主键读取结果钓点，否则走数据库检索。
+    """
+    snapped_lat = round(latitude, NEARBY_CACHE_PRECISION)
+    snapped_lon = round(longitude, NEARBY_CACHE_PRECISION)
+    cache_key = (snapped_lat, snapped_lon, radius, limit)
+    candidates = nearby_cache.get(cache_key)
+    if candidates is None:
+        candidates = _find_nearby_fishing_spots(db, snapped_lat, snapped_lon, radius + NEARBY_SNAP_MARGIN_KM, limit * 2)
+        nearby_cache.set(cache_key, candidates, tags=(SPOTS_TAG,))
+    
+    result = _rank_nearby_candidates(candidates, snapped_lat, snapped_lon, latitude, longitude, radius, limit, limit * 2)
+    if result is None:
+        # 候选被截断且不足以确定真实坐标的结果（钓点非常密集），直接按真实坐标检索
+        candidates = _find_nearby_fishing_spots(db, latitude, longitude, radius, limit)
+        result = _rank_nearby_candidates(candidates, latitude, longitude, latitude, longitude, radius, limit, None)
+    return result
+
+def _find_nearby_fishing_spots(db: Session, latitude: float, longitude: float, radius: float, limit: int):
+    if spot_index.is_ready:
+        hits = spot_index.nearby(latitude, longitude, radius, limit)
+        spots = _get_fishing_spots_by_ids(db, [spot_id for spot_id, _ in hits])
+        return [
+            _fishing_spot_to_dict(*spots[spot_id], round(distance, 2))
+            for spot_id, distance in hits
+            if spot_id in spots
+        ]
+    return _get_nearby_fishing_spots_from_db(db, latitude, longitude, radius, limit)
+
+def _rank_nearby_candidates(
+    candidates: List[dict],
+    origin_lat: float,
+    origin_lon: float,
+    latitude: float,
+    longitude: float,
+    radius: float,
+    limit: int,
+    candidate_limit: Optional[int],
+) -> Optional[List[dict]]:
+    """按真实坐标重新计算候选钓点的距离，返回半径内最近的limit个
+
+    候选是从 origin 按 candidate_limit 截断的结果时，被截掉的钓点离 origin 不近于最后一个候选；
+    最后一个候选比第limit个结果远出两倍对齐误差以上，才能确定没有遗漏，否则返回None。
+    """
+    if not candidates:
+        return []
+    lats = [spot["latitude"] for spot in candidates]
+    lons = [spot["longitude"] for spot in candidates]
+    indices, distances = nearest_points(latitude, longitude, lats, lons, k=limit, radius=radius)
+    if candidate_limit is not None and len(candidates) >= candidate_limit:
+        cutoff = float(distances[-1]) if len(indices) >= limit else radius
+        farthest = float(haversine_distances(origin_lat, origin_lon, lats[-1:], lons[-1:])[0])
+        if farthest < cutoff + 2 * NEARBY_SNAP_MARGIN_KM:
+            return None
+    return [
+        {**candidates[i], "distance": round(float(distance), 2)}
+        for i, distance in zip(indices.tolist(), distances.tolist())
+    ]
+
+def _get_nearby_fishing_spots_from_db(db: Session, latitude: float, longitude: float, radius: float, limit: int):
+    """从数据库检索附近的钓点
+
+    先用geohash前缀和经纬度外接矩形在索引上圈定候选钓点，再精确计算距离，
+    返回半径内距离最近的limit个钓点。
+    """
+    min_lat, min_lon, max_lat, max_lon = bounding_box(latitude, longitude, radius)
+    cells = geohash_cover(min_lat, min_lon, max_lat, max_lon)
+
     spots = db.query(FishingSpot, User.nickname).join(
         User, FishingSpot.user_id == User.id
     ).filter(
-        FishingSpot.is_public == True
-    ).order_by(desc(FishingSpot.created_at)).limit(limit).all()
+        FishingSpot.is_public == True,
+        or_(*[FishingSpot.geohash.like(f"{cell}%") for cell in cells]),
+        FishingSpot.latitude.between(min_lat, max_lat),
+        or_(*[
+            FishingSpot.longitude.between(lo, hi)
+            for lo, hi in split_longitude_range(min_lon, max_lon)
+        ])
+    ).all()
     
-    # 计算距离并过滤
-    nearby_spots = []
-    for spot, nickname in spots:
-        distance = calculate_distance(latitude, longitude, spot.latitude, spot.longitude)
-        if distance <= radius:
-            spot_dict = {
-                "id": spot.id,
-                "name": spot.name,
-                "description": spot.description,
-                "latitude": spot.latitude,
-                "longitude": spot.longitude,
-                "user_id": spot.user_id,
-                "user_name": nickname,
-                "is_public": spot.is_public,
-                "distance": distance,
-                "created_at": spot.created_at,
-                "updated_at": spot.updated_at,
-            }
-            nearby_spots.append(spot_dict)
+    # 一次性计算所有候选点的距离，按半径过滤并取最近的limit个
+    indices, distances = nearest_points(
+        latitude,
+        longitude,
+        [spot.latitude for spot, _ in spots],
+        [spot.longitude for spot, _ in spots],
+        k=limit,
+        radius=radius
+    )
     
-    # 按距离排序
-    nearby_spots.sort(key=lambda x: x["distance"])
-    return nearby_spots
+    return [
+        _fishing_spot_to_dict(spots[i][0], spots[i][1], round(float(distance), 2))
+        for i, distance in zip(indices.tolist(), distances.tolist())
+    ]
 
-def get_user_fishing_spots(db: Session, user_id: int, page: int = 1, limit: int = 20):
-    """获取用户的钓点列表"""
-    offset = (page - 1) * limit
+@track_crud
+def get_fishing_spots_in_viewport(
+    db: Session,
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    limit: int = 200
+):
+    """获取地图视野范围内的钓点
+
+    min_lon 大于 max_lon 时视为跨越180度经线的视野。
+    """
+    if min_lon > max_lon:
+        max_lon += 360.0
+    
+    if spot_index.is_ready:
+        spot_ids = spot_index.in_viewport(min_lat, min_lon, max_lat, max_lon, limit)
+        spots = _get_fishing_spots_by_ids(db, spot_ids)
+        return [_fishing_spot_to_dict(*spots[spot_id]) for spot_id in spot_ids if spot_id in spots]
+    
     spots = db.query(FishingSpot, User.nickname).join(
         User, FishingSpot.user_id == User.id
+    ).filter(
+        FishingSpot.is_public == True,
+        FishingSpot.latitude.between(min_lat, max_lat),
+        or_(*[
+            FishingSpot.longitude.between(lo, hi)
+            for lo, hi in split_longitude_range(min_lon, max_lon)
+        ])
+    ).limit(limit).all()
+    
+    return [_fishing_spot_to_dict(spot, nickname) for spot, nickname in spots]
+
+@track_crud
+def get_user_fishing_spots(db: Session, user_id: int, page: int = 1, limit: int = 20, cursor: Optional[str] = None):
+    """获取用户的钓点列表
+
+    传入cursor时按游标分页，page仅用于兼容旧客户端。
+    """
+    query = db.query(FishingSpot, User.nickname).join(
+        User, FishingSpot.user_id == User.id
     ).filter(
         FishingSpot.user_id == user_id
-    ).offset(offset).limit(limit).all()
+    )
+    query = _apply_keyset(query, FishingSpot.created_at, FishingSpot.id, cursor)
+    if not cursor:
+        query = query.offset((page - 1) * limit)
+    spots = query.limit(limit).all()
     
-    return [
-        {
-            "id": spot.id,
-            "name": spot.name,
-            "description": spot.description,
-            "latitude": spot.latitude,
-            "longitude": spot.longitude,
-            "user_id": spot.user_id,
-            "user_name": nickname,
-            "is_public": spot.is_public,
-            "created_at": spot.created_at,
-            "updated_at": spot.updated_at,
-        }
-        for spot, nickname in spots
-    ]
+    return [_fishing_spot_to_dict(spot, nickname) for spot, nickname in spots]
 
+@track_crud
 def delete_fishing_spot(db: Session, spot_id: int, user_id: int):
     """删除钓点"""
     spot = db.query(FishingSpot).filter(
@@ -127,129 +328,328 @@ def delete_fishing_spot(db: Session, spot_id: int, user_id: int):
     if spot:
         db.delete(spot)
         db.commit()
+        spot_index.remove(spot_id)
+        nearby_cache.invalidate_tag(SPOTS_TAG)
         return True
     return False
 
+# 上传文件相关CRUD操作
+@track_crud
+def save_upload(db: Session, file: UploadFile) -> str:
+    """按内容哈希保存上传文件并登记，相同内容只保存一份，返回文件URL
+
+    登记记录加行锁后再落盘，与引用归零时的删除互斥；每次上传都把保留期限延长到
+    UPLOAD_LEASE_HOURS 之后，期间即使引用该内容的其他鱼获被删除，文件也不会被删掉。
+    """
+    temp_path, digest, size = receive_upload(file)
+    lease_expires_at = datetime.utcnow() + timedelta(hours=settings.UPLOAD_LEASE_HOURS)
+    try:
+        url = "/uploads/" + content_address(digest, UPLOAD_EXTENSIONS[file.content_type])
+        record = db.query(UploadedFile).filter(UploadedFile.url == url).with_for_update().first()
+        if record is None:
+            db.add(UploadedFile(url=url, sha256=digest, size=size, ref_count=0, lease_expires_at=lease_expires_at))
+            db.flush()
+        else:
+            record.lease_expires_at = lease_expires_at
+        store_upload(temp_path, url)
+        db.commit()
+        return url
+    except IntegrityError:
+        # 并发上传了相同内容，对方已经登记，延长对方记录的保留期限
+        db.rollback()
+        db.query(UploadedFile).filter(UploadedFile.url == url).update(
+            {UploadedFile.lease_expires_at: lease_expires_at}, synchronize_session=False
+        )
+        store_upload(temp_path, url)
+        db.commit()
+        return url
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _acquire_upload(db: Session, url: Optional[str]):
+    """增加上传文件的引用数，未登记的文件（旧版扁平目录、外部链接）忽略
+
+    登记记录已被删除（如保留期限过后被清理）时，文件仍在则重新登记，否则拒绝引用。
+    """
+    if not url:
+        return
+    digest = content_address_digest(url)
+    if digest is None:
+        return
+    updated = db.query(UploadedFile).filter(UploadedFile.url == url).update(
+        {UploadedFile.ref_count: UploadedFile.ref_count + 1}, synchronize_session=False
+    )
+    if updated:
+        return
+    # 先插入记录再检查文件：并发的清理要么已经删完文件，要么会看到这条记录而跳过删除
+    try:
+        with db.begin_nested():
+            db.add(UploadedFile(url=url, sha256=digest, size=0, ref_count=1))
+    except IntegrityError:
+        # 并发的请求已经重新登记
+        db.query(UploadedFile).filter(UploadedFile.url == url).update(
+            {UploadedFile.ref_count: UploadedFile.ref_count + 1}, synchronize_session=False
+        )
+        return
+    source_path = upload_url_to_path(url)
+    if source_path is None or not os.path.exists(source_path):
+        db.rollback()
+        raise HTTPException(status_code=400, detail="图片已失效，请重新上传")
+    db.query(UploadedFile).filter(UploadedFile.url == url).update(
+        {UploadedFile.size: os.path.getsize(source_path)}, synchronize_session=False
+    )
+
+def _release_upload(db: Session, url: Optional[str]) -> Optional[str]:
+    """减少上传文件的引用数，归零且保留期限已过时删除登记记录
+
+    返回需要删除文件的URL，调用方在提交事务后交给 _remove_upload_files。
+    """
+    if not url or not url.startswith("/uploads/"):
+        return None
+    record = db.query(UploadedFile).filter(UploadedFile.url == url).with_for_update().first()
+    if record is None:
+        return None
+    if record.ref_count > 1:
+        record.ref_count -= 1
+        return None
+    if record.lease_expires_at is not None and record.lease_expires_at > datetime.utcnow():
+        record.ref_count = 0
+        return None
+    db.delete(record)
+    return url
+
+def lock_removed_upload(db: Session, url: str) -> bool:
+    """重新锁定该URL，登记记录仍不存在时返回True，可以删除文件
+
+    同一内容在此期间被重新上传或登记时返回False；记录不存在时的锁同样阻止并发的登记，
+    调用方删除文件后再提交事务释放锁。
+    """
+    return db.query(UploadedFile.id).filter(UploadedFile.url == url).with_for_update().first() is None
+
+def delete_upload_files(url: str):
+    """删除原图和尺寸版本文件，只做磁盘操作"""
+    source_path = upload_url_to_path(url)
+    if source_path is not None:
+        for path in [source_path] + variant_files(source_path):
+            delete_file(path)
+
+def _remove_upload_files(db: Session, url: str):
+    """删除原图和尺寸版本，须在删除登记记录的事务提交之后调用"""
+    try:
+        if lock_removed_upload(db, url):
+            delete_upload_files(url)
+    finally:
+        db.commit()
+
+@track_crud
+def collect_expired_uploads(db: Session, batch_size: int = 100) -> int:
+    """删除没有引用且保留期限已过的上传文件，返回删除的文件数
+
+    升级前登记的记录没有保留期限，按登记时间判断；created_at 为数据库本地时间，多留一天余量。
+    """
+    total = 0
+    while True:
+        now = datetime.utcnow()
+        legacy_before = now - timedelta(hours=settings.UPLOAD_LEASE_HOURS, days=1)
+        records = db.query(UploadedFile).filter(
+            UploadedFile.ref_count <= 0,
+            or_(
+                UploadedFile.lease_expires_at < now,
+                and_(UploadedFile.lease_expires_at.is_(None), UploadedFile.created_at < legacy_before),
+            ),
+        ).limit(batch_size).with_for_update().all()
+        if not records:
+            return total
+        urls = [record.url for record in records]
+        for record in records:
+            db.delete(record)
+        db.commit()
+        for url in urls:
+            _remove_upload_files(db, url)
+        total += len(urls)
+
 # 鱼获相关CRUD操作
+def _fish_catch_to_dict(catch: FishCatch, user_name: str, is_liked: bool) -> dict:
+    return {
+        "id": catch.id,
+        "fish_type": catch.fish_type,
+        "weight": catch.weight,
+        "description": catch.description,
+        "latitude": catch.latitude,
+        "longitude": catch.longitude,
+        "location_name": catch.location_name,
+        "image_url": catch.image_url,
+        "image_variants": catch.image_variants,
+        "user_id": catch.user_id,
+        "user_name": user_name,
+        "is_public": catch.is_public,
+        "likes": catch.likes_count or 0,
+        "comments": catch.comments_count or 0,
+        "is_liked": is_liked,
+        "created_at": catch.created_at,
+        "updated_at": catch.updated_at,
+    }
+
+def _ready_variant_urls(image_url: Optional[str]):
+    """尺寸版本已全部生成时返回其URL，否则返回None，避免列表给出不存在的缩略图"""
+    if image_url and image_url.startswith("/uploads/") and variants_ready(image_url):
+        return variant_urls(image_url)
+    return None
+
+@track_crud
 def create_fish_catch(db: Session, catch: FishCatchCreate, user_id: int):
-    db_catch = FishCatch(**catch.dict(), user_id=user_id)
+    """创建鱼获；图片的尺寸版本尚未生成时 image_variants 为空，生成完成后由 record_image_variants 补上"""
+    db_catch = FishCatch(**catch.dict(), image_variants=_ready_variant_urls(catch.image_url), user_id=user_id)
     db.add(db_catch)
+    _acquire_upload(db, catch.image_url)
     db.commit()
     db.refresh(db_catch)
+    # 版本在检查之后、提交之前生成完成时，完成回调看不到这条鱼获，这里再补一次
+    if db_catch.image_variants is None and _ready_variant_urls(catch.image_url) is not None:
+        record_image_variants(db, catch.image_url)
+        db.refresh(db_catch)
+    feed_cache.invalidate_tag(FEED_TAG)
     return db_catch
 
+@track_crud
+def record_image_variants(db: Session, image_url: str) -> int:
+    """尺寸版本生成完成后，为使用该图片且还没有记录的鱼获写入 image_variants，返回更新的鱼获数"""
+    variants = _ready_variant_urls(image_url)
+    if variants is None:
+        return 0
+    updated = db.query(FishCatch).filter(
+        FishCatch.image_url == image_url,
+        FishCatch.image_variants.is_(None),
+    ).update({FishCatch.image_variants: variants}, synchronize_session=False)
+    db.commit()
+    if updated:
+        feed_cache.invalidate_tag(FEED_TAG)
+    return updated
+
+@track_crud
 def get_fish_catch(db: Session, catch_id: int):
     return db.query(FishCatch).filter(FishCatch.id == catch_id).first()
 
-def get_fish_catches(db: Session, page: int = 1, limit: int = 20, current_user_id: Optional[int] = None):
-    """获取鱼获列表"""
-    offset = (page - 1) * limit
-    
-    # 基础查询
-    query = db.query(
-        FishCatch,
-        User.nickname.label("user_name"),
-        func.count(Like.id).label("likes_count"),
-        func.count(Comment.id).label("comments_count")
-    ).join(
-        User, FishCatch.user_id == User.id
-    ).outerjoin(
-        Like, FishCatch.id == Like.fish_catch_id
-    ).outerjoin(
-        Comment, FishCatch.id == Comment.fish_catch_id
-    ).filter(
-        FishCatch.is_public == True
-    ).group_by(FishCatch.id).order_by(desc(FishCatch.created_at))
-    
-    # 分页
-    catches = query.offset(offset).limit(limit).all()
-    
-    result = []
-    for catch, user_name, likes_count, comments_count in catches:
-        # 检查当前用户是否点赞了这条记录
-        is_liked = False
-        if current_user_id:
-            like_exists = db.query(Like).filter(
-                and_(Like.fish_catch_id == catch.id, Like.user_id == current_user_id)
-            ).first()
-            is_liked = like_exists is not None
+@track_crud
+def get_fish_catches(
+    db: Session,
+    page: int = 1,
+    limit: int = 20,
+    current_user_id: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    """获取鱼获列表
+
+    传入cursor时按游标分页，page仅用于兼容旧客户端。
+    列表对所有用户相同，经缓存读取后再补上当前用户的点赞状态。
+    """
+    cache_key = (cursor, None if cursor else page, limit)
+    catches = feed_cache.get(cache_key)
+    if catches is None:
+        # 基础查询，点赞数和评论数直接读取计数列
+        query = db.query(FishCatch, User.nickname).join(
+            User, FishCatch.user_id == User.id
+        ).filter(
+            FishCatch.is_public == True
+        )
         
-        result.append({
-            "id": catch.id,
-            "fish_type": catch.fish_type,
-            "weight": catch.weight,
-            "description": catch.description,
-            "latitude": catch.latitude,
-            "longitude": catch.longitude,
-            "location_name": catch.location_name,
-            "image_url": catch.image_url,
-            "user_id": catch.user_id,
-            "user_name": user_name,
-            "is_public": catch.is_public,
-            "likes": likes_count or 0,
-            "comments": comments_count or 0,
-            "is_liked": is_liked,
-            "created_at": catch.created_at,
-            "updated_at": catch.updated_at,
-        })
+        # 分页
+        query = _apply_keyset(query, FishCatch.created_at, FishCatch.id, cursor)
+        if not cursor:
+            query = query.offset((page - 1) * limit)
+        catches = [
+            _fish_catch_to_dict(catch, user_name, False)
+            for catch, user_name in query.limit(limit).all()
+        ]
+        feed_cache.set(
+            cache_key,
+            catches,
+            tags=(FEED_TAG, *(_catch_tag(catch["id"]) for catch in catches))
+        )
     
-    return result
-
-def get_user_fish_catches(db: Session, user_id: int, page: int = 1, limit: int = 20):
-    """获取用户的鱼获列表"""
-    offset = (page - 1) * limit
+    # 一次查询取出当前用户在本页点赞过的鱼获
+    liked_ids = set()
+    if current_user_id:
+        liked_ids = get_liked_catch_ids(db, current_user_id, [catch["id"] for catch in catches])
     
-    query = db.query(
-        FishCatch,
-        User.nickname.label("user_name"),
-        func.count(Like.id).label("likes_count"),
-        func.count(Comment.id).label("comments_count")
-    ).join(
+    return [{**catch, "is_liked": catch["id"] in liked_ids} for catch in catches]
+
+@track_crud
+def get_user_fish_catches(db: Session, user_id: int, page: int = 1, limit: int = 20, cursor: Optional[str] = None):
+    """获取用户的鱼获列表
+
+    传入cursor时按游标分页，page仅用于兼容旧客户端。
+    """
+    query = db.query(FishCatch, User.nickname).join(
         User, FishCatch.user_id == User.id
-    ).outerjoin(
-        Like, FishCatch.id == Like.fish_catch_id
-    ).outerjoin(
-        Comment, FishCatch.id == Comment.fish_catch_id
     ).filter(
         FishCatch.user_id == user_id
-    ).group_by(FishCatch.id).order_by(desc(FishCatch.created_at))
+    )
     
-    catches = query.offset(offset).limit(limit).all()
+    query = _apply_keyset(query, FishCatch.created_at, FishCatch.id, cursor)
+    if not cursor:
+        query = query.offset((page - 1) * limit)
+    catches = query.limit(limit).all()
     
-    return [
-        {
-            "id": catch.id,
-            "fish_type": catch.fish_type,
-            "weight": catch.weight,
-            "description": catch.description,
-            "latitude": catch.latitude,
-            "longitude": catch.longitude,
-            "location_name": catch.location_name,
-            "image_url": catch.image_url,
-            "user_id": catch.user_id,
-            "user_name": user_name,
-            "is_public": catch.is_public,
-            "likes": likes_count or 0,
-            "comments": comments_count or 0,
-            "is_liked": False,
-            "created_at": catch.created_at,
-            "updated_at": catch.updated_at,
-        }
-        for catch, user_name, likes_count, comments_count in catches
-    ]
+    return [_fish_catch_to_dict(catch, user_name, False) for catch, user_name in catches]
 
+@track_crud
 def delete_fish_catch(db: Session, catch_id: int, user_id: int):
     """删除鱼获"""
+    deleted, orphan_url = delete_fish_catch_record(db, catch_id, user_id)
+    if orphan_url is not None:
+        _remove_upload_files(db, orphan_url)
+    return deleted
+
+@track_crud
+def delete_fish_catch_record(db: Session, catch_id: int, user_id: int) -> Tuple[bool, Optional[str]]:
+    """删除鱼获记录并提交，返回 (是否删除, 需要删除文件的图片URL)，文件由调用方删除"""
     catch = db.query(FishCatch).filter(
         and_(FishCatch.id == catch_id, FishCatch.user_id == user_id)
     ).first()
-    if catch:
-        db.delete(catch)
+    if not catch:
+        return False, None
+    db.delete(catch)
+    orphan_url = _release_upload(db, catch.image_url)
+    db.commit()
+    feed_cache.invalidate_tag(FEED_TAG)
+    return True, orphan_url
+
+def _increment_fish_catch_counter(db: Session, catch_id: int, column, delta: int):
+    """原子更新鱼获的计数列，不会减到0以下"""
+    query = db.query(FishCatch).filter(FishCatch.id == catch_id)
+    if delta < 0:
+        query = query.filter(column >= -delta)
+    query.update({column: column + delta}, synchronize_session=False)
+
+@track_crud
+def reconcile_fish_catch_counters(db: Session, batch_size: int = 1000) -> int:
+    """按真实的点赞和评论记录重建所有鱼获的计数列
+
+    按id区间分批更新，避免长时间锁表。返回处理的鱼获数量。
+    """
+    likes_subquery = db.query(func.count(Like.id)).filter(
+        Like.fish_catch_id == FishCatch.id
+    ).scalar_subquery()
+    comments_subquery = db.query(func.count(Comment.id)).filter(
+        Comment.fish_catch_id == FishCatch.id
+    ).scalar_subquery()
+    
+    max_id = db.query(func.max(FishCatch.id)).scalar() or 0
+    total = 0
+    for batch_start in range(1, max_id + 1, batch_size):
+        total += db.query(FishCatch).filter(
+            FishCatch.id.between(batch_start, batch_start + batch_size - 1)
+        ).update({
+            FishCatch.likes_count: likes_subquery,
+            FishCatch.comments_count: comments_subquery,
+        }, synchronize_session=False)
         db.commit()
-        return True
-    return False
+    return total
 
 # 点赞相关CRUD操作
+@track_crud
 def like_fish_catch(db: Session, catch_id: int, user_id: int):
     """点赞鱼获"""
     # 检查是否已经点赞
@@ -260,12 +660,15 @@ def like_fish_catch(db: Session, catch_id: int, user_id: int):
     if existing_like:
         return False  # 已经点赞了
     
-    # 添加点赞
+    # 添加点赞，并在同一事务中更新计数
     like = Like(fish_catch_id=catch_id, user_id=user_id)
     db.add(like)
+    _increment_fish_catch_counter(db, catch_id, FishCatch.likes_count, 1)
     db.commit()
+    feed_cache.invalidate_tag(_catch_tag(catch_id))
     return True
 
+@track_crud
 def unlike_fish_catch(db: Session, catch_id: int, user_id: int):
     """取消点赞"""
     like = db.query(Like).filter(
@@ -274,54 +677,49 @@ def unlike_fish_catch(db: Session, catch_id: int, user_id: int):
     
     if like:
         db.delete(like)
+        _increment_fish_catch_counter(db, catch_id, FishCatch.likes_count, -1)
         db.commit()
+        feed_cache.invalidate_tag(_catch_tag(catch_id))
         return True
     return False
 
-def get_user_liked_catches(db: Session, user_id: int, page: int = 1, limit: int = 20):
-    """获取用户点赞的鱼获"""
-    offset = (page - 1) * limit
-    
-    query = db.query(
-        FishCatch,
-        User.nickname.label("user_name"),
-        func.count(Like.id).label("likes_count"),
-        func.count(Comment.id).label("comments_count")
-    ).join(
+@track_crud
+def get_liked_catch_ids(db: Session, user_id: int, catch_ids: List[int]) -> set:
+    """返回catch_ids中用户点赞过的鱼获id集合"""
+    if not catch_ids:
+        return set()
+    rows = db.query(Like.fish_catch_id).filter(
+        Like.user_id == user_id,
+        Like.fish_catch_id.in_(catch_ids)
+    ).all()
+    return {fish_catch_id for fish_catch_id, in rows}
+
+@track_crud
+def get_user_liked_catches(db: Session, user_id: int, page: int = 1, limit: int = 20, cursor: Optional[str] = None):
+    """获取用户点赞的鱼获
+
+    按点赞时间倒序；同一用户对同一鱼获只有一条点赞，(点赞时间, 鱼获id) 可唯一确定游标位置。
+    """
+    query = db.query(FishCatch, Like.created_at, User.nickname).join(
         Like, FishCatch.id == Like.fish_catch_id
     ).join(
         User, FishCatch.user_id == User.id
-    ).outerjoin(
-        Comment, FishCatch.id == Comment.fish_catch_id
     ).filter(
         Like.user_id == user_id
-    ).group_by(FishCatch.id).order_by(desc(Like.created_at))
+    )
     
-    catches = query.offset(offset).limit(limit).all()
+    query = _apply_keyset(query, Like.created_at, FishCatch.id, cursor)
+    if not cursor:
+        query = query.offset((page - 1) * limit)
+    catches = query.limit(limit).all()
     
     return [
-        {
-            "id": catch.id,
-            "fish_type": catch.fish_type,
-            "weight": catch.weight,
-            "description": catch.description,
-            "latitude": catch.latitude,
-            "longitude": catch.longitude,
-            "location_name": catch.location_name,
-            "image_url": catch.image_url,
-            "user_id": catch.user_id,
-            "user_name": user_name,
-            "is_public": catch.is_public,
-            "likes": likes_count or 0,
-            "comments": comments_count or 0,
-            "is_liked": True,
-            "created_at": catch.created_at,
-            "updated_at": catch.updated_at,
-        }
-        for catch, user_name, likes_count, comments_count in catches
+        {**_fish_catch_to_dict(catch, user_name, True), "liked_at": liked_at}
+        for catch, liked_at, user_name in catches
     ]
 
 # 评论相关CRUD操作
+@track_crud
 def create_comment(db: Session, comment: CommentCreate, user_id: int):
     """创建评论"""
     db_comment = Comment(
@@ -331,10 +729,13 @@ def create_comment(db: Session, comment: CommentCreate, user_id: int):
         parent_id=comment.parent_id
     )
     db.add(db_comment)
+    _increment_fish_catch_counter(db, comment.fish_catch_id, FishCatch.comments_count, 1)
     db.commit()
+    feed_cache.invalidate_tag(_catch_tag(comment.fish_catch_id))
     db.refresh(db_comment)
     return db_comment
 
+@track_crud
 def get_fish_catch_comments(db: Session, catch_id: int):
     """获取鱼获的评论"""
     comments = db.query(Comment, User.nickname).join(
@@ -1,19 +1,43 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from typing import List
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
+from instrumentation import install_sql_instrumentation
 
 # 创建数据库引擎
 engine = create_engine(
     settings.DATABASE_URL,
-    echo=True,  # 开发环境下显示SQL语句
+    echo=settings.SQL_ECHO,  # 开发调试时可通过 SQL_ECHO=true 输出全部SQL
     pool_pre_ping=True,  # 自动重连
     pool_recycle=3600,   # 连接回收时间
 )
 
+# 注册SQL耗时统计
+install_sql_instrumentation(engine)
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 创建异步数据库引擎，路由处理函数通过它等待数据库而不阻塞事件循环
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+)
+
+# 创建异步会话工厂（提交后不过期对象，返回的ORM对象在会话外仍可读取）
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+install_sql_instrumentation(async_engine.sync_engine)
+
 # 创建基类
 Base = declarative_base()
 
@@ -23,4 +47,46 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# 依赖注入：获取异步数据库会话
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+class QueryCounter:
+    """统计代码块内执行的SQL语句，用于发现N+1查询
+
+    用法:
+        with QueryCounter() as counter:
+            crud.get_fish_catches(db, current_user_id=1)
+        print(counter.count, counter.statements)
+    """
+
+    def __init__(self, bind=None):
+        self.bind = bind if bind is not None else engine
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.bind, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event.remove(self.bind, "before_cursor_execute", self._before_cursor_execute)
+        return False
+
+@contextmanager
+def assert_max_queries(max_count: int, bind=None):
+    """断言代码块内执行的SQL语句不超过max_count条"""
+    with QueryCounter(bind) as counter:
+        yield counter
+    if counter.count > max_count:
+        statements = "\n".join(f"  {i + 1}. {statement}" for i, statement in enumerate(counter.statements))
+        raise AssertionError(f"预期最多执行 {max_count} 条SQL，实际执行了 {counter.count} 条:\n{statements}")
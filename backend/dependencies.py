@@ -3,70 +3,91 @@
 避免循环导入
 """
 
-from fastapi import Depends, HTTPException, status
+import hashlib
+import hmac
+import time
+from typing import Optional
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from jose import JWTError, jwt
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+import async_crud
 import crud
+from auth import decode_request_token, token_email
 from config import settings
 from logging_config import backend_logger
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    """获取当前用户"""
-    backend_logger.info(f"===== 开始用户认证 =====")
-    backend_logger.info(f"收到的Token: {credentials.credentials[:30]}...")
-    
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    try:
-        # 解码JWT token
-        backend_logger.info(f"正在解码JWT Token...")
-        payload = jwt.decode(
-            credentials.credentials, 
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM]
+async def get_current_user(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取当前用户
+
+    令牌解析出的用户按整个令牌的SHA-256缓存，命中时既不解码令牌也不查询数据库；
+    只按签名段做键时，篡改头部或载荷、保留签名的令牌会命中已缓存的用户。
+    缓存有效期不超过令牌的过期时间，用户资料或密码变更时失效。
+    """
+    token = credentials.credentials
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    user = crud.principal_cache.get(cache_key)
+    if user is None:
+        credentials_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-        
-        # 打印payload内容以调试
-        backend_logger.info(f"JWT Payload: {payload}")
-        
-        # 尝试从不同字段获取email
-        email: str = payload.get("email") or payload.get("sub")
-        backend_logger.info(f"解析出的email: {email}")
-        
+
+        # 中间件已经解码过时直接复用结果
+        payload = decode_request_token(request, token)
+        email = token_email(payload)
         if email is None:
-            backend_logger.error("Token中没有找到email或sub字段")
-            backend_logger.error(f"Payload内容: {payload}")
+            backend_logger.warning("Token中没有找到email或sub字段")
+            raise credentials_exception
+
+        # 从数据库获取用户
+        user = await async_crud.get_user_by_email(db, email=email)
+        if user is None:
+            backend_logger.warning("数据库中未找到用户: %s", email)
             raise credentials_exception
-            
-    except jwt.ExpiredSignatureError:
-        backend_logger.error("Token已过期")
+
+        # 缓存与会话分离的对象，跨请求共享时不会触发延迟加载
+        db.expunge(user)
+        ttl = crud.principal_cache.ttl
+        if "exp" in payload:
+            ttl = min(ttl, payload["exp"] - time.time())
+        if ttl > 0:
+            crud.principal_cache.set(cache_key, user, ttl=ttl, tags=(crud.user_tag(user.id),))
+        backend_logger.debug("用户认证成功: %s (ID: %s)", email, user.id)
+
+    request.state.user_id = user.id
+    return user
+
+async def get_current_user_optional(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取当前用户，未登录或Token无效时返回None"""
+    if credentials is None:
+        return None
+    try:
+        return await get_current_user(request, credentials, db)
+    except HTTPException:
+        return None
+
+async def require_metrics_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """监控接口鉴权：未配置 METRICS_TOKEN 时接口不存在，令牌不符时返回401"""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(credentials.credentials, settings.METRICS_TOKEN):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired",
+            detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    except JWTError as e:
-        backend_logger.error(f"JWT解码失败: {str(e)}")
-        raise credentials_exception
-    except Exception as e:
-        backend_logger.error(f"认证过程中发生未知错误: {str(e)}")
-        raise credentials_exception
-    
-    # 从数据库获取用户
-    backend_logger.info(f"正在从数据库查询用户: {email}")
-    user = crud.get_user_by_email(db, email=email)
-    if user is None:
-        backend_logger.error(f"数据库中未找到用户: {email}")
-        raise credentials_exception
-    
-    backend_logger.info(f"用户认证成功: {email} (ID: {user.id})")
-    backend_logger.info(f"===== 认证完成 =====")
-    return user
\ No newline at end of file
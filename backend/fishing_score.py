@@ -0,0 +1,367 @@
+"""
+钓鱼适宜度评分模块
+与客户端 lib/models/fishing_weather_model.dart 的规则一致：8项因素各自打分后求和，按总分分为4个等级。
+score_arrays 对任意形状的数组（如 地点 x 小时）一次算出全部评分；score_hour 是逐条计算的参考实现。
+
+运行 python fishing_score.py 检查两种实现与客户端阈值的一致性。
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# 评分项，与客户端 scoreDetails 的键和顺序一致
+FACTORS = (
+    "pressure", "weather", "rainChance", "cloudCover",
+    "windSpeed", "temperature", "humidity", "visibility",
+)
+
+# 适宜度等级，下标即等级编号
+GRADES = ("excellent", "good", "moderate", "poor")
+# 各等级的最低总分（poor 无下限）
+GRADE_THRESHOLDS = (12, 8, 4)
+
+# 逐小时预报中各评分项对应的 wttr.in 字段
+HOURLY_FIELDS = {
+    "pressure": "pressure",
+    "rainChance": "chanceofrain",
+    "cloudCover": "cloudcover",
+    "windSpeed": "windspeedKmph",
+    "temperature": "tempC",
+    "humidity": "humidity",
+    "visibility": "visibility",
+}
+
+ADVICE = {
+    "zh": {
+        "excellent": "非常适宜钓鱼，鱼群活跃，建议出钓！",
+        "good": "适宜钓鱼，条件良好，可以考虑出钓。",
+        "moderate": "钓鱼条件一般，鱼获可能不稳定。",
+        "poor": "不适宜钓鱼，建议选择其他时间。",
+        "pressure": "气压较低，鱼群活性可能降低。",
+        "windSpeed": "风速较大，建议选择背风处钓鱼。",
+        "visibility": "能见度较低，注意安全。",
+    },
+    "en": {
+        "excellent": "Excellent fishing conditions! Fish are likely to be active. Highly recommended!",
+        "good": "Good fishing conditions. Favorable weather for fishing.",
+        "moderate": "Moderate fishing conditions. Catch may be inconsistent.",
+        "poor": "Poor fishing conditions. Consider choosing another time.",
+        "pressure": "Low pressure may reduce fish activity.",
+        "windSpeed": "Strong wind, choose sheltered spots.",
+        "visibility": "Poor visibility, be cautious.",
+    },
+}
+
+# Dart int.tryParse 接受的十进制整数
+_INT_RE = re.compile(r"^[+-]?[0-9]+$")
+
+def parse_int(value) -> int:
+    """与客户端 int.tryParse(value ?? '0') ?? 0 一致：不是整数（如 "1.5"、空值）时为0"""
+    if value is None:
+        return 0
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    value = str(value).strip()
+    return int(value) if _INT_RE.match(value) else 0
+
+@lru_cache(maxsize=1024)
+def weather_desc_score(description: str) -> int:
+    """天气描述的评分，按描述中的关键字判断（与客户端相同，英文 Mist 不含 rain/fog，记2分）"""
+    text = description.lower()
+    if not any(word in text for word in ("rain", "雨", "fog", "雾")):
+        return 2
+    if any(word in text for word in ("light rain", "小雨", "patchy rain", "零星")):
+        return 0
+    if any(word in text for word in ("fog", "雾", "mist", "薄雾")):
+        return -1
+    return -2  # 大雨或其他恶劣天气
+
+def grade_of(score: int) -> str:
+    for grade, threshold in zip(GRADES, GRADE_THRESHOLDS):
+        if score >= threshold:
+            return grade
+    return GRADES[-1]
+
+def build_advice(grade: str, details: Dict[str, int], lang: str = "zh") -> str:
+    """等级建议加上气压、风速、能见度的提示，与客户端 advice 字段一致"""
+    texts = ADVICE.get(lang, ADVICE["zh"])
+    parts = [texts[grade]]
+    for factor in ("pressure", "windSpeed", "visibility"):
+        if details[factor] < 0:
+            parts.append(texts[factor])
+    return " ".join(parts)
+
+def hourly_weather_desc(hourly: dict, lang: str = "zh") -> str:
+    """按语言取逐小时预报的天气描述，与客户端 Hourly.fromJsonWithLanguage 一致"""
+    if lang != "en":
+        values = hourly.get("lang_zh")
+        if values is not None:
+            if isinstance(values, list) and values:
+                value = values[0].get("value")
+                return "未知天气" if value is None else value
+        else:
+            for language in hourly.get("languages") or ():
+                if (language.get("lang_name") in ("Chinese Simplified", "Chinese")
+                        or language.get("lang_iso") == "zh"):
+                    value = language.get("day_text")
+                    if value is None:
+                        value = language.get("night_text")
+                    return "未知天气" if value is None else value
+        return "未知天气"
+    values = hourly.get("weatherDesc")
+    if isinstance(values, list) and values:
+        value = values[0].get("value")
+        return "Unknown" if value is None else value
+    return "Unknown"
+
+def score_hour(hourly: dict, lang: str = "zh") -> dict:
+    """逐条计算单个小时的评分（参考实现），hourly 为 wttr.in 的逐小时预报"""
+    details = {}
+
+    pressure = parse_int(hourly.get("pressure"))
+    if 1005 <= pressure <= 1015:
+        details["pressure"] = 2
+    elif pressure > 1015:
+        details["pressure"] = 1
+    else:
+        details["pressure"] = -1
+
+    details["weather"] = weather_desc_score(hourly_weather_desc(hourly, lang))
+
+    rain_chance = parse_int(hourly.get("chanceofrain"))
+    if rain_chance < 30:
+        details["rainChance"] = 2
+    elif rain_chance <= 60:
+        details["rainChance"] = 0
+    else:
+        details["rainChance"] = -1
+
+    cloud_cover = parse_int(hourly.get("cloudcover"))
+    if 20 <= cloud_cover <= 60:
+        details["cloudCover"] = 2
+    elif cloud_cover < 20 or cloud_cover <= 80:
+        details["cloudCover"] = 0
+    else:
+        details["cloudCover"] = -1
+
+    wind_speed = parse_int(hourly.get("windspeedKmph"))
+    if 2 <= wind_speed <= 10:
+        details["windSpeed"] = 2
+    elif wind_speed < 2 or wind_speed <= 15:
+        details["windSpeed"] = 0
+    else:
+        details["windSpeed"] = -2
+
+    temperature = parse_int(hourly.get("tempC"))
+    if 15 <= temperature <= 30:
+        details["temperature"] = 2
+    elif temperature < 15 or temperature <= 35:
+        details["temperature"] = 0
+    else:
+        details["temperature"] = -2
+
+    humidity = parse_int(hourly.get("humidity"))
+    if 40 <= humidity <= 80:
+        details["humidity"] = 2
+    elif humidity < 40 or humidity <= 90:
+        details["humidity"] = 0
+    else:
+        details["humidity"] = -1
+
+    visibility = parse_int(hourly.get("visibility"))
+    if visibility > 5:
+        details["visibility"] = 2
+    elif visibility >= 2:
+        details["visibility"] = 0
+    else:
+        details["visibility"] = -2
+
+    score = sum(details.values())
+    grade = grade_of(score)
+    return {
+        "score": score,
+        "suitability": grade,
+        "scoreDetails": details,
+        "advice": build_advice(grade, details, lang),
+    }
+
+def _band(values: np.ndarray, low: int, high: int, inside: int, below: int, above: int, far_above: int = None,
+          far_threshold: int = None) -> np.ndarray:
+    """低于 low 记 below 分，[low, high] 内记 inside 分，高于 high 记 above 分，高于 far_threshold 记 far_above 分"""
+    result = np.where(values < low, below, np.where(values <= high, inside, above))
+    if far_threshold is not None:
+        result = np.where(values > far_threshold, far_above, result)
+    return result.astype(np.int8)
+
+def score_arrays(
+    pressure,
+    weather_desc,
+    rain_chance,
+    cloud_cover,
+    wind_speed,
+    temperature,
+    humidity,
+    visibility,
+) -> Dict[str, np.ndarray]:
+    """对逐小时预报数组批量评分
+
+    数值参数为整数数组（形状可广播），weather_desc 为天气描述字符串数组。
+    返回 FACTORS 中各项的分数数组，以及总分 "score" 和等级编号 "grade"（GRADES 的下标）。
+    """
+    pressure = np.asarray(pressure, dtype=np.int64)
+    rain_chance = np.asarray(rain_chance, dtype=np.int64)
+    cloud_cover = np.asarray(cloud_cover, dtype=np.int64)
+    wind_speed = np.asarray(wind_speed, dtype=np.int64)
+    temperature = np.asarray(temperature, dtype=np.int64)
+    humidity = np.asarray(humidity, dtype=np.int64)
+    visibility = np.asarray(visibility, dtype=np.int64)
+
+    # 天气描述只有几十种，每种只判断一次关键字
+    descriptions = np.asarray(weather_desc, dtype=object)
+    flat = descriptions.ravel().tolist()
+    lookup = {text: weather_desc_score(str(text)) for text in set(flat)}
+    weather = np.fromiter(map(lookup.__getitem__, flat), dtype=np.int8, count=len(flat)).reshape(descriptions.shape)
+
+    scores = {
+        "pressure": _band(pressure, 1005, 1015, 2, -1, 1),
+        "weather": weather,
+        "rainChance": _band(rain_chance, 30, 60, 0, 2, -1),
+        "cloudCover": _band(cloud_cover, 20, 60, 2, 0, 0, -1, 80),
+        "windSpeed": _band(wind_speed, 2, 10, 2, 0, 0, -2, 15),
+        "temperature": _band(temperature, 15, 30, 2, 0, 0, -2, 35),
+        "humidity": _band(humidity, 40, 80, 2, 0, 0, -1, 90),
+        "visibility": _band(visibility, 2, 5, 0, -2, 2),
+    }
+    total = sum(scores[factor].astype(np.int16) for factor in FACTORS)
+    grade = np.full(total.shape, len(GRADES) - 1, dtype=np.int8)
+    # 从低到高覆盖，总分达到的最高等级生效
+    for index in range(len(GRADE_THRESHOLDS) - 1, -1, -1):
+        grade[total >= GRADE_THRESHOLDS[index]] = index
+    scores["score"] = total
+    scores["grade"] = grade
+    return scores
+
+def forecast_arrays(payloads: Iterable[Optional[dict]], lang: str = "zh") -> Dict[str, np.ndarray]:
+    """把多个地点的 wttr.in format=j1 数据整理为 (地点, 小时) 的数组
+
+    各地点的小时数不同时按最多的补齐，"valid" 标记有数据的位置；
+    "date" 和 "time" 为对应的日期和时刻（如 "2024-05-01"、"900"）。
+    """
+    rows: List[List[dict]] = []
+    for payload in payloads:
+        hours = []
+        for day in (payload or {}).get("weather") or ():
+            for hourly in day.get("hourly") or ():
+                hours.append((day.get("date", ""), hourly))
+        rows.append(hours)
+
+    shape = (len(rows), max((len(hours) for hours in rows), default=0))
+    arrays = {factor: np.zeros(shape, dtype=np.int64) for factor in HOURLY_FIELDS}
+    arrays["weather_desc"] = np.full(shape, "", dtype=object)
+    arrays["date"] = np.full(shape, "", dtype=object)
+    arrays["time"] = np.full(shape, "", dtype=object)
+    arrays["valid"] = np.zeros(shape, dtype=bool)
+    for row, hours in enumerate(rows):
+        for column, (day, hourly) in enumerate(hours):
+            for factor, field in HOURLY_FIELDS.items():
+                arrays[factor][row, column] = parse_int(hourly.get(field))
+            arrays["weather_desc"][row, column] = hourly_weather_desc(hourly, lang)
+            arrays["date"][row, column] = day
+            arrays["time"][row, column] = str(hourly.get("time", ""))
+            arrays["valid"][row, column] = True
+    return arrays
+
+def score_forecasts(payloads: Iterable[Optional[dict]], lang: str = "zh") -> Dict[str, np.ndarray]:
+    """对多个地点的全部逐小时预报评分，返回 score_arrays 的结果加上 forecast_arrays 的 valid/date/time"""
+    arrays = forecast_arrays(payloads, lang)
+    scores = score_arrays(
+        arrays["pressure"], arrays["weather_desc"], arrays["rainChance"], arrays["cloudCover"],
+        arrays["windSpeed"], arrays["temperature"], arrays["humidity"], arrays["visibility"],
+    )
+    scores.update(valid=arrays["valid"], date=arrays["date"], time=arrays["time"])
+    return scores
+
+def best_windows(score: np.ndarray, grade: np.ndarray, usable: np.ndarray):
+    """按行找出最佳时段
+
+    每行取可用时刻中总分最高的一个（同分取最早），向前后扩展到等级相同的连续可用时刻。
+    返回 (最佳下标, 时段起点下标, 时段终点下标, 是否有可用时刻)，终点含在时段内。
+    """
+    rows, columns = score.shape
+    has_usable = usable.any(axis=1)
+    if columns == 0:
+        empty = np.zeros(rows, dtype=np.int64)
+        return empty, empty, empty, has_usable
+    best = np.where(usable, score, np.iinfo(np.int16).min).argmax(axis=1)
+    best_grade = grade[np.arange(rows), best]
+    same = usable & (grade == best_grade[:, None])
+    index = np.arange(columns)
+    before = index[None, :] <= best[:, None]
+    start = np.where(~same & before, index, -1).max(axis=1) + 1
+    end = np.where(~same & ~before, index, columns).min(axis=1) - 1
+    return best, start, end, has_usable
+
+# 客户端阈值的边界用例：(字段, 值, 期望分数)，取自 fishing_weather_model.dart
+_DART_BOUNDARY_CASES = [
+    ("pressure", "1004", -1), ("pressure", "1005", 2), ("pressure", "1015", 2), ("pressure", "1016", 1),
+    ("pressure", None, -1), ("pressure", "1010.5", -1),
+    ("chanceofrain", "29", 2), ("chanceofrain", "30", 0), ("chanceofrain", "60", 0), ("chanceofrain", "61", -1),
+    ("cloudcover", "19", 0), ("cloudcover", "20", 2), ("cloudcover", "60", 2), ("cloudcover", "61", 0),
+    ("cloudcover", "80", 0), ("cloudcover", "81", -1),
+    ("windspeedKmph", "1", 0), ("windspeedKmph", "2", 2), ("windspeedKmph", "10", 2), ("windspeedKmph", "11", 0),
+    ("windspeedKmph", "15", 0), ("windspeedKmph", "16", -2),
+    ("tempC", "14", 0), ("tempC", "15", 2), ("tempC", "30", 2), ("tempC", "31", 0), ("tempC", "35", 0),
+    ("tempC", "36", -2), ("tempC", "-5", 0),
+    ("humidity", "39", 0), ("humidity", "40", 2), ("humidity", "80", 2), ("humidity", "81", 0),
+    ("humidity", "90", 0), ("humidity", "91", -1),
+    ("visibility", "1", -2), ("visibility", "2", 0), ("visibility", "5", 0), ("visibility", "6", 2),
+]
+
+_DART_WEATHER_CASES = [
+    ("Sunny", 2), ("Partly cloudy", 2), ("Mist", 2), ("Light rain", 0), ("Patchy rain possible", 0),
+    ("Fog", -1), ("Freezing fog", -1), ("Moderate rain", -2), ("Heavy rain", -2),
+    ("晴", 2), ("多云", 2), ("小雨", 0), ("零星小雨", 0), ("雾", -1), ("薄雾", -1), ("中雨", -2), ("雷阵雨", -2),
+]
+
+_FACTOR_OF_FIELD = {field: factor for factor, field in HOURLY_FIELDS.items()}
+
+def _check_parity(samples: int = 20000, seed: int = 0):
+    """检查参考实现与客户端阈值一致、向量化实现与参考实现一致"""
+    for field, value, expected in _DART_BOUNDARY_CASES:
+        actual = score_hour({field: value})["scoreDetails"][_FACTOR_OF_FIELD[field]]
+        assert actual == expected, f"{field}={value!r}: 期望 {expected}，实际 {actual}"
+    for description, expected in _DART_WEATHER_CASES:
+        assert weather_desc_score(description) == expected, f"天气描述 {description!r}"
+    for score, expected in ((12, "excellent"), (11, "good"), (8, "good"), (7, "moderate"), (4, "moderate"),
+                            (3, "poor"), (-10, "poor")):
+        assert grade_of(score) == expected, f"总分 {score}"
+
+    rng = np.random.default_rng(seed)
+    descriptions = [description for description, _ in _DART_WEATHER_CASES]
+    hours = []
+    for _ in range(samples):
+        hours.append({
+            "pressure": str(rng.integers(990, 1035)),
+            "chanceofrain": str(rng.integers(0, 101)),
+            "cloudcover": str(rng.integers(0, 101)),
+            "windspeedKmph": str(rng.integers(0, 30)),
+            "tempC": str(rng.integers(-10, 45)),
+            "humidity": str(rng.integers(10, 101)),
+            "visibility": str(rng.integers(0, 11)),
+            "weatherDesc": [{"value": descriptions[rng.integers(len(descriptions))]}],
+        })
+    payload = {"weather": [{"date": "2024-01-01", "hourly": hours}]}
+    scores = score_forecasts([payload], lang="en")
+    for column, hourly in enumerate(hours):
+        expected = score_hour(hourly, lang="en")
+        assert int(scores["score"][0, column]) == expected["score"], hourly
+        assert GRADES[scores["grade"][0, column]] == expected["suitability"], hourly
+        for factor in FACTORS:
+            assert int(scores[factor][0, column]) == expected["scoreDetails"][factor], (factor, hourly)
+    print(f"一致性检查通过：{len(_DART_BOUNDARY_CASES) + len(_DART_WEATHER_CASES)} 个客户端边界用例，{samples} 条随机预报")
+
+if __name__ == "__main__":
+    _check_parity()
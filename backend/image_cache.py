@@ -0,0 +1,174 @@
+"""
+按需缩放图片缓存模块
+第一次请求某个尺寸时在进程池中生成并写入磁盘缓存，缓存总大小超出上限时按LRU淘汰
+"""
+
+import asyncio
+import hashlib
+import os
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from cache import caches
+from config import settings
+from image_pipeline import run_in_pool
+from utils import compress_image
+
+# 允许的输出宽度，请求的宽度向上取整到其中之一，限制每张图的缓存条目数
+IMAGE_WIDTHS = (64, 128, 256, 320, 480, 640, 720, 960, 1200, 1600)
+
+# 输出格式 -> (Pillow格式, 质量)
+IMAGE_FORMATS = {
+    "jpg": ("JPEG", 85),
+    "webp": ("WEBP", 80),
+}
+
+def snap_width(width: int) -> int:
+    """把请求的宽度向上取整到允许的宽度"""
+    index = bisect_left(IMAGE_WIDTHS, width)
+    return IMAGE_WIDTHS[min(index, len(IMAGE_WIDTHS) - 1)]
+
+def render_variant(source_path: str, output_path: str, width: int, fmt: str) -> int:
+    """生成缩放后的图片，返回文件大小；在图片处理进程池中执行"""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    image_format, quality = IMAGE_FORMATS[fmt]
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        if not compress_image(source_path, quality=quality, max_width=width, output_path=temp_path, format=image_format):
+            raise ValueError(f"图片处理失败: {source_path}")
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return os.path.getsize(output_path)
+
+def _scan(directory: str) -> List[Tuple[float, str, int]]:
+    """扫描缓存目录，返回按修改时间排序的 (修改时间, 相对路径, 大小)"""
+    entries = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat_result.st_mtime, os.path.relpath(path, directory), stat_result.st_size))
+    entries.sort()
+    return entries
+
+def _touch(path: str) -> bool:
+    """更新修改时间，重启后重新扫描仍能保持LRU顺序；文件不存在时返回False"""
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+def _remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class ImageVariantCache:
+    """磁盘上的缩放图片缓存
+
+    索引只在事件循环线程中修改；同一尺寸的并发请求合并为一次缩放。
+    各worker进程分别维护自己的索引，被其他进程淘汰的文件按未命中处理。
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # 相对路径 -> 字节数
+        self._total_bytes = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        # 统计计数，字段与 TTLCache.stats 一致
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, source_path: str, stat_result: os.stat_result, width: int, fmt: str) -> str:
+        raw = f"{source_path}|{stat_result.st_size}|{stat_result.st_mtime_ns}|{width}|{fmt}"
+        digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+        return f"{digest[:2]}/{digest}.{fmt}"
+
+    async def _load(self):
+        async with self._load_lock:
+            if self._loaded:
+                return
+            entries = await run_in_threadpool(_scan, self.directory)
+            for _, key, size in entries:
+                self._entries[key] = size
+                self._total_bytes += size
+            self._loaded = True
+            await self._evict()
+
+    async def _evict(self, incoming: int = 0):
+        """淘汰最久未使用的条目，为即将写入的 incoming 字节腾出空间"""
+        removed = []
+        while self._total_bytes + incoming > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            removed.append(os.path.join(self.directory, key))
+        if removed:
+            await run_in_threadpool(_remove_files, removed)
+
+    async def _render(self, key: str, source_path: str, path: str, width: int, fmt: str) -> str:
+        size = await run_in_pool(render_variant, source_path, path, width, fmt)
+        self._total_bytes -= self._entries.pop(key, 0)
+        # 先淘汰再登记，刚生成的文件不会被立即删除
+        await self._evict(size)
+        self._entries[key] = size
+        self._total_bytes += size
+        return path
+
+    async def get(self, source_path: str, stat_result: os.stat_result, width: int, fmt: str) -> str:
+        """返回缩放后图片的缓存文件路径，不存在时生成"""
+        if not self._loaded:
+            await self._load()
+
+        key = self._key(source_path, stat_result, width, fmt)
+        path = os.path.join(self.directory, key)
+        if key in self._entries:
+            if await run_in_threadpool(_touch, path):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return path
+            self._total_bytes -= self._entries.pop(key)
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._render(key, source_path, path, width, fmt))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # 客户端断开不取消缩放，其他等待同一尺寸的请求仍可使用结果
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": None,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+image_cache = ImageVariantCache(settings.IMAGE_CACHE_DIR, settings.IMAGE_CACHE_MAX_BYTES)
+# 登记到缓存统计，随 /api/cache/stats 和 /api/metrics 导出
+caches["image_variants"] = image_cache
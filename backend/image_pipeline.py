@@ -0,0 +1,238 @@
+"""
+图片处理流水线
+上传接口只保存原图并立即返回，各尺寸版本在进程池中异步生成
+"""
+
+import asyncio
+import multiprocessing
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image
+
+from cache import create_cache
+from config import settings
+from logging_config import backend_logger
+from utils import content_address, content_address_digest, open_image, resize_image, upload_url_to_path
+
+# 尺寸版本 -> 最大宽度（像素）
+IMAGE_VARIANTS = {
+    "thumb": 320,    # 列表缩略图
+    "medium": 720,   # 详情页
+    "full": 1200,    # 大图查看
+}
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+JOB_PENDING = "pending"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# 任务状态缓存在提交任务的进程；其他worker和缓存过期后以磁盘上的版本文件和失败标记为准
+_jobs = create_cache("image_jobs", maxsize=10000, ttl=settings.IMAGE_JOB_TTL)
+
+# 按内容哈希存储的原图，任务ID为 "sha256.扩展名"，任何worker都能据此找到原图
+_CONTENT_JOB_ID = re.compile(r"([0-9a-f]{64})\.(\w+)")
+
+# 生成失败时与原图放在同一目录的标记文件，内容为错误信息
+FAILED_MARKER = "failed"
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# 尺寸版本生成完成后的回调，参数为原图URL
+_ready_listeners: List[Callable[[str], None]] = []
+
+def on_variants_ready(listener: Callable[[str], None]):
+    """登记尺寸版本生成完成后的回调，在进程池的结果线程中调用；重复登记只保留一个"""
+    if listener not in _ready_listeners:
+        _ready_listeners.append(listener)
+
+def variant_path(path: str, name: str, extension: str = "jpg") -> str:
+    """尺寸版本与原图放在同一目录：photo.png -> photo.thumb.jpg"""
+    root, _ = os.path.splitext(path)
+    return f"{root}.{name}.{extension}"
+
+def variant_urls(image_url: Optional[str]) -> Optional[Dict[str, str]]:
+    """根据原图URL推导各尺寸版本的URL，非本站上传的图片返回None"""
+    if not image_url or not image_url.startswith("/uploads/"):
+        return None
+    urls = {name: variant_path(image_url, name) for name in IMAGE_VARIANTS}
+    if settings.IMAGE_WEBP_ENABLED:
+        urls.update({f"{name}_webp": variant_path(image_url, name, "webp") for name in IMAGE_VARIANTS})
+    return urls
+
+def variant_files(source_path: str) -> List[str]:
+    """原图对应的所有尺寸版本文件和失败标记的路径（不论是否已生成）"""
+    return [
+        variant_path(source_path, name, extension)
+        for name in IMAGE_VARIANTS
+        for extension in ("jpg", "webp")
+    ] + [variant_path(source_path, FAILED_MARKER, "txt")]
+
+def variants_ready(image_url: str) -> bool:
+    """尺寸版本是否已经全部生成"""
+    source_path = upload_url_to_path(image_url)
+    if source_path is None:
+        return False
+    return all(os.path.exists(variant_path(source_path, name)) for name in IMAGE_VARIANTS)
+
+def _save_atomic(img: Image.Image, path: str, format: str, **options):
+    """先写临时文件再改名，读取方不会看到写了一半的文件"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        img.save(temp_path, format, **options)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def generate_variants(source_path: str, webp: bool = False) -> Dict[str, str]:
+    """解码一次原图，生成所有尺寸版本，返回 {版本名: 文件路径}
+
+    在工作进程中执行，也可以直接调用（如历史数据补齐）。
+    """
+    outputs = {}
+    # 只按最大的版本解码，较小的版本从解码结果缩放
+    img = open_image(source_path, max(IMAGE_VARIANTS.values()))
+    for name, max_width in IMAGE_VARIANTS.items():
+        variant = resize_image(img, max_width)
+        path = variant_path(source_path, name)
+        _save_atomic(variant, path, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        outputs[name] = path
+        if webp:
+            path = variant_path(source_path, name, "webp")
+            _save_atomic(variant, path, "WEBP", quality=WEBP_QUALITY, method=4)
+            outputs[f"{name}_webp"] = path
+    return outputs
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # 此时进程内已有日志、线程池等线程在运行，fork 可能复制被持有的锁导致工作进程死锁，改用 spawn
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_PIPELINE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+def _reset_executor(broken: ProcessPoolExecutor):
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def _job_id(image_url: str) -> str:
+    """按内容哈希存储的原图用哈希作任务ID，其他原图用随机ID"""
+    digest = content_address_digest(image_url)
+    if digest is None:
+        return uuid.uuid4().hex
+    return f"{digest}.{os.path.splitext(image_url)[1][1:]}"
+
+def _done_status(job_id: str, image_url: str) -> dict:
+    return {
+        "job_id": job_id,
+        "status": JOB_DONE,
+        "image_url": image_url,
+        "variants": variant_urls(image_url),
+    }
+
+def _failed_status(job_id: str, image_url: str, error: str) -> dict:
+    return {
+        "job_id": job_id,
+        "status": JOB_FAILED,
+        "image_url": image_url,
+        "error": error,
+    }
+
+def _finish_job(job_id: str, image_url: str, future: Future):
+    error = "任务已取消" if future.cancelled() else future.exception()
+    if error is None:
+        _jobs.set(job_id, _done_status(job_id, image_url))
+        for listener in _ready_listeners:
+            try:
+                listener(image_url)
+            except Exception as e:
+                backend_logger.error("尺寸版本完成回调失败: %s: %s", image_url, e)
+    else:
+        backend_logger.error("图片处理失败: %s: %s", image_url, error)
+        _jobs.set(job_id, _failed_status(job_id, image_url, str(error)))
+        # 写入失败标记，轮询到其他worker时也能看到失败
+        try:
+            with open(variant_path(upload_url_to_path(image_url), FAILED_MARKER, "txt"), "w", encoding="utf-8") as f:
+                f.write(str(error))
+        except OSError as e:
+            backend_logger.warning("写入图片处理失败标记失败: %s: %s", image_url, e)
+
+def submit_image(image_url: str) -> str:
+    """提交尺寸版本生成任务，立即返回任务ID"""
+    source_path = upload_url_to_path(image_url)
+    if source_path is None:
+        raise ValueError(f"不是本站上传的图片: {image_url}")
+
+    job_id = _job_id(image_url)
+    _jobs.set(job_id, {"job_id": job_id, "status": JOB_PENDING, "image_url": image_url})
+    # 重新提交时清除上次的失败标记
+    marker = variant_path(source_path, FAILED_MARKER, "txt")
+    if os.path.exists(marker):
+        os.remove(marker)
+
+    executor = _get_executor()
+    try:
+        future = executor.submit(generate_variants, source_path, settings.IMAGE_WEBP_ENABLED)
+    except BrokenProcessPool:
+        # 工作进程异常退出后进程池不可再用，重建一次
+        backend_logger.warning("图片处理进程池已损坏，重新创建")
+        _reset_executor(executor)
+        future = _get_executor().submit(generate_variants, source_path, settings.IMAGE_WEBP_ENABLED)
+    future.add_done_callback(lambda f: _finish_job(job_id, image_url, f))
+    return job_id
+
+async def run_in_pool(func: Callable, *args):
+    """在图片处理进程池中执行，供请求内需要等待结果的处理使用"""
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    try:
+        return await loop.run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        backend_logger.warning("图片处理进程池已损坏，重新创建")
+        _reset_executor(executor)
+        return await loop.run_in_executor(_get_executor(), func, *args)
+
+def get_job_status(job_id: str) -> Optional[dict]:
+    """返回任务状态，任务不存在时返回None
+
+    任务由其他worker提交或状态已过期时，按内容哈希找到原图，以版本文件和失败标记判断状态。
+    """
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job
+    match = _CONTENT_JOB_ID.fullmatch(job_id)
+    if match is None:
+        return None
+    image_url = "/uploads/" + content_address(*match.groups())
+    source_path = upload_url_to_path(image_url)
+    if source_path is None or not os.path.exists(source_path):
+        return None
+    if variants_ready(image_url):
+        return _done_status(job_id, image_url)
+    try:
+        with open(variant_path(source_path, FAILED_MARKER, "txt"), encoding="utf-8") as f:
+            return _failed_status(job_id, image_url, f.read())
+    except FileNotFoundError:
+        return {"job_id": job_id, "status": JOB_PENDING, "image_url": image_url}
+
+def shutdown_image_pipeline():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
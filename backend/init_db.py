@@ -10,10 +10,15 @@ import sys
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, inspect
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.orm import Session
 from config import settings
-from models import Base
+from models import Base, FishingSpot, FishCatch
+import crud
 from database import engine
+from utils import encode_geohash, upload_url_to_path
+from image_pipeline import generate_variants, variant_urls
 
 def create_database_if_not_exists():
     """创建数据库（如果不存在）"""
@@ -48,6 +53,105 @@ def create_tables():
         print(f"创建表失败: {e}")
         return False
 
+def upgrade_schema():
+    """为已存在的表补充新增的列和索引
+
+    create_all 只会创建缺失的表，已有表上新增的列和索引需要在这里补齐。
+    返回新增列的集合（"表名.列名"），失败时返回None。
+    """
+    added_columns = set()
+    try:
+        inspector = inspect(engine)
+        existing_tables = set(inspector.get_table_names())
+        with engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                if table.name not in existing_tables:
+                    continue
+                
+                existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name not in existing_columns:
+                        column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                        connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+                        added_columns.add(f"{table.name}.{column.name}")
+                        print(f"表 {table.name} 新增列 {column.name}")
+                
+                existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in existing_indexes:
+                        index.create(bind=connection)
+                        print(f"表 {table.name} 新增索引 {index.name}")
+        return added_columns
+    except Exception as e:
+        print(f"升级表结构失败: {e}")
+        return None
+
+def backfill_fishing_spot_geohash(batch_size: int = 1000):
+    """为缺少geohash的历史钓点补齐编码"""
+    try:
+        total = 0
+        with Session(engine) as db:
+            while True:
+                spots = db.query(FishingSpot).filter(
+                    FishingSpot.geohash.is_(None)
+                ).limit(batch_size).all()
+                if not spots:
+                    break
+                for spot in spots:
+                    spot.geohash = encode_geohash(spot.latitude, spot.longitude)
+                db.commit()
+                total += len(spots)
+        if total:
+            print(f"已为 {total} 个钓点补齐geohash")
+        return True
+    except Exception as e:
+        print(f"补齐钓点geohash失败: {e}")
+        return False
+
+def reconcile_counters():
+    """重建鱼获的点赞数和评论数"""
+    try:
+        with Session(engine) as db:
+            total = crud.reconcile_fish_catch_counters(db)
+        print(f"已重建 {total} 条鱼获的点赞/评论计数")
+        return True
+    except Exception as e:
+        print(f"重建鱼获计数失败: {e}")
+        return False
+
+def backfill_image_variants(batch_size: int = 100):
+    """为历史鱼获图片生成尺寸版本并记录到 image_variants"""
+    try:
+        total = 0
+        last_id = 0
+        with Session(engine) as db:
+            while True:
+                catches = db.query(FishCatch).filter(
+                    FishCatch.id > last_id,
+                    FishCatch.image_variants.is_(None),
+                    FishCatch.image_url.like("/uploads/%")
+                ).order_by(FishCatch.id).limit(batch_size).all()
+                if not catches:
+                    break
+                for catch in catches:
+                    last_id = catch.id
+                    source_path = upload_url_to_path(catch.image_url)
+                    if source_path is None or not os.path.exists(source_path):
+                        continue
+                    try:
+                        generate_variants(source_path, settings.IMAGE_WEBP_ENABLED)
+                    except Exception as e:
+                        print(f"鱼获 {catch.id} 的图片处理失败: {e}")
+                        continue
+                    catch.image_variants = variant_urls(catch.image_url)
+                    total += 1
+                db.commit()
+        print(f"已为 {total} 条鱼获生成图片尺寸版本")
+        return True
+    except Exception as e:
+        print(f"生成图片尺寸版本失败: {e}")
+        return False
+
 def init_database():
     """初始化数据库"""
     print("开始初始化数据库...")
@@ -63,8 +167,30 @@ def init_database():
         print("数据库初始化失败")
         return False
     
+    # 步骤3: 升级已有表结构并补齐数据
+    if not upgrade_database():
+        print("数据库初始化失败")
+        return False
+    
     print("数据库初始化完成！")
     return True
 
+def upgrade_database():
+    """补齐已有表新增的列和索引，并补齐依赖这些列的数据；服务启动时也会执行"""
+    added_columns = upgrade_schema()
+    if added_columns is None or not backfill_fishing_spot_geohash():
+        return False
+    
+    # 计数列刚加上时全部为0，需要按真实数据重建
+    if added_columns & {"fish_catches.likes_count", "fish_catches.comments_count"}:
+        if not reconcile_counters():
+            return False
+    return True
+
 if __name__ == "__main__":
-    init_database()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "--reconcile-counters":
+        reconcile_counters()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--image-variants":
+        backfill_image_variants()
+    else:
+        init_database()
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+SQL性能监控模块
+通过SQLAlchemy引擎事件统计每条语句的耗时，按语句指纹汇总延迟分布，
+并把耗时归属到当前请求和发起查询的crud函数
+"""
+
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+from logging_config import backend_logger, log_database_operation
+
+# 当前请求ID，由请求中间件设置
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+class RequestDBStats:
+    """单个请求内的数据库耗时累计"""
+
+    __slots__ = ("query_count", "total_time")
+
+    def __init__(self):
+        self.query_count = 0
+        self.total_time = 0.0
+
+# 当前请求的数据库耗时累计，由请求中间件设置
+request_db_stats_var: ContextVar[Optional[RequestDBStats]] = ContextVar("request_db_stats", default=None)
+
+# 正在执行的最外层crud函数名，由 track_crud 设置
+crud_function_var: ContextVar[Optional[str]] = ContextVar("crud_function", default=None)
+
+def track_crud(func: Callable) -> Callable:
+    """标记crud函数，执行期间的SQL统计归属到该函数；嵌套调用时保留最外层的函数名"""
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if crud_function_var.get() is not None:
+            return func(*args, **kwargs)
+        token = crud_function_var.set(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            crud_function_var.reset(token)
+    return wrapper
+
+# 延迟直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class LatencyHistogram:
+    """固定桶的延迟直方图"""
+
+    __slots__ = ("buckets", "counts", "count", "total", "max")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """按桶估算分位数（返回所在桶的上界）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+class StatementStats:
+    """同一语句指纹的统计"""
+
+    __slots__ = ("fingerprint", "operation", "table", "functions", "histogram")
+
+    def __init__(self, fingerprint: str, operation: str, table: str):
+        self.fingerprint = fingerprint
+        self.operation = operation
+        self.table = table
+        self.functions = set()
+        self.histogram = LatencyHistogram()
+
+_stats_lock = threading.Lock()
+_statement_stats: Dict[str, StatementStats] = {}
+
+# 指纹数量上限，防止拼接SQL导致无限增长
+MAX_FINGERPRINTS = 2000
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)", re.IGNORECASE)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+`?(\w+)`?", re.IGNORECASE)
+
+@lru_cache(maxsize=4096)
+def _parse_statement(statement: str):
+    """返回 (指纹, 操作类型, 主表名)"""
+    fingerprint = _WHITESPACE_RE.sub(" ", statement).strip()
+    fingerprint = _IN_LIST_RE.sub("IN (?+)", fingerprint)
+    fingerprint = _STRING_RE.sub("?", fingerprint)
+    fingerprint = _NUMBER_RE.sub("?", fingerprint)
+    operation = fingerprint.split(" ", 1)[0].upper() if fingerprint else ""
+    match = _TABLE_RE.search(fingerprint)
+    table = match.group(1) if match else ""
+    return fingerprint, operation, table
+
+def fingerprint_statement(statement: str) -> str:
+    """把SQL语句归一化为指纹：折叠空白、参数列表和字面量"""
+    return _parse_statement(statement)[0]
+
+def _record(statement: str, duration: float, row_count: Optional[int], error: Optional[str] = None):
+    fingerprint, operation, table = _parse_statement(statement)
+    function = crud_function_var.get()
+
+    with _stats_lock:
+        stats = _statement_stats.get(fingerprint)
+        if stats is None and len(_statement_stats) < MAX_FINGERPRINTS:
+            stats = _statement_stats[fingerprint] = StatementStats(fingerprint, operation, table)
+        if stats is not None:
+            stats.histogram.observe(duration)
+            if function:
+                stats.functions.add(function)
+
+    request_stats = request_db_stats_var.get()
+    if request_stats is not None:
+        request_stats.query_count += 1
+        request_stats.total_time += duration
+
+    # 普通语句只在DEBUG级别记录，避免每条SQL都格式化日志
+    if error or duration > settings.SLOW_QUERY_SECONDS or backend_logger.isEnabledFor(logging.DEBUG):
+        log_database_operation(
+            logger=backend_logger,
+            operation=operation,
+            table=table,
+            duration=duration,
+            row_count=row_count,
+            error=error,
+            slow_threshold=settings.SLOW_QUERY_SECONDS,
+            details={
+                "request_id": request_id_var.get(),
+                "function": function,
+                "fingerprint": fingerprint,
+            }
+        )
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    duration = time.perf_counter() - start_times.pop()
+    row_count = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None
+    _record(statement, duration, row_count)
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    start_times = conn.info.get("query_start_time") if conn is not None else None
+    if not start_times or exception_context.statement is None:
+        return
+    duration = time.perf_counter() - start_times.pop()
+    _record(exception_context.statement, duration, None, error=str(exception_context.original_exception))
+
+def install_sql_instrumentation(engine: Engine):
+    """为同步引擎注册计时事件（异步引擎传入 async_engine.sync_engine）"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+def get_sql_stats(limit: int = 50) -> List[dict]:
+    """按总耗时倒序返回各语句指纹的统计"""
+    with _stats_lock:
+        items = sorted(_statement_stats.values(), key=lambda s: s.histogram.total, reverse=True)[:limit]
+        return [
+            {
+                "fingerprint": stats.fingerprint,
+                "operation": stats.operation,
+                "table": stats.table,
+                "functions": sorted(stats.functions),
+                "count": stats.histogram.count,
+                "total_ms": round(stats.histogram.total * 1000, 2),
+                "avg_ms": round(stats.histogram.total / stats.histogram.count * 1000, 2),
+                "p50_ms": round(stats.histogram.quantile(0.5) * 1000, 2),
+                "p95_ms": round(stats.histogram.quantile(0.95) * 1000, 2),
+                "p99_ms": round(stats.histogram.quantile(0.99) * 1000, 2),
+                "max_ms": round(stats.histogram.max * 1000, 2),
+            }
+            for stats in items
+        ]
+
+def get_statement_histograms() -> List[StatementStats]:
+    """返回所有语句指纹统计的快照，供指标导出使用"""
+    with _stats_lock:
+        return list(_statement_stats.values())
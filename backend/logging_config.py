@@ -1,13 +1,24 @@
 """
 日志配置模块
 统一管理前后端日志记录
+
+日志器只把记录放入内存队列，格式化和写文件由后台线程完成，请求线程不等待磁盘IO。
 """
 
+import atexit
+import json
 import logging
 import logging.handlers
 import os
+import queue
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
+
+# 日志队列容量，写入速度跟不上时丢弃新日志而不是阻塞请求
+LOG_QUEUE_SIZE = 10000
+
+# 所有后台日志线程，进程退出时统一停止
+_listeners: List[logging.handlers.QueueListener] = []
 
 class ColoredFormatter(logging.Formatter):
     """彩色日志格式化器"""
@@ -23,11 +34,58 @@ class ColoredFormatter(logging.Formatter):
     }
     
     def format(self, record):
-        # 添加颜色
+        # 同一条记录会被多个处理器使用，着色时不能修改原记录
         if record.levelname in self.COLORS:
+            record = logging.makeLogRecord(record.__dict__)
             record.levelname = f"{self.COLORS[record.levelname]}{record.levelname}{self.COLORS['RESET']}"
         return super().format(record)
 
+class JsonLine:
+    """延迟序列化的JSON日志消息，只在日志线程输出时才转换为字符串"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: dict):
+        self.data = data
+
+    def __str__(self) -> str:
+        return json.dumps(self.data, ensure_ascii=False, default=str)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """不在调用线程格式化消息的队列处理器
+
+    标准 QueueHandler 会在入队前完成 msg % args 的格式化，这里把格式化留给后台线程。
+    队列满时丢弃日志并计数，不阻塞调用方。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def _start_queue_logging(logger: logging.Logger, handlers: List[logging.Handler]):
+    """为日志器挂上队列处理器，并启动后台线程把记录分发给handlers"""
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+
+def stop_logging():
+    """停止后台日志线程，并写出队列中剩余的日志"""
+    while _listeners:
+        _listeners.pop().stop()
+
+atexit.register(stop_logging)
+
 def setup_backend_logging(
     name: str = "fishing_weather_backend",
     log_dir: str = "../logs",
@@ -92,10 +150,48 @@ def setup_backend_logging(
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(formatter)
     
-    # 添加处理器
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-    logger.addHandler(error_handler)
+    # 添加处理器（经由队列在后台线程写出）
+    _start_queue_logging(logger, [console_handler, file_handler, error_handler])
+    
+    return logger
+
+def setup_access_logging(
+    name: str = "fishing_weather_access",
+    log_dir: str = "../logs",
+    level: int = logging.INFO
+) -> logging.Logger:
+    """
+    设置访问日志记录，每个请求一行JSON
+    
+    Args:
+        name: 日志器名称
+        log_dir: 日志目录
+        level: 日志级别
+    
+    Returns:
+        配置好的日志器
+    """
+    log_dir = os.path.abspath(log_dir)
+    os.makedirs(log_dir, exist_ok=True)
+    
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.propagate = False
+    
+    if logger.handlers:
+        return logger
+    
+    access_handler = logging.handlers.TimedRotatingFileHandler(
+        os.path.join(log_dir, f"{name}.log"),
+        when='midnight',
+        interval=1,
+        backupCount=30,
+        encoding='utf-8'
+    )
+    access_handler.setLevel(level)
+    access_handler.setFormatter(logging.Formatter('%(message)s'))
+    
+    _start_queue_logging(logger, [access_handler])
     
     return logger
 
@@ -107,10 +203,11 @@ def log_api_call(
     response_time: float,
     user_id: Optional[int] = None,
     ip_address: Optional[str] = None,
-    error: Optional[str] = None
+    error: Optional[str] = None,
+    details: Optional[dict] = None
 ):
     """
-    记录API调用日志
+    记录API调用日志（一行JSON）
     
     Args:
         logger: 日志器
@@ -121,6 +218,7 @@ def log_api_call(
         user_id: 用户ID
         ip_address: IP地址
         error: 错误信息
+        details: 附加信息（请求ID、SQL耗时等）
     """
     log_data = {
         "type": "api_call",
@@ -137,11 +235,15 @@ def log_api_call(
         log_data["ip_address"] = ip_address
     if error:
         log_data["error"] = error
+    if details:
+        log_data.update(details)
     
-    if status_code >= 400:
-        logger.error(f"API调用失败: {log_data}")
+    if status_code >= 500:
+        logger.error("%s", JsonLine(log_data))
+    elif status_code >= 400:
+        logger.warning("%s", JsonLine(log_data))
     else:
-        logger.info(f"API调用成功: {log_data}")
+        logger.info("%s", JsonLine(log_data))
 
 def log_database_operation(
     logger: logging.Logger,
@@ -149,7 +251,9 @@ def log_database_operation(
     table: str,
     duration: float,
     row_count: Optional[int] = None,
-    error: Optional[str] = None
+    error: Optional[str] = None,
+    slow_threshold: float = 1.0,
+    details: Optional[dict] = None
 ):
     """
     记录数据库操作日志
@@ -161,6 +265,8 @@ def log_database_operation(
         duration: 执行时间（秒）
         row_count: 影响行数
         error: 错误信息
+        slow_threshold: 慢查询阈值（秒）
+        details: 附加信息（请求ID、调用函数、语句指纹等）
     """
     log_data = {
         "type": "database_operation",
@@ -174,13 +280,15 @@ def log_database_operation(
         log_data["row_count"] = row_count
     if error:
         log_data["error"] = error
+    if details:
+        log_data.update(details)
     
     if error:
-        logger.error(f"数据库操作失败: {log_data}")
-    elif duration > 1.0:  # 超过1秒的慢查询
-        logger.warning(f"慢查询: {log_data}")
+        logger.error("数据库操作失败: %s", JsonLine(log_data))
+    elif duration > slow_threshold:  # 慢查询
+        logger.warning("慢查询: %s", JsonLine(log_data))
     else:
-        logger.debug(f"数据库操作: {log_data}")
+        logger.debug("数据库操作: %s", JsonLine(log_data))
 
 def log_user_action(
     logger: logging.Logger,
@@ -215,7 +323,8 @@ def log_user_action(
     if details:
         log_data["details"] = details
     
-    logger.info(f"用户操作: {log_data}")
+    logger.info("用户操作: %s", JsonLine(log_data))
 
 # 创建默认日志器
-backend_logger = setup_backend_logging()
\ No newline at end of file
+backend_logger = setup_backend_logging()
+access_logger = setup_access_logging()
\ No newline at end of file
@@ -1,27 +1,42 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Request
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from datetime import timedelta
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 import uvicorn
+import asyncio
 import time
+import uuid
 
-from database import engine, get_db
+from database import engine, SessionLocal, async_engine
 from models import Base
-from auth import verify_token
+from init_db import upgrade_database
+from auth import decode_request_token, shutdown_password_executor
 from config import settings
-from routers import auth_router, fishing_spots_router, fish_catches_router, upload_router, users_router
-from logging_config import backend_logger, log_api_call
+from routers import auth_router, fishing_spots_router, fish_catches_router, upload_router, users_router, images_router, weather_router
+from logging_config import backend_logger, access_logger, log_api_call, stop_logging
+from spatial_index import spot_index
+from image_pipeline import on_variants_ready, shutdown_image_pipeline
+from weather_proxy import weather_proxy
+from weather_store import weather_store
+from weather_prefetch import weather_prefetcher
+from static_files import serve_upload
+from cache import get_cache_stats
+from instrumentation import request_id_var, request_db_stats_var, RequestDBStats, get_sql_stats
+from dependencies import require_metrics_token
+import crud
+import metrics
 import os
 
-# 创建数据库表
+# 创建数据库表，已有表补齐新增的列、索引和数据
 Base.metadata.create_all(bind=engine)
-backend_logger.info("数据库表创建成功")
+if upgrade_database():
+    backend_logger.info("数据库表创建成功")
+else:
+    backend_logger.error("数据库表结构升级失败，请运行 python init_db.py 后重启服务")
 
 # 创建上传目录
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-backend_logger.info(f"上传目录创建成功: {settings.UPLOAD_DIR}")
+backend_logger.info("上传目录创建成功: %s", settings.UPLOAD_DIR)
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -30,18 +45,86 @@ app = FastAPI(
     version="1.0.0",
 )
 
+# 后台任务
+background_tasks = []
+
+def build_spot_index():
+    """从数据库重建钓点内存索引"""
+    start_time = time.time()
+    db = SessionLocal()
+    try:
+        spot_index.build_from_db(db)
+    finally:
+        db.close()
+    backend_logger.info(
+        "钓点索引构建完成: %d 个钓点, %.1fMB, 耗时 %.2fs",
+        len(spot_index), spot_index.nbytes / 1024 / 1024, time.time() - start_time
+    )
+
+async def refresh_spot_index_periodically():
+    """定期重建钓点索引，同步其他worker进程的写入"""
+    while True:
+        try:
+            await run_in_threadpool(build_spot_index)
+        except Exception as e:
+            backend_logger.error("钓点索引构建失败，附近钓点查询将使用数据库: %s", e)
+        await asyncio.sleep(settings.SPOT_INDEX_REFRESH_SECONDS)
+
+def collect_uploads():
+    """清理没有被引用且保留期限已过的上传文件"""
+    db = SessionLocal()
+    try:
+        removed = crud.collect_expired_uploads(db)
+    finally:
+        db.close()
+    if removed:
+        backend_logger.info("清理未引用的上传文件: %d 个", removed)
+
+def record_image_variants(image_url: str):
+    """尺寸版本生成完成后写入使用该图片的鱼获"""
+    db = SessionLocal()
+    try:
+        crud.record_image_variants(db, image_url)
+    finally:
+        db.close()
+
+async def collect_uploads_periodically():
+    while True:
+        try:
+            await run_in_threadpool(collect_uploads)
+        except Exception as e:
+            backend_logger.error("清理上传文件失败: %s", e)
+        await asyncio.sleep(settings.UPLOAD_GC_INTERVAL)
+
 # 应用启动事件
 @app.on_event("startup")
 async def startup_event():
     backend_logger.info("钓鱼天气后端服务启动")
-    backend_logger.info(f"服务地址: {settings.HOST}:{settings.PORT}")
-    backend_logger.info(f"数据库连接: {settings.DATABASE_URL}")
-    backend_logger.info(f"上传目录: {settings.UPLOAD_DIR}")
+    backend_logger.info("服务地址: %s:%s", settings.HOST, settings.PORT)
+    backend_logger.info("数据库: %s:%s/%s", settings.DATABASE_HOST, settings.DATABASE_PORT, settings.DATABASE_NAME)
+    backend_logger.info("上传目录: %s", settings.UPLOAD_DIR)
+    if settings.SPOT_INDEX_ENABLED:
+        background_tasks.append(asyncio.create_task(refresh_spot_index_periodically()))
+    on_variants_ready(record_image_variants)
+    background_tasks.append(asyncio.create_task(collect_uploads_periodically()))
+    if settings.WEATHER_PREFETCH_ENABLED:
+        background_tasks.append(asyncio.create_task(weather_prefetcher.run()))
+    if weather_store is not None:
+        background_tasks.append(asyncio.create_task(weather_store.compact_periodically()))
 
 # 应用关闭事件
 @app.on_event("shutdown")
 async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    await async_engine.dispose()
+    shutdown_password_executor()
+    shutdown_image_pipeline()
+    await weather_proxy.close()
+    if weather_store is not None:
+        weather_store.close()
     backend_logger.info("钓鱼天气后端服务关闭")
+    stop_logging()
 
 # CORS配置 - 必须在其他中间件之前添加
 app.add_middleware(
@@ -53,81 +136,99 @@ app.add_middleware(
     expose_headers=["*"],  # 暴露所有响应头
 )
 
+# multipart 表单中文件以外部分（边界、字段头、其他字段）允许的字节数
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# 上传大小预检：Content-Length 已经超限时不再接收和解析请求体
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.method == "POST" and request.url.path.startswith("/api/upload"):
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and \
+                int(content_length) > settings.MAX_FILE_SIZE + UPLOAD_FORM_OVERHEAD:
+            return JSONResponse(status_code=400, content={"detail": "文件太大"})
+    return await call_next(request)
+
 # 请求日志中间件
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     start_time = time.time()
     
+    # 设置请求上下文，SQL耗时统计会归属到当前请求
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    db_stats = RequestDBStats()
+    request_db_stats_var.set(db_stats)
+    
     # 获取客户端IP
     client_host = request.client.host if request.client else "unknown"
     
-    # 记录请求详情
-    backend_logger.info(f"收到请求: {request.method} {request.url.path}")
-    backend_logger.info(f"来源IP: {client_host}")
-    
-    # 获取并记录认证信息
-    user_id = None
+    # 解码一次令牌并保存在 request.state 上，认证依赖直接复用，不再重复解码
     auth_header = request.headers.get("authorization")
-    if auth_header:
-        backend_logger.info(f"Authorization头: {auth_header[:50]}...")  # 只记录前50个字符
-        if auth_header.startswith("Bearer "):
-            try:
-                token = auth_header.split(" ")[1]
-                backend_logger.info(f"正在验证Token: {token[:20]}...")
-                token_data = verify_token(token)
-                user_id = token_data.get("user_id")
-                backend_logger.info(f"Token验证成功，用户ID: {user_id}")
-            except Exception as e:
-                backend_logger.error(f"Token验证失败: {str(e)}")
-    else:
-        backend_logger.info("请求没有Authorization头")
+    if auth_header and auth_header.startswith("Bearer "):
+        try:
+            decode_request_token(request, auth_header[7:])
+        except HTTPException as e:
+            backend_logger.debug("Token验证失败: %s", e.detail)
     
-    # 处理请求
+    # 处理请求；请求被取消（客户端断开、服务关闭）时 CancelledError 不是 Exception，
+    # 在 finally 中结束计数，进行中的请求数才不会只增不减
+    metrics.request_started()
+    status_code = 500
     try:
         response = await call_next(request)
+        status_code = response.status_code
+    except asyncio.CancelledError:
+        status_code = 499
+        raise
     except Exception as e:
-        backend_logger.error(f"处理请求时出错: {str(e)}")
+        backend_logger.exception("处理请求时出错: %s %s", request.method, request.url.path)
+        user_id = getattr(request.state, "user_id", None)
+        log_api_call(
+            logger=access_logger,
+            method=request.method,
+            endpoint=request.url.path,
+            status_code=500,
+            response_time=time.time() - start_time,
+            user_id=user_id,
+            ip_address=client_host,
+            error=str(e),
+            details={"request_id": request_id}
+        )
         raise
+    finally:
+        metrics.request_finished(
+            request.method, metrics.route_template(request), status_code,
+            time.time() - start_time, db_stats.total_time
+        )
     
-    # 计算响应时间
+    response.headers["X-Request-ID"] = request_id
+    # 用户ID由认证依赖解析后写入 request.state，匿名请求为None
+    user_id = getattr(request.state, "user_id", None)
     process_time = time.time() - start_time
     
-    # 记录响应状态
-    backend_logger.info(f"响应状态: {response.status_code}")
-    
-    # 记录API调用日志
+    # 每个请求只写一条访问日志
     log_api_call(
-        logger=backend_logger,
+        logger=access_logger,
         method=request.method,
-        endpoint=str(request.url.path),
+        endpoint=request.url.path,
         status_code=response.status_code,
         response_time=process_time,
         user_id=user_id,
-        ip_address=client_host
+        ip_address=client_host,
+        details={
+            "request_id": request_id,
+            "db_queries": db_stats.query_count,
+            "db_time": round(db_stats.total_time * 1000, 2),
+        }
     )
     
     return response
 
-# 静态文件服务（用于图片访问）
-app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
-
-# 安全配置
-security = HTTPBearer()
-
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    """获取当前用户（依赖注入）"""
-    token = credentials.credentials
-    token_data = verify_token(token)
-    
-    from crud import get_user_by_email
-    user = get_user_by_email(db, email=token_data["email"])
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    return user
+# 上传文件服务（用于图片访问），带强ETag、不可变缓存头和Range支持
+@app.api_route("/uploads/{file_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def get_upload(file_path: str, request: Request):
+    return await serve_upload(request, file_path)
 
 # 注册路由
 app.include_router(auth_router.router, prefix="/api/auth", tags=["认证"])
@@ -135,6 +236,8 @@ app.include_router(fishing_spots_router.router, prefix="/api/fishing-spots", tag
 app.include_router(fish_catches_router.router, prefix="/api/fish-catches", tags=["鱼获"])
 app.include_router(upload_router.router, prefix="/api/upload", tags=["文件上传"])
 app.include_router(users_router.router, prefix="/api/users", tags=["用户"])
+app.include_router(images_router.router, prefix="/api/images", tags=["图片"])
+app.include_router(weather_router.router, prefix="/api/weather", tags=["天气"])
 
 @app.get("/")
 async def root():
@@ -146,6 +249,21 @@ async def health_check():
     """健康检查"""
     return {"status": "healthy", "message": "服务运行正常"}
 
+@app.get("/api/cache/stats", dependencies=[Depends(require_metrics_token)])
+async def cache_stats():
+    """缓存命中率统计"""
+    return {"caches": get_cache_stats()}
+
+@app.get("/api/db/stats", dependencies=[Depends(require_metrics_token)])
+async def db_stats(limit: int = 50):
+    """按语句指纹汇总的SQL耗时统计"""
+    return {"statements": get_sql_stats(limit)}
+
+@app.get("/api/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_token)])
+async def prometheus_metrics():
+    """Prometheus格式的请求、数据库和缓存指标"""
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -0,0 +1,184 @@
+"""
+请求指标模块
+在请求中间件中按路由模板统计请求数、延迟分布、数据库耗时和错误率，
+以Prometheus文本格式导出
+"""
+
+from typing import Dict, List, Tuple
+
+from starlette.requests import Request
+from starlette.routing import Match
+
+from auth import get_password_pool_stats
+from weather_proxy import weather_proxy
+from weather_prefetch import weather_prefetcher
+from weather_store import weather_store
+from cache import get_cache_stats
+from instrumentation import LatencyHistogram, get_statement_histograms
+
+# 指标只在事件循环线程中更新，普通的整数自增即可，不需要加锁
+_request_counts: Dict[Tuple[str, str, str], int] = {}
+_error_counts: Dict[Tuple[str, str], int] = {}
+_latency: Dict[Tuple[str, str], LatencyHistogram] = {}
+_db_time: Dict[Tuple[str, str], LatencyHistogram] = {}
+_in_flight = 0
+
+# 导出的分位数
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 未匹配任何路由的请求统一归到一个标签，避免标签数量无限增长
+UNMATCHED_ROUTE = "unmatched"
+
+def route_template(request: Request) -> str:
+    """返回请求匹配的路由模板，如 /api/fish-catches/{catch_id}"""
+    route = request.scope.get("route")
+    if route is not None:
+        return getattr(route, "path", UNMATCHED_ROUTE)
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+def request_started():
+    global _in_flight
+    _in_flight += 1
+
+def request_finished(method: str, route: str, status_code: int, duration: float, db_time: float):
+    """记录一个已完成的请求"""
+    global _in_flight
+    _in_flight -= 1
+
+    count_key = (method, route, str(status_code))
+    _request_counts[count_key] = _request_counts.get(count_key, 0) + 1
+
+    key = (method, route)
+    histogram = _latency.get(key)
+    if histogram is None:
+        histogram = _latency[key] = LatencyHistogram()
+        _db_time[key] = LatencyHistogram()
+    histogram.observe(duration)
+    _db_time[key].observe(db_time)
+
+    if status_code >= 500:
+        _error_counts[key] = _error_counts.get(key, 0) + 1
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def _render_histogram(lines: List[str], name: str, histogram: LatencyHistogram, **labels):
+    cumulative = 0
+    for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+        cumulative += bucket_count
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {histogram.total}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+
+def render_metrics() -> str:
+    """生成Prometheus文本格式的指标"""
+    lines: List[str] = []
+
+    lines.append("# HELP http_requests_total 请求总数")
+    lines.append("# TYPE http_requests_total counter")
+    for (method, route, status_code), count in list(_request_counts.items()):
+        lines.append(f"http_requests_total{_labels(method=method, route=route, status=status_code)} {count}")
+
+    lines.append("# HELP http_request_errors_total 5xx错误数")
+    lines.append("# TYPE http_request_errors_total counter")
+    for (method, route), count in list(_error_counts.items()):
+        lines.append(f"http_request_errors_total{_labels(method=method, route=route)} {count}")
+
+    lines.append("# HELP http_requests_in_flight 正在处理的请求数")
+    lines.append("# TYPE http_requests_in_flight gauge")
+    lines.append(f"http_requests_in_flight {_in_flight}")
+
+    lines.append("# HELP http_request_duration_seconds 请求处理耗时")
+    lines.append("# TYPE http_request_duration_seconds histogram")
+    for (method, route), histogram in list(_latency.items()):
+        _render_histogram(lines, "http_request_duration_seconds", histogram, method=method, route=route)
+
+    lines.append("# HELP http_request_duration_quantile_seconds 按直方图桶估算的请求耗时分位数")
+    lines.append("# TYPE http_request_duration_quantile_seconds gauge")
+    for (method, route), histogram in list(_latency.items()):
+        for q in QUANTILES:
+            lines.append(
+                f"http_request_duration_quantile_seconds{_labels(method=method, route=route, quantile=q)} "
+                f"{histogram.quantile(q)}"
+            )
+
+    lines.append("# HELP http_request_db_seconds 单个请求内的数据库耗时")
+    lines.append("# TYPE http_request_db_seconds histogram")
+    for (method, route), histogram in list(_db_time.items()):
+        _render_histogram(lines, "http_request_db_seconds", histogram, method=method, route=route)
+
+    # 按操作类型和表汇总SQL语句耗时
+    db_statements: Dict[Tuple[str, str], LatencyHistogram] = {}
+    for stats in get_statement_histograms():
+        key = (stats.operation, stats.table)
+        merged = db_statements.get(key)
+        if merged is None:
+            merged = db_statements[key] = LatencyHistogram()
+        merged.counts = [a + b for a, b in zip(merged.counts, stats.histogram.counts)]
+        merged.count += stats.histogram.count
+        merged.total += stats.histogram.total
+    lines.append("# HELP db_statement_duration_seconds SQL语句耗时")
+    lines.append("# TYPE db_statement_duration_seconds histogram")
+    for (operation, table), histogram in db_statements.items():
+        _render_histogram(lines, "db_statement_duration_seconds", histogram, operation=operation, table=table)
+
+    cache_stats = get_cache_stats()
+    for field, metric_type in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"),
+                               ("expirations", "counter"), ("invalidations", "counter"), ("size", "gauge")):
+        name = f"cache_{field}" + ("_total" if metric_type == "counter" else "")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for cache_name, stats in cache_stats.items():
+            lines.append(f"{name}{_labels(cache=cache_name)} {stats[field]}")
+
+    password_pool = get_password_pool_stats()
+    lines.append("# HELP password_hash_pending 密码线程池中正在执行和排队的任务数")
+    lines.append("# TYPE password_hash_pending gauge")
+    lines.append(f"password_hash_pending {password_pool['pending']}")
+    lines.append("# TYPE password_hash_capacity gauge")
+    lines.append(f"password_hash_capacity {password_pool['workers'] + password_pool['queue_size']}")
+
+    weather = weather_proxy.stats()
+    lines.append("# HELP weather_upstream_requests_total 向上游天气服务发起的请求数")
+    lines.append("# TYPE weather_upstream_requests_total counter")
+    lines.append(f"weather_upstream_requests_total {weather['upstream_requests']}")
+    lines.append("# TYPE weather_upstream_errors_total counter")
+    lines.append(f"weather_upstream_errors_total {weather['upstream_errors']}")
+    lines.append("# HELP weather_coalesced_total 合并到进行中上游请求的未命中数")
+    lines.append("# TYPE weather_coalesced_total counter")
+    lines.append(f"weather_coalesced_total {weather['coalesced']}")
+    lines.append("# HELP weather_interpolated_total 由相邻单元插值、未请求上游的未命中数")
+    lines.append("# TYPE weather_interpolated_total counter")
+    lines.append(f"weather_interpolated_total {weather['interpolated']}")
+
+    prefetch = weather_prefetcher.stats()
+    lines.append("# HELP weather_prefetch_refreshed_total 后台预取刷新的单元数")
+    lines.append("# TYPE weather_prefetch_refreshed_total counter")
+    lines.append(f"weather_prefetch_refreshed_total {prefetch['refreshed']}")
+    lines.append("# TYPE weather_prefetch_failed_total counter")
+    lines.append(f"weather_prefetch_failed_total {prefetch['failed']}")
+    lines.append("# HELP weather_demand_tracked_cells 记录了近期请求量的单元数")
+    lines.append("# TYPE weather_demand_tracked_cells gauge")
+    lines.append(f"weather_demand_tracked_cells {prefetch['tracked']}")
+
+    if weather_store is not None:
+        store = weather_store.stats()
+        lines.append("# HELP weather_store_hits_total 天气持久化缓存命中的单元数")
+        lines.append("# TYPE weather_store_hits_total counter")
+        lines.append(f"weather_store_hits_total {store['hits']}")
+        lines.append("# TYPE weather_store_misses_total counter")
+        lines.append(f"weather_store_misses_total {store['misses']}")
+        lines.append("# TYPE weather_store_errors_total counter")
+        lines.append(f"weather_store_errors_total {store['errors']}")
+        lines.append("# HELP weather_store_bytes 最近一次清理后天气持久化缓存的数据大小")
+        lines.append("# TYPE weather_store_bytes gauge")
+        lines.append(f"weather_store_bytes {store['bytes']}")
+
+    return "\n".join(lines) + "\n"
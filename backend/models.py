@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Boolean, ForeignKey, Index, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -30,6 +30,7 @@ class FishingSpot(Base):
     description = Column(Text, default="")
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
+    geohash = Column(String(12), nullable=True, index=True)  # 用于附近钓点的空间前缀检索
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     is_public = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -38,6 +39,11 @@ class FishingSpot(Base):
     # 关系
     owner = relationship("User", back_populates="fishing_spots")
 
+    __table_args__ = (
+        Index("ix_fishing_spots_lat_lon", "latitude", "longitude"),
+        Index("ix_fishing_spots_user_created", "user_id", "created_at", "id"),
+    )
+
 class FishCatch(Base):
     __tablename__ = "fish_catches"
 
@@ -49,8 +55,11 @@ class FishCatch(Base):
     longitude = Column(Float, nullable=False)
     location_name = Column(String(200), nullable=False)
     image_url = Column(String(500), nullable=True)
+    image_variants = Column(JSON(none_as_null=True), nullable=True)  # 各尺寸版本的URL，如 {"thumb": ..., "medium": ..., "full": ...}
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     is_public = Column(Boolean, default=True)
+    likes_count = Column(Integer, nullable=False, default=0, server_default="0")  # 冗余计数，由点赞操作维护
+    comments_count = Column(Integer, nullable=False, default=0, server_default="0")  # 冗余计数，由评论操作维护
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
@@ -59,6 +68,12 @@ class FishCatch(Base):
     likes = relationship("Like", back_populates="fish_catch")
     comments = relationship("Comment", back_populates="fish_catch")
 
+    # 游标分页索引
+    __table_args__ = (
+        Index("ix_fish_catches_public_created", "is_public", "created_at", "id"),
+        Index("ix_fish_catches_user_created", "user_id", "created_at", "id"),
+    )
+
 class Like(Base):
     __tablename__ = "likes"
 
@@ -71,6 +86,10 @@ class Like(Base):
     user = relationship("User", back_populates="likes")
     fish_catch = relationship("FishCatch", back_populates="likes")
 
+    __table_args__ = (
+        Index("ix_likes_user_created", "user_id", "created_at", "fish_catch_id"),
+    )
+
 class Comment(Base):
     __tablename__ = "comments"
 
@@ -86,4 +105,19 @@ class Comment(Base):
     author = relationship("User", back_populates="comments")
     fish_catch = relationship("FishCatch", back_populates="comments")
     parent = relationship("Comment", remote_side=[id])
-    replies = relationship("Comment")
\ No newline at end of file
+    replies = relationship("Comment")
+
+class UploadedFile(Base):
+    """按内容哈希存储的上传文件，ref_count 为引用该文件的鱼获数
+
+    引用归零且保留期限已过时删除文件；上传后一直未被引用的文件由定期清理回收。
+    """
+    __tablename__ = "uploaded_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String(500), unique=True, nullable=False)
+    sha256 = Column(String(64), index=True, nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    lease_expires_at = Column(DateTime, nullable=True)  # 上传后等待被引用的保留期限，期间引用归零也不删除
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
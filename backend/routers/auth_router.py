@@ -1,27 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
-from database import get_db
+from database import get_async_db
 from schemas import UserCreate, UserLogin, UserResponse, Token, SuccessResponse
-from auth import create_access_token, get_password_hash, verify_password
+from auth import create_access_token, hash_password_async, verify_password_async
 from config import settings
-import crud
+import async_crud
 
 router = APIRouter()
 
 @router.post("/register", response_model=dict)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """用户注册"""
     # 检查邮箱是否已存在
-    if crud.get_user_by_email(db, user.email):
+    if await async_crud.get_user_by_email(db, user.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="邮箱已被注册"
         )
     
-    # 创建用户
-    db_user = crud.create_user(db, user)
+    # 创建用户，密码哈希在线程池中计算
+    hashed_password = await hash_password_async(user.password)
+    db_user = await async_crud.create_user(db, user, hashed_password=hashed_password)
     
     # 生成访问令牌
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -48,11 +49,11 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     }
 
 @router.post("/login", response_model=Token)
-async def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """用户登录"""
     # 查找用户
-    db_user = crud.get_user_by_email(db, user.email)
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    db_user = await async_crud.get_user_by_email(db, user.email)
+    if not db_user or not await verify_password_async(user.password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="邮箱或密码错误",
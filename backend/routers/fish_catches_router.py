@@ -1,33 +1,42 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from database import get_db
+from database import get_async_db
 from schemas import FishCatchCreate, FishCatchResponse, SuccessResponse
-import crud
+import async_crud
 
 router = APIRouter()
 
-from dependencies import get_current_user
+from dependencies import get_current_user, get_current_user_optional
 
 @router.get("/", response_model=dict)
 async def get_fish_catches(
     page: int = Query(1, ge=1, description="页码"),
     limit: int = Query(20, ge=1, le=100, description="每页数量"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页的next_cursor"),
+    current_user = Depends(get_current_user_optional),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取鱼获分享列表"""
-    catches = crud.get_fish_catches(db, page=page, limit=limit)
+    catches = await async_crud.get_fish_catches(
+        db,
+        page=page,
+        limit=limit,
+        current_user_id=current_user.id if current_user else None,
+        cursor=cursor
+    )
     return {
-        "catches": [catch.__dict__ for catch in catches]
+        "catches": catches,
+        "next_cursor": async_crud.next_cursor(catches, limit)
     }
 
 @router.post("/", response_model=FishCatchResponse)
 async def create_fish_catch(
     fish_catch: FishCatchCreate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """创建鱼获分享"""
-    db_catch = crud.create_fish_catch(db, fish_catch, current_user.id)
+    db_catch = await async_crud.create_fish_catch(db, fish_catch, current_user.id)
     return db_catch
\ No newline at end of file
@@ -1,33 +1,102 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from database import get_db
+from database import get_async_db
 from schemas import FishingSpotCreate, FishingSpotResponse, SuccessResponse
-import crud
+import async_crud
 from dependencies import get_current_user
+from spot_suitability import spot_suitability
+from weather_prefetch import record_demand, record_spots_demand
 
 router = APIRouter()
 
+# 适宜度批量查询一次最多评估的钓点数
+MAX_SUITABILITY_SPOTS = 200
+
 @router.post("/", response_model=FishingSpotResponse)
 async def create_fishing_spot(
     spot: FishingSpotCreate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """创建钓点"""
-    db_spot = crud.create_fishing_spot(db, spot, current_user.id)
+    db_spot = await async_crud.create_fishing_spot(db, spot, current_user.id)
     return db_spot
 
 @router.get("/nearby", response_model=dict)
 async def get_nearby_fishing_spots(
     lat: float = Query(..., description="纬度"),
     lng: float = Query(..., description="经度"),
-    radius: float = Query(10.0, description="搜索半径（公里）"),
-    db: Session = Depends(get_db)
+    radius: float = Query(10.0, gt=0, le=500, description="搜索半径（公里）"),
+    limit: int = Query(50, ge=1, le=200, description="返回数量"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取附近的钓点"""
-    spots = crud.get_nearby_fishing_spots(db, lat, lng, radius)
+    record_demand(lat, lng)
+    spots = await async_crud.get_nearby_fishing_spots(db, lat, lng, radius, limit)
+    return {
+        "spots": spots
+    }
+
+@router.get("/viewport", response_model=dict)
+async def get_fishing_spots_in_viewport(
+    min_lat: float = Query(..., ge=-90, le=90, description="视野最小纬度"),
+    min_lng: float = Query(..., ge=-180, le=180, description="视野最小经度"),
+    max_lat: float = Query(..., ge=-90, le=90, description="视野最大纬度"),
+    max_lng: float = Query(..., ge=-180, le=180, description="视野最大经度"),
+    limit: int = Query(200, ge=1, le=1000, description="返回数量"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取地图视野范围内的钓点"""
+    spots = await async_crud.get_fishing_spots_in_viewport(db, min_lat, min_lng, max_lat, max_lng, limit)
     return {
-        "spots": [spot.__dict__ for spot in spots]
-    }
\ No newline at end of file
+        "spots": spots
+    }
+
+@router.get("/suitability", response_model=dict)
+async def get_fishing_spots_suitability(
+    bbox: Optional[str] = Query(None, description="视野范围：最小经度,最小纬度,最大经度,最大纬度"),
+    ids: Optional[str] = Query(None, description="钓点ID列表，逗号分隔"),
+    lang: str = Query("zh", pattern="^(zh|en)$", description="语言"),
+    limit: int = Query(100, ge=1, le=MAX_SUITABILITY_SPOTS, description="按视野查询时的返回数量"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """批量获取钓点的钓鱼适宜度：当前时段和未来预报中的最佳时段"""
+    if (bbox is None) == (ids is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="需要提供 bbox 或 ids 其中之一"
+        )
+
+    if bbox is not None:
+        try:
+            min_lng, min_lat, max_lng, max_lat = (float(value) for value in bbox.split(","))
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="bbox 格式应为 最小经度,最小纬度,最大经度,最大纬度"
+            )
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="bbox 超出经纬度范围"
+            )
+        spots = await async_crud.get_fishing_spots_in_viewport(db, min_lat, min_lng, max_lat, max_lng, limit)
+    else:
+        try:
+            spot_ids = [int(value) for value in ids.split(",") if value.strip()]
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="ids 应为逗号分隔的钓点ID"
+            )
+        if len(spot_ids) > MAX_SUITABILITY_SPOTS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"一次最多查询 {MAX_SUITABILITY_SPOTS} 个钓点"
+            )
+        spots = await async_crud.get_fishing_spots_by_ids(db, spot_ids)
+
+    record_spots_demand(spots, lang)
+    return await spot_suitability(spots, lang)
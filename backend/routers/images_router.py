@@ -0,0 +1,61 @@
+import os
+
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from image_cache import image_cache, snap_width
+from logging_config import backend_logger
+from static_files import make_etag, not_modified, resolve_upload, send_file
+
+router = APIRouter()
+
+@router.get("/{name:path}")
+async def get_resized_image(
+    name: str,
+    request: Request,
+    w: int = Query(720, ge=1, le=4096, description="期望宽度（像素），向上取整到预设宽度"),
+    fmt: str = Query("jpg", pattern="^(jpg|webp)$", description="输出格式"),
+):
+    """按需返回缩放后的上传图片，第一次请求时生成并缓存"""
+    resolved = await run_in_threadpool(resolve_upload, name)
+    if resolved is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="图片不存在"
+        )
+    source_path, source_stat = resolved
+    width = snap_width(w)
+
+    # ETag由原图和输出参数决定，客户端缓存命中时无需生成
+    etag = make_etag(os.path.basename(source_path), source_stat)[:-1] + f'-{width}.{fmt}"'
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    # 缓存文件可能在返回路径之后被淘汰（本进程或其他worker），此时重新生成一次
+    for attempt in range(2):
+        try:
+            path = await image_cache.get(source_path, source_stat, width, fmt)
+        except Exception as e:
+            backend_logger.error("图片缩放失败: %s: %s", name, e)
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="无法处理该图片"
+            )
+        try:
+            stat_result = await run_in_threadpool(os.stat, path)
+            break
+        except FileNotFoundError:
+            backend_logger.warning("缩放缓存文件已被淘汰，重新生成: %s", path)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="图片不存在"
+        )
+
+    accel_path = None
+    upload_root = os.path.abspath(settings.UPLOAD_DIR)
+    if os.path.abspath(path).startswith(upload_root + os.sep):
+        accel_path = os.path.relpath(path, upload_root)
+    return send_file(request, path, stat_result, etag, accel_path)
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from database import get_db
-from schemas import UploadResponse
-from utils import save_uploaded_file
+from schemas import UploadResponse, ImageJobResponse
+import crud
+import image_pipeline
 
 router = APIRouter()
 
@@ -17,12 +19,19 @@ async def upload_image(
 ):
     """上传图片"""
     try:
-        # 保存图片文件
-        image_url = save_uploaded_file(image)
+        # 按内容哈希保存原图并登记，磁盘IO和数据库操作在线程池中执行
+        image_url = await run_in_threadpool(crud.save_upload, db, image)
+        
+        # 各尺寸版本在进程池中异步生成，不等待结果；重复上传的内容已有版本时跳过
+        job_id = None
+        if not image_pipeline.variants_ready(image_url):
+            job_id = image_pipeline.submit_image(image_url)
         
         return UploadResponse(
             image_url=image_url,
-            message="图片上传成功"
+            message="图片上传成功",
+            job_id=job_id,
+            variants=image_pipeline.variant_urls(image_url)
         )
     
     except HTTPException:
@@ -31,4 +40,15 @@ async def upload_image(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"图片上传失败: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.get("/jobs/{job_id}", response_model=ImageJobResponse)
+async def get_image_job(job_id: str):
+    """查询图片尺寸版本的生成状态"""
+    job = image_pipeline.get_job_status(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务不存在或已过期"
+        )
+    return job
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from database import get_db
+from database import get_async_db
 from schemas import UserResponse
-import crud
+import async_crud
 
 router = APIRouter()
 
@@ -39,9 +39,9 @@ router = APIRouter()
 #     return {"catches": catches}
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取用户信息"""
-    user = crud.get_user_by_id(db, user_id)
+    user = await async_crud.get_user(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import JSONResponse
+
+from weather_prefetch import record_demand
+from weather_proxy import WeatherUpstreamError, cell_center, weather_proxy
+
+router = APIRouter()
+
+@router.get("")
+async def get_weather(
+    lat: float = Query(..., ge=-90, le=90, description="纬度"),
+    lon: float = Query(..., ge=-180, le=180, description="经度"),
+    lang: str = Query("zh", pattern="^(zh|en)$", description="语言"),
+):
+    """获取坐标所在网格单元的天气（wttr.in format=j1 格式），同一单元的用户共享缓存"""
+    record_demand(lat, lon, lang)
+    try:
+        payload, cell, source = await weather_proxy.get_weather(lat, lon, lang)
+    except WeatherUpstreamError as e:
+        if e.timeout:
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="获取天气数据超时"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="获取天气数据失败"
+        )
+
+    # 客户端和中间代理最多缓存到服务端缓存过期为止
+    max_age = max(0, int(weather_proxy.ttl_remaining(cell, lang) or 0))
+    center_lat, center_lon = cell_center(cell)
+    return JSONResponse(payload, headers={
+        "cache-control": f"public, max-age={max_age}",
+        "x-cache": source,
+        "x-weather-cell": f"{center_lat},{center_lon}",
+    })
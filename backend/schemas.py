@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 # 用户相关的Pydantic模型
@@ -70,6 +70,7 @@ class FishCatchCreate(FishCatchBase):
 class FishCatchResponse(FishCatchBase):
     id: int
     image_url: Optional[str] = None
+    image_variants: Optional[Dict[str, str]] = None
     user_id: int
     user_name: str
     is_public: bool
@@ -142,4 +143,14 @@ class PaginatedResponse(BaseModel):
 # 文件上传响应
 class UploadResponse(BaseModel):
     image_url: str
-    message: str
\ No newline at end of file
+    message: str
+    job_id: Optional[str] = None  # 尺寸版本生成任务ID
+    variants: Optional[Dict[str, str]] = None
+
+# 图片处理任务状态
+class ImageJobResponse(BaseModel):
+    job_id: str
+    status: str
+    image_url: str
+    variants: Optional[Dict[str, str]] = None
+    error: Optional[str] = None
\ No newline at end of file
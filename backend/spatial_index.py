@@ -0,0 +1,197 @@
+"""
+钓点空间索引模块
+在进程内维护公开钓点坐标的紧凑数组索引，附近钓点和地图视野查询无需访问数据库
+"""
+
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import FishingSpot
+from utils import bounding_box, split_longitude_range, nearest_points
+
+# float32 坐标的精度约为1e-5度，检索矩形额外放宽以免漏掉边界上的点
+_COORD_MARGIN = 1e-4
+
+class SpotIndex:
+    """公开钓点的内存空间索引
+
+    主段按纬度排序存放 id(int64) 与坐标(float32)，另存按id排序的位置(int64)用于查找，每个钓点约24字节；
+    新增钓点先进入增量段，删除只标记失效，累计到阈值后合并重建主段。
+    每次修改都生成新的快照（失效标记写时复制），读操作只读取当前快照，不需要加锁。
+    """
+
+    def __init__(self, merge_threshold: int = 4096):
+        self.merge_threshold = merge_threshold
+        self._lock = threading.Lock()
+        self._ready = False
+        self._removed = 0
+        # 从数据库重建期间的修改记录 [(钓点id, 坐标或None)]，重建完成后在新快照上重放
+        self._changes: Optional[List[Tuple[int, Optional[Tuple[float, float]]]]] = None
+        self._set_segment(
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=np.float32),
+        )
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def __len__(self) -> int:
+        _, _, _, _, alive, pending = self._snapshot
+        return int(alive.sum()) + len(pending)
+
+    @property
+    def nbytes(self) -> int:
+        """主段数组占用的内存（字节）"""
+        return sum(array.nbytes for array in self._snapshot[:5])
+
+    def _set_segment(self, ids: np.ndarray, lats: np.ndarray, lons: np.ndarray):
+        order = np.argsort(lats, kind="stable")
+        ids = ids[order]
+        # 快照整体替换，读操作拿到的主段与增量段总是一致的
+        self._snapshot = (
+            ids, lats[order], lons[order], np.argsort(ids, kind="stable"),
+            np.ones(ids.shape[0], dtype=bool), {},
+        )
+
+    def build(self, ids, latitudes, longitudes):
+        """用完整的钓点数据重建索引，并重放加载期间的新增和删除"""
+        ids = np.asarray(ids, dtype=np.int64)
+        lats = np.asarray(latitudes, dtype=np.float32)
+        lons = np.asarray(longitudes, dtype=np.float32)
+        with self._lock:
+            self._set_segment(ids, lats, lons)
+            self._removed = 0
+            self._ready = True
+            changes, self._changes = self._changes or [], None
+            for spot_id, coords in changes:
+                self._apply(spot_id, coords)
+
+    def build_from_db(self, db: Session, chunk_size: int = 50000):
+        """从 fishing_spots 表加载所有公开钓点并重建索引
+
+        加载期间发生的新增和删除先记录下来，查询结果可能已经包含这些修改，重放是幂等的。
+        """
+        with self._lock:
+            self._changes = []
+        ids: List[int] = []
+        lats: List[float] = []
+        lons: List[float] = []
+        try:
+            rows = db.query(FishingSpot.id, FishingSpot.latitude, FishingSpot.longitude).filter(
+                FishingSpot.is_public == True
+            ).yield_per(chunk_size)
+            for spot_id, latitude, longitude in rows:
+                ids.append(spot_id)
+                lats.append(latitude)
+                lons.append(longitude)
+        except Exception:
+            with self._lock:
+                self._changes = None
+            raise
+        self.build(ids, lats, lons)
+
+    def add(self, spot_id: int, latitude: float, longitude: float):
+        """新增或更新钓点坐标"""
+        self._change(spot_id, (latitude, longitude))
+
+    def remove(self, spot_id: int):
+        """移除钓点"""
+        self._change(spot_id, None)
+
+    def _change(self, spot_id: int, coords: Optional[Tuple[float, float]]):
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((spot_id, coords))
+            if self._ready:
+                self._apply(spot_id, coords)
+
+    def _apply(self, spot_id: int, coords: Optional[Tuple[float, float]]):
+        """把主段中的旧位置标记失效，坐标不为None时放入增量段，一次替换快照"""
+        ids, lats, lons, id_order, alive, pending = self._snapshot
+        # 按id二分查找，不扫描整个主段
+        index = int(np.searchsorted(ids, spot_id, sorter=id_order))
+        if index < ids.shape[0] and ids[id_order[index]] == spot_id and alive[id_order[index]]:
+            alive = alive.copy()
+            alive[id_order[index]] = False
+            self._removed += 1
+        if coords is not None or spot_id in pending:
+            pending = dict(pending)
+            pending.pop(spot_id, None)
+            if coords is not None:
+                pending[spot_id] = coords
+        self._snapshot = (ids, lats, lons, id_order, alive, pending)
+        self._maybe_merge()
+
+    def _maybe_merge(self):
+        ids, lats, lons, _, alive, pending = self._snapshot
+        if len(pending) + self._removed < self.merge_threshold:
+            return
+        pending_ids = np.fromiter(pending.keys(), dtype=np.int64, count=len(pending))
+        pending_coords = np.array(list(pending.values()), dtype=np.float32).reshape(-1, 2)
+        self._set_segment(
+            np.concatenate([ids[alive], pending_ids]),
+            np.concatenate([lats[alive], pending_coords[:, 0]]),
+            np.concatenate([lons[alive], pending_coords[:, 1]]),
+        )
+        self._removed = 0
+
+    def _candidates(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+        """返回矩形范围内的候选钓点 (ids, lats, lons)"""
+        ids, lats, lons, _, alive, pending = self._snapshot
+
+        start, stop = np.searchsorted(lats, [min_lat - _COORD_MARGIN, max_lat + _COORD_MARGIN])
+        seg_ids, seg_lats, seg_lons = ids[start:stop], lats[start:stop], lons[start:stop]
+        mask = alive[start:stop].copy()
+        lon_mask = np.zeros(mask.shape[0], dtype=bool)
+        for lo, hi in split_longitude_range(min_lon, max_lon):
+            lon_mask |= (seg_lons >= lo - _COORD_MARGIN) & (seg_lons <= hi + _COORD_MARGIN)
+        mask &= lon_mask
+
+        cand_ids = seg_ids[mask]
+        cand_lats = seg_lats[mask]
+        cand_lons = seg_lons[mask]
+        if pending:
+            cand_ids = np.concatenate([cand_ids, np.fromiter(pending.keys(), dtype=np.int64, count=len(pending))])
+            coords = np.array(list(pending.values()), dtype=np.float32).reshape(-1, 2)
+            cand_lats = np.concatenate([cand_lats, coords[:, 0]])
+            cand_lons = np.concatenate([cand_lons, coords[:, 1]])
+        return cand_ids, cand_lats, cand_lons
+
+    def nearby(self, latitude: float, longitude: float, radius: float, limit: int) -> List[Tuple[int, float]]:
+        """查询半径内最近的limit个钓点，返回 [(钓点id, 距离km)]"""
+        ids, lats, lons = self._candidates(*bounding_box(latitude, longitude, radius))
+        indices, distances = nearest_points(latitude, longitude, lats, lons, k=limit, radius=radius)
+        return list(zip(ids[indices].tolist(), distances.tolist()))
+
+    def in_viewport(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float,
+        limit: int
+    ) -> List[int]:
+        """查询视野矩形内的钓点id，超过limit时优先返回离视野中心近的钓点"""
+        ids, lats, lons = self._candidates(min_lat, min_lon, max_lat, max_lon)
+        mask = (lats >= min_lat) & (lats <= max_lat)
+        lon_mask = np.zeros(mask.shape[0], dtype=bool)
+        for lo, hi in split_longitude_range(min_lon, max_lon):
+            lon_mask |= (lons >= lo) & (lons <= hi)
+        mask &= lon_mask
+        ids, lats, lons = ids[mask], lats[mask], lons[mask]
+
+        center_lon = (min_lon + max_lon) / 2
+        if center_lon > 180.0:
+            center_lon -= 360.0
+        elif center_lon < -180.0:
+            center_lon += 360.0
+        indices, _ = nearest_points((min_lat + max_lat) / 2, center_lon, lats, lons, k=limit)
+        return ids[indices].tolist()
+
+# 全局钓点索引
+spot_index = SpotIndex()
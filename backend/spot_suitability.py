@@ -0,0 +1,189 @@
+"""
+钓点适宜度批量评估模块
+钓点按天气网格单元分组，每个单元只取一次预报；所有单元的全部预报时刻一次评分，
+再映射回各钓点，返回当前时段和最佳时段的摘要
+"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from cache import create_cache
+from config import settings
+from fishing_score import GRADES, FACTORS, best_windows, build_advice, score_forecasts
+from weather_proxy import GridCell, WeatherUpstreamError, cell_center, snap_to_grid, weather_proxy
+from weather_store import KIND_SUITABILITY
+
+# wttr.in 逐小时预报的间隔（小时）
+FORECAST_STEP_HOURS = 3
+
+# (网格单元, 语言) -> 适宜度摘要，随天气数据一起过期，由预取任务提前刷新；
+# 天气代理配置了持久化缓存时摘要也一并写入，供其他worker和重启后使用
+suitability_cache = create_cache("suitability", maxsize=settings.WEATHER_CACHE_SIZE, ttl=settings.WEATHER_CACHE_TTL)
+
+def _observed_at(payload: dict) -> Optional[datetime]:
+    """当地观测时间（current_condition.localObsDateTime），用于排除已经过去的时段"""
+    try:
+        value = payload["current_condition"][0]["localObsDateTime"]
+        return datetime.strptime(value, "%Y-%m-%d %I:%M %p")
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+def _estimated_local_time(payload: dict) -> Optional[datetime]:
+    """缺少观测时间时按所在经度估算当地时间，与实际时区可能相差一两个小时"""
+    try:
+        longitude = float(payload["nearest_area"][0]["longitude"])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+    return datetime.utcnow() + timedelta(hours=round(longitude / 15))
+
+def _slot_start(day: str, time: str) -> Optional[datetime]:
+    """预报时刻的开始时间，time 为 wttr.in 的 "0"、"300"、"2100" 格式"""
+    try:
+        minutes = int(time)
+        return datetime.strptime(day, "%Y-%m-%d") + timedelta(hours=minutes // 100, minutes=minutes % 100)
+    except ValueError:
+        return None
+
+def _format(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d %H:%M")
+
+def summarize_forecasts(payloads: List[Optional[dict]], lang: str = "zh") -> List[Optional[dict]]:
+    """对多个单元的预报一次评分，返回每个单元的 {current, best} 摘要，没有可用预报时为None
+
+    当地时间优先取观测时间，缺失时按经度估算；都无法确定时不排除已经过去的时段，current 为None。
+    """
+    if not payloads:
+        return []
+    scores = score_forecasts(payloads, lang)
+    valid = scores["valid"]
+
+    # 已经结束的时段不参与评估
+    starts = np.full(valid.shape, None, dtype=object)
+    usable = valid.copy()
+    step = timedelta(hours=FORECAST_STEP_HOURS)
+    known_time = np.zeros(len(payloads), dtype=bool)
+    for row, payload in enumerate(payloads):
+        observed = (_observed_at(payload) or _estimated_local_time(payload)) if payload else None
+        known_time[row] = observed is not None
+        for column in np.flatnonzero(valid[row]):
+            start = _slot_start(scores["date"][row, column], scores["time"][row, column])
+            starts[row, column] = start
+            if start is None or (observed is not None and start + step <= observed):
+                usable[row, column] = False
+
+    best, window_start, window_end, has_usable = best_windows(scores["score"], scores["grade"], usable)
+    current = usable.argmax(axis=1) if usable.shape[1] else best
+
+    def slot(row: int, column: int) -> dict:
+        details = {factor: int(scores[factor][row, column]) for factor in FACTORS}
+        grade = GRADES[scores["grade"][row, column]]
+        return {
+            "time": _format(starts[row, column]),
+            "score": int(scores["score"][row, column]),
+            "suitability": grade,
+            "advice": build_advice(grade, details, lang),
+        }
+
+    summaries = []
+    for row in range(len(payloads)):
+        if not has_usable[row]:
+            summaries.append(None)
+            continue
+        best_slot = slot(row, best[row])
+        best_slot["start"] = _format(starts[row, window_start[row]])
+        best_slot["end"] = _format(starts[row, window_end[row]] + step)
+        summaries.append({
+            "current": slot(row, current[row]) if known_time[row] else None,
+            "best": best_slot,
+        })
+    return summaries
+
+async def _fetch_cells(cells: List[GridCell], lang: str) -> List[Optional[dict]]:
+    """并发获取各单元的预报，失败的单元为None"""
+    results = await asyncio.gather(
+        *(weather_proxy.get_cell(cell, lang) for cell in cells),
+        return_exceptions=True,
+    )
+    payloads = []
+    for result in results:
+        if isinstance(result, WeatherUpstreamError):
+            payloads.append(None)
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            payloads.append(result[0])
+    return payloads
+
+async def store_summaries(cells: List[GridCell], payloads: List[Optional[dict]], lang: str) -> List[Optional[dict]]:
+    """对各单元的预报评分并缓存，有效期与天气缓存一致"""
+    summaries = summarize_forecasts(payloads, lang)
+    stored = []
+    for cell, summary in zip(cells, summaries):
+        ttl = weather_proxy.ttl_remaining(cell, lang)
+        if summary is not None and ttl is not None and ttl > 0:
+            suitability_cache.set((cell, lang), summary, ttl=ttl)
+            stored.append((cell, json.dumps(summary, ensure_ascii=False).encode(), ttl))
+    if stored and weather_proxy.store is not None:
+        await run_in_threadpool(weather_proxy.store.put_many, KIND_SUITABILITY, stored, lang)
+    return summaries
+
+async def _load_stored(cells: List[GridCell], lang: str) -> Dict[GridCell, dict]:
+    """从持久化缓存批量读取摘要并放入内存缓存"""
+    stored = await run_in_threadpool(weather_proxy.store.get_many, KIND_SUITABILITY, cells, lang)
+    summaries = {}
+    for cell, (value, ttl) in stored.items():
+        summaries[cell] = json.loads(value)
+        suitability_cache.set((cell, lang), summaries[cell], ttl=ttl)
+    return summaries
+
+async def cell_summaries(cells: List[GridCell], lang: str) -> List[Optional[dict]]:
+    """返回各单元的适宜度摘要，依次查内存缓存、持久化缓存，只对仍然没有的单元获取预报并评分"""
+    summaries = [suitability_cache.get((cell, lang)) for cell in cells]
+    missing = [index for index, summary in enumerate(summaries) if summary is None]
+    if missing and weather_proxy.store is not None:
+        stored = await _load_stored([cells[index] for index in missing], lang)
+        for index in missing:
+            summaries[index] = stored.get(cells[index])
+        missing = [index for index in missing if summaries[index] is None]
+    if missing:
+        missing_cells = [cells[index] for index in missing]
+        payloads = await _fetch_cells(missing_cells, lang)
+        for index, summary in zip(missing, await store_summaries(missing_cells, payloads, lang)):
+            summaries[index] = summary
+    return summaries
+
+async def spot_suitability(spots: List[dict], lang: str = "zh") -> dict:
+    """批量评估钓点的适宜度，spots 为包含 id、name、latitude、longitude 的钓点"""
+    cell_index: Dict[GridCell, int] = {}
+    spot_cells = []
+    for spot in spots:
+        cell = snap_to_grid(spot["latitude"], spot["longitude"])
+        spot_cells.append(cell_index.setdefault(cell, len(cell_index)))
+
+    cells = list(cell_index)
+    summaries = await cell_summaries(cells, lang)
+
+    results = []
+    for spot, index in zip(spots, spot_cells):
+        summary = summaries[index] or {}
+        center_lat, center_lon = cell_center(cells[index])
+        results.append({
+            "id": spot["id"],
+            "name": spot["name"],
+            "latitude": spot["latitude"],
+            "longitude": spot["longitude"],
+            "cell": f"{center_lat},{center_lon}",
+            # 天气数据获取失败时为None
+            "current": summary.get("current"),
+            "best": summary.get("best"),
+        })
+    return {
+        "spots": results,
+        "cells": len(cells),
+        "unavailable_cells": sum(summary is None for summary in summaries),
+    }
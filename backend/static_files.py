@@ -0,0 +1,173 @@
+"""
+上传文件服务模块
+上传的文件写入后不再修改，响应带强ETag和长期不可变缓存头，支持 If-None-Match 和 Range 请求
+"""
+
+import mimetypes
+import os
+import re
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from config import settings
+from utils import upload_url_to_path
+
+# 内容寻址存储的原图，文件名就是内容的sha256
+_CONTENT_ADDRESSED_RE = re.compile(r"^([0-9a-f]{64})\.[a-z0-9]+$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Range 请求无法满足时的标记
+UNSATISFIABLE = object()
+
+class FileRangeResponse(Response):
+    """发送文件的指定字节区间，分块读取，读文件在线程中执行"""
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, offset: int, length: int, status_code: int, headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, "rb") as file:
+            await file.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # 文件在发送过程中被截断，结束响应
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def make_etag(file_name: str, stat_result: os.stat_result) -> str:
+    """内容寻址的原图直接用内容哈希，多台服务器上的ETag一致；其他文件由大小和修改时间生成"""
+    match = _CONTENT_ADDRESSED_RE.match(file_name)
+    if match:
+        return f'"{match.group(1)}"'
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match 使用弱比较"""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+def parse_range(range_header: str, size: int):
+    """解析单个字节区间，返回 (起始, 结束)（含结束），格式不支持时返回None，无法满足时返回 UNSATISFIABLE"""
+    match = _RANGE_RE.match(range_header.strip())
+    if match is None:
+        # 多区间等格式按完整文件返回
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N 表示最后N个字节
+        length = int(end)
+        if length == 0 or size == 0:
+            return UNSATISFIABLE
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return UNSATISFIABLE
+    return start, end
+
+def _cache_headers(etag: str) -> dict:
+    return {
+        "etag": etag,
+        "cache-control": f"public, max-age={settings.UPLOADS_CACHE_MAX_AGE}, immutable",
+        "accept-ranges": "bytes",
+    }
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """客户端缓存仍然有效时返回304响应，否则返回None"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_cache_headers(etag))
+    return None
+
+def send_file(
+    request: Request,
+    path: str,
+    stat_result: os.stat_result,
+    etag: str,
+    accel_path: Optional[str] = None
+) -> Response:
+    """按缓存头、If-None-Match 和 Range 返回文件
+
+    accel_path 为文件相对上传目录的路径，配置了 UPLOADS_ACCEL_REDIRECT 时交给Nginx发送。
+    """
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    headers = _cache_headers(etag)
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    # 由Nginx通过sendfile发送文件内容（零拷贝），Range也由Nginx处理
+    if settings.UPLOADS_ACCEL_REDIRECT and accel_path:
+        headers["x-accel-redirect"] = settings.UPLOADS_ACCEL_REDIRECT.rstrip("/") + "/" + accel_path
+        return Response(headers=headers, media_type=media_type)
+
+    size = stat_result.st_size
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header:
+        # If-Range 与当前ETag不一致时忽略Range，返回完整文件
+        if_range = request.headers.get("if-range")
+        if if_range is None or if_range.strip() == etag:
+            byte_range = parse_range(range_header, size)
+
+    if byte_range is UNSATISFIABLE:
+        headers["content-range"] = f"bytes */{size}"
+        return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+
+    if byte_range is None:
+        headers["content-length"] = str(size)
+        return FileRangeResponse(path, 0, size, status.HTTP_200_OK, headers, media_type)
+
+    start, end = byte_range
+    headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(end - start + 1)
+    return FileRangeResponse(path, start, end - start + 1, status.HTTP_206_PARTIAL_CONTENT, headers, media_type)
+
+def resolve_upload(file_path: str) -> Optional[Tuple[str, os.stat_result]]:
+    """把上传目录下的相对路径解析为 (文件路径, stat)，不存在或不允许访问时返回None"""
+    # 临时文件和隐藏文件不对外提供
+    if any(part.startswith(".") for part in file_path.split("/")) or file_path.endswith(".tmp"):
+        return None
+    path = upload_url_to_path(f"/uploads/{file_path}")
+    if path is None:
+        return None
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+    return path, stat_result
+
+async def serve_upload(request: Request, file_path: str) -> Response:
+    """返回上传目录中的文件"""
+    resolved = await run_in_threadpool(resolve_upload, file_path)
+    if resolved is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    path, stat_result = resolved
+    return send_file(request, path, stat_result, make_etag(os.path.basename(path), stat_result), file_path)
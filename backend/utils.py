@@ -1,12 +1,63 @@
 import os
-import uuid
-from typing import Optional
+import hashlib
+import tempfile
+import json
+import re
+import base64
+from datetime import datetime
+from math import pi, radians, sin, cos, sqrt, atan2
+from typing import List, Optional, Tuple
+import numpy as np
 from fastapi import UploadFile, HTTPException
 from PIL import Image
 from config import settings
 
-def save_uploaded_file(file: UploadFile, upload_dir: str = None) -> str:
-    """保存上传的文件并返回文件URL"""
+# 地球半径（km）
+EARTH_RADIUS_KM = 6371.0
+
+# 每纬度对应的距离（km），由同一个地球半径推导，外接矩形才不会比 haversine 距离窄
+KM_PER_DEGREE_LAT = EARTH_RADIUS_KM * pi / 180
+
+# geohash 编码字符表
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# 各精度geohash单元的尺寸（纬度跨度, 经度跨度），单位：度
+GEOHASH_CELL_DEGREES = {
+    precision: (180.0 / 2 ** ((precision * 5) // 2), 360.0 / 2 ** ((precision * 5 + 1) // 2))
+    for precision in range(1, 13)
+}
+
+# 上传文件分块读取的大小，单个上传的内存占用与文件大小无关
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# 钓点存储的geohash精度（约1.2km x 0.6km）
+GEOHASH_PRECISION = 8
+
+# 允许的上传类型 -> 存储扩展名，相同内容总是得到相同的文件名
+UPLOAD_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+}
+
+def content_address(digest: str, extension: str) -> str:
+    """按内容哈希生成存储路径，前两级哈希作为子目录：ab/cd/abcd....jpg"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+# 按内容哈希存储的上传文件URL，旧版扁平目录的文件不匹配
+_CONTENT_ADDRESSED_URL = re.compile(r"/uploads/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.\w+")
+
+def content_address_digest(url: str) -> Optional[str]:
+    """按内容哈希存储的上传文件URL中的sha256，其他URL返回None"""
+    match = _CONTENT_ADDRESSED_URL.fullmatch(url)
+    return match.group(1) if match else None
+
+def receive_upload(file: UploadFile, upload_dir: str = None) -> Tuple[str, str, int]:
+    """校验上传文件，分块写入临时文件并计算sha256，返回 (临时文件路径, 摘要, 字节数)
+
+    读取过程中强制检查大小上限，内存占用与文件大小无关；调用方负责删除临时文件。
+    """
     if upload_dir is None:
         upload_dir = settings.UPLOAD_DIR
     
@@ -14,58 +65,164 @@ def save_uploaded_file(file: UploadFile, upload_dir: str = None) -> str:
     os.makedirs(upload_dir, exist_ok=True)
     
     # 验证文件类型
-    allowed_types = {"image/jpeg", "image/png", "image/jpg", "image/gif"}
-    if file.content_type not in allowed_types:
+    if file.content_type not in UPLOAD_EXTENSIONS:
         raise HTTPException(status_code=400, detail="不支持的文件类型")
     
-    # 验证文件大小
+    # 已知大小时提前拒绝，未知时在读取过程中检查
     if file.size and file.size > settings.MAX_FILE_SIZE:
         raise HTTPException(status_code=400, detail="文件太大")
     
-    # 生成唯一文件名
-    file_extension = file.filename.split(".")[-1] if file.filename else "jpg"
-    file_name = f"{uuid.uuid4()}.{file_extension}"
-    file_path = os.path.join(upload_dir, file_name)
-    
-    # 保存文件
+    temp_path = None
     try:
-        with open(file_path, "wb") as buffer:
-            content = file.file.read()
-            buffer.write(content)
-        
-        # 压缩图片
-        compress_image(file_path)
-        
-        # 返回相对URL路径
-        return f"/uploads/{file_name}"
-    
+        with tempfile.NamedTemporaryFile(dir=upload_dir, prefix=".upload-", delete=False) as buffer:
+            temp_path = buffer.name
+            digest = hashlib.sha256()
+            size = 0
+            while True:
+                chunk = file.file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    raise HTTPException(status_code=400, detail="文件太大")
+                digest.update(chunk)
+                buffer.write(chunk)
+        return temp_path, digest.hexdigest(), size
     except Exception as e:
-        # 如果保存失败，删除可能存在的文件
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # 保存失败或超出大小时删除临时文件
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(status_code=500, detail=f"文件保存失败: {str(e)}")
 
-def compress_image(file_path: str, quality: int = 85, max_width: int = 1200):
-    """压缩图片"""
+def store_upload(temp_path: str, url: str, upload_dir: str = None):
+    """把临时文件移动到URL对应的位置；相同内容已经存在时保留已有文件"""
+    file_path = upload_url_to_path(url, upload_dir)
+    if os.path.exists(file_path):
+        return
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    os.replace(temp_path, file_path)
+
+def save_uploaded_file(file: UploadFile, upload_dir: str = None) -> str:
+    """保存上传的文件并返回文件URL
+
+    文件按内容哈希分目录存放，重复上传的相同内容只保存一份。
+    不登记引用计数，需要计数时使用 crud.save_upload。
+    包含磁盘IO，异步接口中应通过 run_in_threadpool 调用。
+    """
+    temp_path, digest, _ = receive_upload(file, upload_dir)
     try:
-        with Image.open(file_path) as img:
-            # 转换为RGB（如果是RGBA）
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGB")
-            
-            # 计算新尺寸
-            width, height = img.size
-            if width > max_width:
-                ratio = max_width / width
-                new_width = max_width
-                new_height = int(height * ratio)
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # 保存压缩后的图片
-            img.save(file_path, "JPEG", quality=quality, optimize=True)
+        url = "/uploads/" + content_address(digest, UPLOAD_EXTENSIONS[file.content_type])
+        store_upload(temp_path, url, upload_dir)
+        return url
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"文件保存失败: {str(e)}")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+# 整数倍缩小（Image.reduce）后至少保留目标尺寸的倍数，再用LANCZOS做最后的高质量缩放
+RESIZE_REDUCING_GAP = 3.0
+
+# EXIF方向 -> 转正所需的变换
+_EXIF_ORIENTATION_TAG = 0x0112
+_EXIF_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+# 这些方向需要旋转90度，显示宽度是存储高度
+_ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+def resize_image(img: Image.Image, max_width: int) -> Image.Image:
+    """按最大宽度等比缩放，宽度未超出时原样返回"""
+    width, height = img.size
+    if width <= max_width:
+        return img
+    ratio = max_width / width
+    return img.resize(
+        (max_width, max(1, int(height * ratio))),
+        Image.Resampling.LANCZOS,
+        reducing_gap=RESIZE_REDUCING_GAP,
+    )
+
+def open_image(file_path: str, max_width: Optional[int] = None) -> Image.Image:
+    """解码图片并按EXIF方向转正，返回RGB或灰度图
+
+    指定max_width时尽量少处理像素：JPEG用DCT缩放解码（draft），按不小于目标尺寸的1/2、1/4或1/8解码；
+    其余格式解码后先用 Image.reduce 整数倍缩小。方向变换在缩小之后只做一次，最终尺寸由 resize_image 决定。
+    """
+    with Image.open(file_path) as img:
+        orientation = img.getexif().get(_EXIF_ORIENTATION_TAG)
+        width, height = img.size
+        display_width = height if orientation in _ROTATED_ORIENTATIONS else width
+
+        if max_width and display_width > max_width and img.format == "JPEG":
+            # DCT缩放本身是按块平均，只需不小于目标尺寸
+            scale = max_width / display_width
+            img.draft(img.mode, (int(width * scale) + 1, int(height * scale) + 1))
+        img.load()
+
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        if max_width:
+            display_width = img.height if orientation in _ROTATED_ORIENTATIONS else img.width
+            factor = int(display_width / (max_width * RESIZE_REDUCING_GAP))
+            if factor >= 2:
+                img = img.reduce(factor)
+        if orientation in _EXIF_TRANSPOSE:
+            img = img.transpose(_EXIF_TRANSPOSE[orientation])
+        return img
+
+def compress_image(
+    file_path: str,
+    quality: int = 85,
+    max_width: int = 1200,
+    output_path: Optional[str] = None,
+    format: str = "JPEG"
+) -> bool:
+    """压缩图片，默认覆盖原文件；指定output_path时写入新文件，返回是否成功"""
+    try:
+        img = resize_image(open_image(file_path, max_width), max_width)
+
+        # 保存压缩后的图片
+        img.save(output_path or file_path, format, quality=quality, optimize=True)
+        return True
     
     except Exception as e:
         print(f"图片压缩失败: {str(e)}")
+        return False
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """生成分页游标（不透明字符串）"""
+    payload = json.dumps([created_at.isoformat(), item_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析分页游标，返回 (created_at, id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(item_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+def upload_url_to_path(url: str, upload_dir: str = None) -> Optional[str]:
+    """把 /uploads/... 形式的URL转换为上传目录下的文件路径，不在上传目录内时返回None"""
+    if not url or not url.startswith("/uploads/"):
+        return None
+    if upload_dir is None:
+        upload_dir = settings.UPLOAD_DIR
+    root = os.path.abspath(upload_dir)
+    path = os.path.abspath(os.path.join(root, url[len("/uploads/"):]))
+    if not path.startswith(root + os.sep):
+        return None
+    return path
 
 def delete_file(file_path: str) -> bool:
     """删除文件"""
@@ -79,10 +236,8 @@ def delete_file(file_path: str) -> bool:
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """计算两点之间的距离（km）"""
-    from math import radians, sin, cos, sqrt, atan2
-    
     # 地球半径（km）
-    R = 6371.0
+    R = EARTH_RADIUS_KM
     
     # 转换为弧度
     lat1_rad = radians(lat1)
@@ -99,4 +254,149 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     c = 2 * atan2(sqrt(a), sqrt(1 - a))
     distance = R * c
     
-    return round(distance, 2)
\ No newline at end of file
+    return round(distance, 2)
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """计算坐标的geohash编码"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # 偶数位编码经度
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits = bits << 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+def bounding_box(latitude: float, longitude: float, radius: float) -> Tuple[float, float, float, float]:
+    """计算以某点为中心、半径为radius（km）的外接矩形
+
+    返回 (min_lat, min_lon, max_lat, max_lon)，经度范围可能跨越±180，由调用方处理。
+    """
+    lat_delta = radius / KM_PER_DEGREE_LAT
+    min_lat = max(latitude - lat_delta, -90.0)
+    max_lat = min(latitude + lat_delta, 90.0)
+
+    # 取外接矩形中离赤道最远的纬度计算经度跨度，保证矩形完整覆盖圆
+    max_abs_lat = max(abs(min_lat), abs(max_lat))
+    if max_abs_lat >= 89.9:
+        return min_lat, -180.0, max_lat, 180.0
+    lon_delta = radius / (KM_PER_DEGREE_LAT * cos(radians(max_abs_lat)))
+    if lon_delta >= 180.0:
+        return min_lat, -180.0, max_lat, 180.0
+    return min_lat, longitude - lon_delta, max_lat, longitude + lon_delta
+
+def split_longitude_range(min_lon: float, max_lon: float) -> List[Tuple[float, float]]:
+    """将可能跨越±180经线的经度范围拆分为若干合法区间"""
+    if min_lon < -180.0:
+        return [(-180.0, max_lon), (min_lon + 360.0, 180.0)]
+    if max_lon > 180.0:
+        return [(min_lon, 180.0), (-180.0, max_lon - 360.0)]
+    return [(min_lon, max_lon)]
+
+def geohash_cover(min_lat: float, min_lon: float, max_lat: float, max_lon: float, max_cells: int = 16) -> List[str]:
+    """计算覆盖矩形区域的geohash前缀集合
+
+    选择单元不小于矩形的最粗粒度精度中、单元数不超过max_cells的最细精度，
+    返回的前缀可直接用于 LIKE 'prefix%' 的索引前缀扫描。
+    """
+    ranges = split_longitude_range(min_lon, max_lon)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_step, lon_step = GEOHASH_CELL_DEGREES[precision]
+        lat_cells = int((max_lat - min_lat) / lat_step) + 2
+        lon_cells = sum(int((hi - lo) / lon_step) + 2 for lo, hi in ranges)
+        if lat_cells * lon_cells <= max_cells:
+            break
+
+    cells = set()
+    lat = min_lat
+    while True:
+        for lo, hi in ranges:
+            lon = lo
+            while True:
+                cells.add(encode_geohash(lat, min(lon, 180.0 - 1e-9), precision))
+                if lon >= hi:
+                    break
+                lon = min(lon + lon_step, hi)
+        if lat >= max_lat:
+            break
+        lat = min(lat + lat_step, max_lat)
+
+    return sorted(cells)
+
+def haversine_distances(latitude: float, longitude: float, latitudes, longitudes) -> np.ndarray:
+    """批量计算一个原点到N个点的距离（km），返回float64数组，不做取整"""
+    lat1 = np.radians(latitude)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(longitudes, dtype=np.float64)) - np.radians(longitude)
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def haversine_matrix(latitudes1, longitudes1, latitudes2, longitudes2) -> np.ndarray:
+    """批量计算N个点与M个点两两之间的距离（km），返回N×M数组"""
+    lat1 = np.radians(np.asarray(latitudes1, dtype=np.float64))[:, np.newaxis]
+    lon1 = np.radians(np.asarray(longitudes1, dtype=np.float64))[:, np.newaxis]
+    lat2 = np.radians(np.asarray(latitudes2, dtype=np.float64))[np.newaxis, :]
+    lon2 = np.radians(np.asarray(longitudes2, dtype=np.float64))[np.newaxis, :]
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def nearest_points(
+    latitude: float,
+    longitude: float,
+    latitudes,
+    longitudes,
+    k: Optional[int] = None,
+    radius: Optional[float] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """在N个点中选出距离原点最近的k个点
+
+    Args:
+        k: 最多返回的数量，None表示不限制
+        radius: 半径（km），None表示不限制
+
+    Returns:
+        (下标数组, 距离数组)，按距离从近到远排序
+    """
+    distances = haversine_distances(latitude, longitude, latitudes, longitudes)
+    indices = np.arange(distances.shape[0])
+
+    if radius is not None:
+        mask = distances <= radius
+        indices = indices[mask]
+        distances = distances[mask]
+
+    if k is not None and k < distances.shape[0]:
+        # 先用argpartition选出前k个，只对这k个排序
+        top = np.argpartition(distances, k - 1)[:k] if k > 0 else np.empty(0, dtype=np.intp)
+        indices = indices[top]
+        distances = distances[top]
+
+    order = np.argsort(distances, kind="stable")
+    return indices[order], distances[order]
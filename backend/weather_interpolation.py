@@ -0,0 +1,106 @@
+"""
+天气预报空间插值模块
+目标网格单元没有缓存时，用周围已缓存单元的预报按反距离加权估计：所有时刻、所有数值字段
+整理为一个 (相邻单元, 字段) 矩阵一次加权，文字描述等非数值字段取最近的单元
+"""
+
+import copy
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 数值字段的取值格式，wttr.in 的数值均为字符串，如 "1012"、"-3"、"0.4"
+_NUMBER = re.compile(r"-?\d+(\.\d+)?")
+
+# 不参与插值的字段：时刻、日期、天气代码等，取最近单元的值
+_SKIP_KEYS = {"time", "date", "weatherCode", "observation_time", "localObsDateTime"}
+
+# 整个子树取最近单元的值
+_NEAREST_ONLY = {"nearest_area", "astronomy", "request"}
+
+# 风向按单位向量平均，避免 350° 和 10° 平均成 180°
+_DIRECTION_KEYS = {"winddirDegree"}
+
+# 检查相邻单元差异的字段
+_SPREAD_KEYS = {"tempC", "temp_C"}
+
+Path = Tuple[Any, ...]
+
+def idw_weights(distances: np.ndarray, power: float = 2.0) -> np.ndarray:
+    """反距离加权的权重，和为1；距离为0的点独占全部权重"""
+    distances = np.asarray(distances, dtype=np.float64)
+    exact = distances <= 1e-9
+    if exact.any():
+        weights = exact.astype(np.float64)
+    else:
+        weights = distances ** -power
+    return weights / weights.sum()
+
+def _numeric_leaves(payload: dict) -> Dict[Path, str]:
+    """JSON中参与插值的数值字符串，返回 {路径: 值}；用显式栈遍历，比递归生成器快数倍"""
+    leaves: Dict[Path, str] = {}
+    stack: List[Tuple[Path, Any]] = [((), payload)]
+    while stack:
+        path, node = stack.pop()
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if isinstance(value, str):
+                    if key not in _SKIP_KEYS and _NUMBER.fullmatch(value):
+                        leaves[path + (key,)] = value
+                elif key not in _NEAREST_ONLY:
+                    stack.append((path + (key,), value))
+        elif isinstance(node, list):
+            stack.extend((path + (index,), value) for index, value in enumerate(node))
+    return leaves
+
+def forecast_dates(payload: dict) -> List[str]:
+    """预报包含的日期，日期一致的预报逐时刻对齐，才能插值"""
+    return [day.get("date") for day in payload.get("weather") or ()]
+
+def _format(value: float, template: str) -> str:
+    """按模板的小数位数格式化"""
+    decimals = len(template) - template.index(".") - 1 if "." in template else 0
+    # 加 0.0 把 -0.0 变成 0.0
+    return f"{round(value, decimals) + 0.0:.{decimals}f}"
+
+def interpolate_payloads(payloads: List[dict], weights: np.ndarray, max_spread: float = None) -> Optional[dict]:
+    """按权重合成一份预报，payloads 的 forecast_dates 应当一致，按距离从近到远排列，第一个作为模板
+
+    某个字段任一单元缺失时保留模板的值。
+    max_spread 不为None时，同一时刻参与单元之间的气温最大差值超过该值返回None。
+    """
+    template = payloads[0]
+    weights = np.asarray(weights, dtype=np.float64)
+
+    template_leaves = _numeric_leaves(template)
+    paths = list(template_leaves)
+    values = np.full((len(payloads), len(paths)), np.nan)
+    values[0] = [float(template_leaves[path]) for path in paths]
+    for row, payload in enumerate(payloads[1:], start=1):
+        leaves = _numeric_leaves(payload)
+        values[row] = [float(leaves[path]) if path in leaves else np.nan for path in paths]
+    complete = ~np.isnan(values).any(axis=0)
+
+    if max_spread is not None and len(payloads) > 1:
+        spread_columns = complete & np.array([path[-1] in _SPREAD_KEYS for path in paths], dtype=bool)
+        if spread_columns.any():
+            columns = values[:, spread_columns]
+            if (columns.max(axis=0) - columns.min(axis=0)).max() > max_spread:
+                return None
+
+    estimated = weights @ np.where(complete, values, 0.0)
+    direction = complete & np.array([path[-1] in _DIRECTION_KEYS for path in paths], dtype=bool)
+    if direction.any():
+        radians = np.radians(values[:, direction])
+        angle = np.degrees(np.arctan2(weights @ np.sin(radians), weights @ np.cos(radians)))
+        estimated[direction] = np.mod(np.rint(angle), 360.0)
+
+    result = copy.deepcopy(template)
+    for column in np.flatnonzero(complete):
+        path = paths[column]
+        node = result
+        for key in path[:-1]:
+            node = node[key]
+        node[path[-1]] = _format(estimated[column], template_leaves[path])
+    return result
@@ -0,0 +1,206 @@
+"""
+天气预取模块
+后台任务按近期请求量和钓点、鱼获密度给网格单元排序，在缓存过期前刷新热门单元的预报和适宜度摘要，
+清晨集中打开应用时热门地区直接命中缓存
+"""
+
+import asyncio
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+import crud
+from config import settings
+from database import SessionLocal
+from logging_config import backend_logger
+from spot_suitability import store_summaries
+from weather_proxy import GridCell, WeatherProxy, WeatherUpstreamError, snap_to_grid, weather_proxy
+
+# 请求未指定语言时（如附近钓点查询）按中文统计
+DEFAULT_LANG = "zh"
+
+# 衰减后低于该值的请求量记录会被清理
+_MIN_DEMAND = 0.01
+
+# 得分低于该值的单元不预取：至少有一次近期请求（半衰期内衰减后仍高于该值），或有两个以上钓点/鱼获
+MIN_PREFETCH_SCORE = 0.9
+
+class DemandTracker:
+    """按 (网格单元, 语言) 统计近期请求量，按半衰期指数衰减"""
+
+    def __init__(self, half_life: float, max_entries: int = 100000):
+        self.half_life = half_life
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple[GridCell, str], Tuple[float, float]] = {}  # 键 -> (请求量, 更新时间)
+        self._lock = threading.Lock()
+
+    def _decayed(self, value: float, updated_at: float, now: float) -> float:
+        return value * 0.5 ** ((now - updated_at) / self.half_life)
+
+    def record(self, cell: GridCell, lang: str, weight: float = 1.0):
+        now = time.monotonic()
+        key = (cell, lang)
+        with self._lock:
+            value, updated_at = self._entries.get(key, (0.0, now))
+            self._entries[key] = (self._decayed(value, updated_at, now) + weight, now)
+            if len(self._entries) > self.max_entries:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        # 先清理衰减到可以忽略的记录，仍然超出时丢弃请求量最小的一半
+        decayed = {key: self._decayed(value, updated_at, now) for key, (value, updated_at) in self._entries.items()}
+        keep = sorted((key for key in decayed if decayed[key] >= _MIN_DEMAND), key=decayed.get, reverse=True)
+        if len(keep) > self.max_entries:
+            keep = keep[:self.max_entries // 2]
+        self._entries = {key: (decayed[key], now) for key in keep}
+
+    def snapshot(self) -> Dict[Tuple[GridCell, str], float]:
+        """当前衰减后的请求量"""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            return {key: value for key, (value, _) in self._entries.items()}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+def cell_density(latitudes: np.ndarray, longitudes: np.ndarray) -> Dict[GridCell, int]:
+    """统计每个网格单元内的坐标数"""
+    if latitudes.size == 0:
+        return {}
+    step = settings.WEATHER_GRID_DEGREES
+    longitudes = np.where(longitudes >= 180.0, longitudes - 360.0, longitudes)
+    cells = np.stack([np.floor(latitudes / step), np.floor(longitudes / step)], axis=1).astype(np.int64)
+    unique, counts = np.unique(cells, axis=0, return_counts=True)
+    return {(int(row), int(col)): int(count) for (row, col), count in zip(unique, counts)}
+
+def load_density() -> Dict[GridCell, int]:
+    """从数据库统计各单元的公开钓点和近期鱼获数"""
+    since = datetime.now() - timedelta(days=settings.WEATHER_DENSITY_DAYS)
+    db = SessionLocal()
+    try:
+        latitudes, longitudes = crud.get_activity_coordinates(db, since)
+    finally:
+        db.close()
+    return cell_density(latitudes, longitudes)
+
+class WeatherPrefetcher:
+    """定期刷新排名靠前、缓存即将过期的单元
+
+    单元得分 = 衰减后的请求量 + log(1 + 钓点数 + 鱼获数)；没有请求记录的单元按默认语言预取。
+    """
+
+    def __init__(self, proxy: WeatherProxy, demand: DemandTracker):
+        self.proxy = proxy
+        self.demand = demand
+        self.density: Dict[GridCell, int] = {}
+        self._density_loaded_at = float("-inf")
+
+        # 统计计数
+        self.rounds = 0
+        self.refreshed = 0
+        self.failed = 0
+
+    def rank(self, limit: int) -> List[Tuple[Tuple[GridCell, str], float]]:
+        """返回得分最高的 limit 个 ((单元, 语言), 得分)，不含低于 MIN_PREFETCH_SCORE 的单元"""
+        scores: Dict[Tuple[GridCell, str], float] = {}
+        demanded_cells = set()
+        for (cell, lang), value in self.demand.snapshot().items():
+            scores[(cell, lang)] = value + math.log1p(self.density.get(cell, 0))
+            demanded_cells.add(cell)
+        for cell, count in self.density.items():
+            if cell not in demanded_cells:
+                scores[(cell, DEFAULT_LANG)] = math.log1p(count)
+        ranked = sorted(
+            (item for item in scores.items() if item[1] >= MIN_PREFETCH_SCORE),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        return ranked[:limit]
+
+    def due(self, limit: int) -> List[Tuple[GridCell, str]]:
+        """排名靠前、未缓存或剩余有效期不足的单元"""
+        result = []
+        for key, _ in self.rank(limit):
+            remaining = self.proxy.ttl_remaining(*key, interpolated=False)
+            if remaining is None or remaining < settings.WEATHER_PREFETCH_MARGIN:
+                result.append(key)
+        return result
+
+    async def _refresh(self, key: Tuple[GridCell, str], semaphore: asyncio.Semaphore):
+        # 随机错开各单元的刷新时间，避免同时请求上游
+        await asyncio.sleep(random.uniform(0, settings.WEATHER_PREFETCH_JITTER))
+        async with semaphore:
+            try:
+                payload = await self.proxy.refresh(*key, min_ttl=settings.WEATHER_PREFETCH_MARGIN)
+            except WeatherUpstreamError:
+                self.failed += 1
+                return key, None
+        self.refreshed += 1
+        return key, payload
+
+    async def refresh_round(self):
+        """执行一轮预取：刷新到期单元的预报，并按语言批量预先计算适宜度"""
+        if time.monotonic() - self._density_loaded_at >= settings.WEATHER_DENSITY_REFRESH_SECONDS:
+            try:
+                self.density = await run_in_threadpool(load_density)
+            except Exception as e:
+                backend_logger.error("钓点和鱼获密度统计失败，仅按请求量预取: %s", e)
+            # 失败时同样等到下一个周期再重试
+            self._density_loaded_at = time.monotonic()
+
+        keys = self.due(settings.WEATHER_PREFETCH_CELLS)
+        self.rounds += 1
+        if not keys:
+            return
+        semaphore = asyncio.Semaphore(settings.WEATHER_PREFETCH_CONCURRENCY)
+        results = await asyncio.gather(*(self._refresh(key, semaphore) for key in keys))
+
+        by_lang: Dict[str, Tuple[List[GridCell], List[dict]]] = {}
+        for (cell, lang), payload in results:
+            if payload is not None:
+                cells, payloads = by_lang.setdefault(lang, ([], []))
+                cells.append(cell)
+                payloads.append(payload)
+        refreshed = 0
+        for lang, (cells, payloads) in by_lang.items():
+            await store_summaries(cells, payloads, lang)
+            refreshed += len(cells)
+        backend_logger.info("天气预取完成: 刷新 %d 个单元，失败 %d 个", refreshed, len(keys) - refreshed)
+
+    async def run(self):
+        """后台循环，间隔带随机抖动，多个worker不会同时刷新"""
+        while True:
+            try:
+                await self.refresh_round()
+            except Exception as e:
+                backend_logger.error("天气预取失败: %s", e)
+            interval = settings.WEATHER_PREFETCH_INTERVAL
+            await asyncio.sleep(random.uniform(0.8 * interval, 1.2 * interval))
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "tracked": len(self.demand),
+            "dense_cells": len(self.density),
+        }
+
+weather_demand = DemandTracker(settings.WEATHER_DEMAND_HALF_LIFE)
+weather_prefetcher = WeatherPrefetcher(weather_proxy, weather_demand)
+
+def record_demand(latitude: float, longitude: float, lang: str = DEFAULT_LANG):
+    """记录一次对该坐标天气的需求"""
+    weather_demand.record(snap_to_grid(latitude, longitude), lang)
+
+def record_spots_demand(spots: List[dict], lang: str = DEFAULT_LANG):
+    """记录一次批量查询涉及的单元，同一单元只计一次"""
+    for cell in {snap_to_grid(spot["latitude"], spot["longitude"]) for spot in spots}:
+        weather_demand.record(cell, lang)
@@ -0,0 +1,326 @@
+"""
+天气代理模块
+客户端不再直接请求wttr.in：坐标对齐到网格单元，同一单元、同一语言的天气数据在服务端共享缓存，
+并发的未命中合并为一次上游请求
+"""
+
+import abc
+import asyncio
+import json
+import math
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from cache import create_cache
+from config import settings
+from logging_config import backend_logger
+from utils import KM_PER_DEGREE_LAT, haversine_distances
+from weather_interpolation import forecast_dates, idw_weights, interpolate_payloads
+from weather_store import KIND_WEATHER, WeatherStore, weather_store
+
+# 支持的语言，与客户端的 lang 参数一致
+WEATHER_LANGUAGES = ("zh", "en")
+
+# 网格单元：(行, 列)，行列号为纬度、经度除以网格边长后向下取整
+GridCell = Tuple[int, int]
+
+# 数据来源，即响应头 X-Cache 的取值
+SOURCE_HIT = "HIT"
+SOURCE_MISS = "MISS"
+SOURCE_INTERPOLATED = "INTERPOLATED"
+
+# 插值时每个方向最多查找的单元数
+_MAX_RING = 5
+
+class WeatherUpstreamError(Exception):
+    """上游天气服务请求失败；timeout 表示是否为超时"""
+
+    def __init__(self, message: str, timeout: bool = False):
+        super().__init__(message)
+        self.timeout = timeout
+
+def snap_to_grid(latitude: float, longitude: float, step: float = None) -> GridCell:
+    """把坐标对齐到所在的网格单元"""
+    if step is None:
+        step = settings.WEATHER_GRID_DEGREES
+    # 经度180与-180是同一位置
+    if longitude >= 180.0:
+        longitude -= 360.0
+    return math.floor(latitude / step), math.floor(longitude / step)
+
+def cell_center(cell: GridCell, step: float = None) -> Tuple[float, float]:
+    """网格单元中心点的坐标，作为上游请求的位置"""
+    if step is None:
+        step = settings.WEATHER_GRID_DEGREES
+    row, col = cell
+    latitude = min(90.0, (row + 0.5) * step)
+    return round(latitude, 4), round((col + 0.5) * step, 4)
+
+class WeatherUpstream(abc.ABC):
+    """上游天气数据源，fetch 返回wttr.in format=j1 格式的JSON
+
+    测试和基准测试可以替换为本地的假服务。
+    """
+
+    @abc.abstractmethod
+    async def fetch(self, latitude: float, longitude: float, lang: str) -> dict:
+        ...
+
+    async def close(self):
+        pass
+
+class WttrUpstream(WeatherUpstream):
+    """wttr.in（或同协议的服务），所有请求共用一个带连接池的 httpx.AsyncClient"""
+
+    def __init__(self, base_url: str, timeout: float, max_connections: int):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # 连接池绑定事件循环，在第一次请求时创建
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                headers={"Accept": "application/json"},
+            )
+        return self._client
+
+    async def fetch(self, latitude: float, longitude: float, lang: str) -> dict:
+        params = {"format": "j1", "lang": lang, "q": f"{latitude},{longitude}"}
+        try:
+            response = await self._get_client().get("/", params=params)
+        except httpx.TimeoutException as e:
+            raise WeatherUpstreamError(f"上游请求超时: {e!r}", timeout=True)
+        except httpx.HTTPError as e:
+            raise WeatherUpstreamError(f"上游请求失败: {e!r}")
+        if response.status_code != 200:
+            raise WeatherUpstreamError(f"上游返回状态码 {response.status_code}")
+        try:
+            return response.json()
+        except ValueError as e:
+            raise WeatherUpstreamError(f"上游返回的不是JSON: {e}")
+
+    async def close(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+class WeatherProxy:
+    """按 (网格单元, 语言) 缓存上游天气数据
+
+    内存缓存和合并请求都在当前worker进程内；配置了持久化缓存时，内存未命中先读本机共用的持久化缓存，
+    上游返回的数据同时写入，其他worker和重启后的进程不必再请求上游。
+    两级缓存都没有时，周围足够多的相邻单元已缓存且彼此接近，则插值估计，不再请求上游。
+    """
+
+    def __init__(self, upstream: WeatherUpstream, store: Optional[WeatherStore] = None):
+        self.upstream = upstream
+        self.store = store
+        self.cache = create_cache("weather", maxsize=settings.WEATHER_CACHE_SIZE, ttl=settings.WEATHER_CACHE_TTL)
+        # 插值结果单独缓存，不作为其他单元插值的依据，避免误差层层传递
+        self.interpolated_cache = create_cache(
+            "weather_interpolated", maxsize=settings.WEATHER_CACHE_SIZE, ttl=settings.WEATHER_CACHE_TTL,
+        )
+        # 进行中的请求：(单元, 语言) -> (任务, 要求的最短剩余有效期)
+        self._inflight: Dict[Tuple[GridCell, str], Tuple[asyncio.Future, float]] = {}
+
+        # 统计计数
+        self.upstream_requests = 0
+        self.upstream_errors = 0
+        self.coalesced = 0
+        self.interpolated = 0
+
+    def set_upstream(self, upstream: WeatherUpstream):
+        """替换上游数据源，已缓存的数据一并清空"""
+        self.upstream = upstream
+        self.cache.clear()
+        self.interpolated_cache.clear()
+
+    def _remember(self, key: Tuple[GridCell, str], payload: dict, ttl: float = None):
+        self.cache.set(key, payload, ttl=ttl)
+        self.interpolated_cache.invalidate(key)
+
+    def _neighbours(self, cell: GridCell) -> List[GridCell]:
+        """中心距离在 WEATHER_INTERPOLATION_MAX_KM 以内的相邻单元"""
+        step = settings.WEATHER_GRID_DEGREES
+        max_km = settings.WEATHER_INTERPOLATION_MAX_KM
+        latitude, _ = cell_center(cell)
+        row_ring = min(_MAX_RING, math.ceil(max_km / (step * KM_PER_DEGREE_LAT)))
+        col_ring = min(_MAX_RING, math.ceil(max_km / (step * KM_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 0.01))))
+        row, col = cell
+        return [
+            (row + d_row, col + d_col)
+            for d_row in range(-row_ring, row_ring + 1)
+            for d_col in range(-col_ring, col_ring + 1)
+            if d_row or d_col
+        ]
+
+    def _interpolate(self, cell: GridCell, lang: str, neighbours: List[GridCell]) -> Optional[Tuple[dict, float]]:
+        """用内存缓存中的相邻单元插值，返回 (天气数据, 有效期)，条件不满足时返回None
+
+        条件：剩余有效期不少于 WEATHER_INTERPOLATION_MIN_TTL 的相邻单元不少于 WEATHER_INTERPOLATION_MIN_NEIGHBOURS 个、
+        在距离上限内、预报日期一致、在行列两个方向上都包围目标单元（只内插不外推），且同一时刻气温差不超过上限。
+        """
+        candidates = []
+        for neighbour in neighbours:
+            entry = self.cache.peek((neighbour, lang))
+            if entry is not None and entry[1] >= settings.WEATHER_INTERPOLATION_MIN_TTL:
+                candidates.append((neighbour, entry[0], entry[1]))
+        if len(candidates) < settings.WEATHER_INTERPOLATION_MIN_NEIGHBOURS:
+            return None
+
+        latitude, longitude = cell_center(cell)
+        centers = np.array([cell_center(neighbour) for neighbour, _, _ in candidates])
+        distances = haversine_distances(latitude, longitude, centers[:, 0], centers[:, 1])
+        order = [index for index in np.argsort(distances, kind="stable") if distances[index] <= settings.WEATHER_INTERPOLATION_MAX_KM]
+        if not order:
+            return None
+        # 以最近单元的预报日期为准
+        dates = forecast_dates(candidates[order[0]][1])
+        order = [index for index in order if forecast_dates(candidates[index][1]) == dates]
+        if len(order) < settings.WEATHER_INTERPOLATION_MIN_NEIGHBOURS:
+            return None
+        rows = [candidates[index][0][0] for index in order]
+        cols = [candidates[index][0][1] for index in order]
+        if not (min(rows) <= cell[0] <= max(rows) and min(cols) <= cell[1] <= max(cols)):
+            return None
+
+        payload = interpolate_payloads(
+            [candidates[index][1] for index in order],
+            idw_weights(distances[order]),
+            max_spread=settings.WEATHER_INTERPOLATION_MAX_SPREAD,
+        )
+        if payload is None:
+            return None
+        return payload, min(candidates[index][2] for index in order)
+
+    async def _load_stored(self, keys: List[Tuple[GridCell, str]], min_ttl: float) -> Dict[GridCell, dict]:
+        """从持久化缓存批量读取剩余有效期大于 min_ttl 的数据并放入内存缓存"""
+        lang = keys[0][1]
+        stored = await run_in_threadpool(self.store.get_many, KIND_WEATHER, [cell for cell, _ in keys], lang)
+        payloads = {}
+        for cell, (value, ttl) in stored.items():
+            if ttl > min_ttl:
+                payloads[cell] = json.loads(value)
+                self._remember((cell, lang), payloads[cell], ttl=ttl)
+        return payloads
+
+    async def _fetch(self, key: Tuple[GridCell, str], min_ttl: float, interpolate: bool) -> Tuple[dict, str]:
+        """依次从持久化缓存、相邻单元插值、上游获取，返回 (天气数据, 来源)"""
+        cell, lang = key
+        neighbours = self._neighbours(cell) if interpolate and settings.WEATHER_INTERPOLATION_ENABLED else []
+        if self.store is not None:
+            # 目标单元和内存中没有的相邻单元一次查询
+            keys = [key] + [(neighbour, lang) for neighbour in neighbours if self.cache.peek((neighbour, lang)) is None]
+            stored = await self._load_stored(keys, min_ttl)
+            if cell in stored:
+                return stored[cell], SOURCE_HIT
+
+        if neighbours:
+            # 解析相邻单元的预报约需数毫秒，放到线程池中不阻塞事件循环
+            estimated = await run_in_threadpool(self._interpolate, cell, lang, neighbours)
+            if estimated is not None:
+                payload, ttl = estimated
+                self.interpolated_cache.set(key, payload, ttl=ttl)
+                self.interpolated += 1
+                return payload, SOURCE_INTERPOLATED
+
+        latitude, longitude = cell_center(cell)
+        self.upstream_requests += 1
+        try:
+            payload = await self.upstream.fetch(latitude, longitude, lang)
+        except WeatherUpstreamError as e:
+            self.upstream_errors += 1
+            backend_logger.warning("天气数据获取失败: 单元%s 语言%s: %s", cell, lang, e)
+            raise
+        self._remember(key, payload)
+        if self.store is not None:
+            value = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+            await run_in_threadpool(self.store.put, KIND_WEATHER, cell, lang, value, settings.WEATHER_CACHE_TTL)
+        return payload, SOURCE_MISS
+
+    async def _join(self, key: Tuple[GridCell, str], min_ttl: float = 0.0, interpolate: bool = True) -> Tuple[dict, str]:
+        """发起或加入该单元进行中的请求
+
+        每个单元同时只有一个请求。进行中的请求可能是插值结果，或用了剩余有效期不足 min_ttl 的持久化缓存，
+        不满足本次要求时等它结束后再发起一次；上游返回的实际数据满足所有请求。
+        """
+        while True:
+            flight = self._inflight.get(key)
+            if flight is None:
+                task = asyncio.ensure_future(self._fetch(key, min_ttl, interpolate))
+                self._inflight[key] = (task, min_ttl)
+                task.add_done_callback(lambda done: self._finish_flight(key, done))
+                # 客户端断开不取消上游请求，其他等待同一单元的请求仍可使用结果
+                return await asyncio.shield(task)
+            task, flight_min_ttl = flight
+            self.coalesced += 1
+            payload, source = await asyncio.shield(task)
+            if source == SOURCE_MISS or (flight_min_ttl >= min_ttl and (interpolate or source != SOURCE_INTERPOLATED)):
+                return payload, source
+
+    def _finish_flight(self, key: Tuple[GridCell, str], task: asyncio.Future):
+        """请求结束后移除，已被新请求替换时保留"""
+        flight = self._inflight.get(key)
+        if flight is not None and flight[0] is task:
+            del self._inflight[key]
+
+    async def get_cell(self, cell: GridCell, lang: str) -> Tuple[dict, str]:
+        """返回 (天气数据, 来源)，来源为 SOURCE_HIT、SOURCE_MISS 或 SOURCE_INTERPOLATED；持久化缓存命中也算命中"""
+        key = (cell, lang)
+        payload = self.cache.get(key)
+        if payload is not None:
+            return payload, SOURCE_HIT
+        payload = self.interpolated_cache.get(key)
+        if payload is not None:
+            return payload, SOURCE_INTERPOLATED
+        return await self._join(key)
+
+    async def refresh(self, cell: GridCell, lang: str, min_ttl: float = 0.0) -> dict:
+        """不论内存缓存是否过期都重新获取实际数据（不插值），供预取使用
+
+        持久化缓存中剩余有效期大于 min_ttl 的数据（通常是其他worker刚刚刷新的）直接使用，不再请求上游。
+        """
+        payload, _ = await self._join((cell, lang), min_ttl, interpolate=False)
+        return payload
+
+    async def get_weather(self, latitude: float, longitude: float, lang: str) -> Tuple[dict, GridCell, str]:
+        """返回坐标所在单元的 (天气数据, 网格单元, 来源)"""
+        cell = snap_to_grid(latitude, longitude)
+        payload, source = await self.get_cell(cell, lang)
+        return payload, cell, source
+
+    def ttl_remaining(self, cell: GridCell, lang: str, interpolated: bool = True) -> Optional[float]:
+        """剩余有效期；interpolated 为False时只看实际数据"""
+        remaining = self.cache.ttl_remaining((cell, lang))
+        if remaining is None and interpolated:
+            remaining = self.interpolated_cache.ttl_remaining((cell, lang))
+        return remaining
+
+    def stats(self) -> dict:
+        return {
+            "upstream_requests": self.upstream_requests,
+            "upstream_errors": self.upstream_errors,
+            "coalesced": self.coalesced,
+            "interpolated": self.interpolated,
+            "inflight": len(self._inflight),
+        }
+
+    async def close(self):
+        await self.upstream.close()
+
+weather_proxy = WeatherProxy(WttrUpstream(
+    settings.WEATHER_UPSTREAM_URL,
+    timeout=settings.WEATHER_UPSTREAM_TIMEOUT,
+    max_connections=settings.WEATHER_UPSTREAM_MAX_CONNECTIONS,
+), store=weather_store)
@@ -0,0 +1,197 @@
+"""
+天气持久化缓存模块
+本机所有worker共用一个WAL模式的SQLite文件，保存各网格单元的天气数据和适宜度摘要，
+重启或某个worker未命中内存缓存时先从这里读取，过期条目和超出容量的条目由后台任务定期清理
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from logging_config import backend_logger
+
+# 与 weather_proxy.GridCell 相同，本模块不依赖天气代理
+GridCell = Tuple[int, int]
+
+# 条目类型
+KIND_WEATHER = "weather"
+KIND_SUITABILITY = "suitability"
+
+# 单条SQL中最多的单元数，低于SQLite的变量个数上限
+_BATCH_SIZE = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    cell_row INTEGER NOT NULL,
+    cell_col INTEGER NOT NULL,
+    lang TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (kind, cell_row, cell_col, lang)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_entries_expires_at ON entries (expires_at);
+"""
+
+class WeatherStore:
+    """(类型, 网格单元, 语言) -> 字节串的持久化缓存
+
+    过期时间按墙上时钟记录，进程重启和不同worker之间一致。每个线程使用各自的连接，
+    读写都是阻塞调用，在事件循环中应通过 run_in_threadpool 调用。
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+        # 统计计数，entries 和 bytes 为最近一次清理后的值
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+        self.removed = 0
+        self.entries = 0
+        self.bytes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            return connection
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        # auto_vacuum 只在建表前设置有效；WAL下 synchronous=NORMAL 只在检查点时同步磁盘
+        connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        self._local.connection = connection
+        with self._lock:
+            self._connections.append(connection)
+        return connection
+
+    def get_many(self, kind: str, cells: List[GridCell], lang: str) -> Dict[GridCell, Tuple[bytes, float]]:
+        """返回未过期的 {单元: (值, 剩余有效期)}，数据库出错时按未命中处理"""
+        now = time.time()
+        result: Dict[GridCell, Tuple[bytes, float]] = {}
+        wanted = set(cells)
+        try:
+            connection = self._connect()
+            for start in range(0, len(cells), _BATCH_SIZE):
+                batch = cells[start:start + _BATCH_SIZE]
+                rows = ",".join("(?,?)" for _ in batch)
+                params = [kind, lang, now] + [index for cell in batch for index in cell]
+                cursor = connection.execute(
+                    "SELECT cell_row, cell_col, expires_at, value FROM entries "
+                    f"WHERE kind = ? AND lang = ? AND expires_at > ? AND (cell_row, cell_col) IN (VALUES {rows})",
+                    params,
+                )
+                for row, col, expires_at, value in cursor:
+                    if (row, col) in wanted:
+                        result[(row, col)] = (value, expires_at - now)
+        except sqlite3.Error as e:
+            self.errors += 1
+            backend_logger.warning("读取天气持久化缓存失败: %s", e)
+            return {}
+        self.hits += len(result)
+        self.misses += len(wanted) - len(result)
+        return result
+
+    def get(self, kind: str, cell: GridCell, lang: str) -> Optional[Tuple[bytes, float]]:
+        """返回未过期的 (值, 剩余有效期)，不存在时返回None"""
+        return self.get_many(kind, [cell], lang).get(cell)
+
+    def put_many(self, kind: str, items: Iterable[Tuple[GridCell, bytes, float]], lang: str):
+        """写入 (单元, 值, 有效期) 列表，写入失败只记录日志"""
+        now = time.time()
+        rows = [(kind, cell[0], cell[1], lang, now + ttl, value) for cell, value, ttl in items if ttl > 0]
+        if not rows:
+            return
+        try:
+            connection = self._connect()
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            self.errors += 1
+            backend_logger.warning("写入天气持久化缓存失败: %s", e)
+            return
+        self.writes += len(rows)
+
+    def put(self, kind: str, cell: GridCell, lang: str, value: bytes, ttl: float):
+        self.put_many(kind, [(cell, value, ttl)], lang)
+
+    def compact(self) -> int:
+        """删除过期条目，总大小超出上限时按过期时间从早到晚删除，再收缩WAL和数据库文件；返回删除的条目数"""
+        connection = self._connect()
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            removed = connection.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+            entries, total = connection.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()
+            if total > self.max_bytes:
+                # 按过期时间累加大小，找到需要保留的最早过期时间
+                excess = total - self.max_bytes
+                cutoff = None
+                for expires_at, size in connection.execute(
+                    "SELECT expires_at, LENGTH(value) FROM entries ORDER BY expires_at"
+                ):
+                    excess -= size
+                    if excess <= 0:
+                        cutoff = expires_at
+                        break
+                removed += connection.execute("DELETE FROM entries WHERE expires_at <= ?", (cutoff,)).rowcount
+                entries, total = connection.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM entries"
+                ).fetchone()
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        connection.execute("PRAGMA incremental_vacuum")
+        self.removed += removed
+        self.entries, self.bytes = entries, total
+        return removed
+
+    async def compact_periodically(self):
+        """定期清理，多个worker同时执行也只是重复删除"""
+        while True:
+            try:
+                removed = await run_in_threadpool(self.compact)
+                if removed:
+                    backend_logger.info("天气持久化缓存清理: 删除 %d 条，剩余 %d 条 %d 字节", removed, self.entries, self.bytes)
+            except sqlite3.Error as e:
+                self.errors += 1
+                backend_logger.error("天气持久化缓存清理失败: %s", e)
+            await asyncio.sleep(settings.WEATHER_STORE_COMPACT_INTERVAL)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "errors": self.errors,
+            "removed": self.removed,
+            "entries": self.entries,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+weather_store: Optional[WeatherStore] = (
+    WeatherStore(settings.WEATHER_STORE_PATH, settings.WEATHER_STORE_MAX_BYTES)
+    if settings.WEATHER_STORE_ENABLED else None
+)